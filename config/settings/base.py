@@ -35,6 +35,7 @@ DJANGO_APPS = [
     'django.contrib.sites',
     'django.contrib.sitemaps',
     'django.contrib.gis',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -284,6 +285,15 @@ ADMIN_REORDER = (
 
 RANDOM_SCHOOLS_DEFAULT_AMOUNT = env('RANDOM_SCHOOLS_DEFAULT_AMOUNT', default=20000)
 
+# schools vector tiles are versioned by country data, so they can live long enough
+SCHOOLS_TILE_CACHE_TIMEOUT = env.int('SCHOOLS_TILE_CACHE_TIMEOUT', default=7 * 24 * 60 * 60)
+
+# relative error allowed for average distance between schools of big countries, calculated from random sample
+AVG_DISTANCE_SCHOOL_RELATIVE_ERROR = env.float('AVG_DISTANCE_SCHOOL_RELATIVE_ERROR', default=0.01)
+
+# realtime data is aggregated to schools daily status by ranges of school ids of this size
+SCHOOL_DAILY_STATUS_CHUNK_SIZE = env.int('SCHOOL_DAILY_STATUS_CHUNK_SIZE', default=50000)
+
 CONTACT_MANAGERS = env.list('CONTACT_MANAGERS', default=['test@test.test'])
 
 
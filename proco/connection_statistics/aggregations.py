@@ -1,67 +1,73 @@
-from django.db.models import Count, Q
+from django.db.models import Avg, Count, Q
 
 from proco.connection_statistics.models import SchoolWeeklyStatus
 from proco.schools.constants import ColorMapSchema, statuses_schema
 
+STATUSES = (ColorMapSchema.GOOD, ColorMapSchema.MODERATE, ColorMapSchema.NO, ColorMapSchema.UNKNOWN)
 
-def aggregate_connectivity_by_speed(qs):
-    return qs.aggregate(**{
-        ColorMapSchema.GOOD: Count('school', filter=Q(
-            connectivity_speed__gte=statuses_schema.CONNECTIVITY_SPEED_FOR_GOOD_CONNECTIVITY_STATUS,
-        )),
-        ColorMapSchema.MODERATE: Count('school', filter=Q(
-            connectivity_speed__gt=0,
-            connectivity_speed__lt=statuses_schema.CONNECTIVITY_SPEED_FOR_GOOD_CONNECTIVITY_STATUS,
-        )),
-        ColorMapSchema.NO: Count('school', filter=Q(connectivity_speed=0)),
-        ColorMapSchema.UNKNOWN: Count('school', filter=Q(connectivity_speed__isnull=True)),
-    })
+CONNECTIVITY_BY_SPEED = {
+    ColorMapSchema.GOOD: Q(connectivity_speed__gte=statuses_schema.CONNECTIVITY_SPEED_FOR_GOOD_CONNECTIVITY_STATUS),
+    ColorMapSchema.MODERATE: Q(
+        connectivity_speed__gt=0,
+        connectivity_speed__lt=statuses_schema.CONNECTIVITY_SPEED_FOR_GOOD_CONNECTIVITY_STATUS,
+    ),
+    ColorMapSchema.NO: Q(connectivity_speed=0),
+    ColorMapSchema.UNKNOWN: Q(connectivity_speed__isnull=True),
+}
 
+CONNECTIVITY_BY_AVAILABILITY = {
+    ColorMapSchema.GOOD: Q(connectivity=True),
+    ColorMapSchema.NO: Q(connectivity=False),
+    ColorMapSchema.UNKNOWN: Q(connectivity__isnull=True),
+}
 
-def aggregate_connectivity_by_availability(qs):
-    result = qs.aggregate(**{
-        ColorMapSchema.GOOD: Count('school', filter=Q(connectivity=True)),
-        ColorMapSchema.NO: Count('school', filter=Q(connectivity=False)),
-        ColorMapSchema.UNKNOWN: Count('school', filter=Q(connectivity__isnull=True)),
-    })
-    result[ColorMapSchema.MODERATE] = 0
-    return result
+COVERAGE_BY_TYPES = {
+    ColorMapSchema.GOOD: Q(coverage_type__in=[SchoolWeeklyStatus.COVERAGE_4G, SchoolWeeklyStatus.COVERAGE_3G]),
+    ColorMapSchema.MODERATE: Q(coverage_type=SchoolWeeklyStatus.COVERAGE_2G),
+    ColorMapSchema.NO: Q(coverage_type=SchoolWeeklyStatus.COVERAGE_NO),
+    ColorMapSchema.UNKNOWN: Q(coverage_type=SchoolWeeklyStatus.COVERAGE_UNKNOWN),
+}
 
+COVERAGE_BY_AVAILABILITY = {
+    ColorMapSchema.GOOD: Q(coverage_availability=True),
+    ColorMapSchema.NO: Q(coverage_availability=False),
+    ColorMapSchema.UNKNOWN: Q(coverage_availability__isnull=True),
+}
 
-def aggregate_coverage_by_types(qs):
-    return qs.aggregate(**{
-        ColorMapSchema.GOOD: Count('school', filter=Q(
-            coverage_type__in=[SchoolWeeklyStatus.COVERAGE_4G, SchoolWeeklyStatus.COVERAGE_3G],
-        )),
-        ColorMapSchema.MODERATE: Count('school', filter=Q(coverage_type=SchoolWeeklyStatus.COVERAGE_2G)),
-        ColorMapSchema.NO: Count('school', filter=Q(coverage_type=SchoolWeeklyStatus.COVERAGE_NO)),
-        ColorMapSchema.UNKNOWN: Count('school', filter=Q(coverage_type=SchoolWeeklyStatus.COVERAGE_UNKNOWN)),
-    })
+PIE_CHARTS = {
+    'connectivity_by_speed': CONNECTIVITY_BY_SPEED,
+    'connectivity_by_availability': CONNECTIVITY_BY_AVAILABILITY,
+    'coverage_by_types': COVERAGE_BY_TYPES,
+    'coverage_by_availability': COVERAGE_BY_AVAILABILITY,
+}
 
 
-def aggregate_coverage_by_availability(qs):
-    result = qs.aggregate(**{
-        ColorMapSchema.GOOD: Count('school', filter=Q(coverage_availability=True)),
-        ColorMapSchema.NO: Count('school', filter=Q(coverage_availability=False)),
-        ColorMapSchema.UNKNOWN: Count('school', filter=Q(coverage_availability__isnull=True)),
-    })
-    result[ColorMapSchema.MODERATE] = 0
-    return result
-
-
-def aggregate_connectivity_default(qs):
-    return {
-        ColorMapSchema.GOOD: 0,
-        ColorMapSchema.MODERATE: 0,
-        ColorMapSchema.NO: 0,
-        ColorMapSchema.UNKNOWN: qs.count(),
+def aggregate_statuses(qs):
+    """
+    Calculates every pie chart variant, data availability probes, totals and averages of weekly statuses
+    in single aggregate query, so the statuses are scanned only once.
+    """
+    aggregates = {
+        'total': Count('school'),
+        'connectivity_speed': Avg('connectivity_speed', filter=Q(connectivity_speed__gt=0)),
+        'connectivity_latency': Avg('connectivity_latency', filter=Q(connectivity_latency__gt=0)),
+        # availability probes used to detect which pie chart is applicable
+        'with_connectivity_speed': Count('school', filter=Q(connectivity_speed__gte=0)),
+        'with_connectivity': Count('school', filter=Q(connectivity__isnull=False)),
+        'with_coverage_type': Count('school', filter=~Q(coverage_type=SchoolWeeklyStatus.COVERAGE_UNKNOWN)),
+        'with_coverage_availability': Count('school', filter=Q(coverage_availability__isnull=False)),
     }
+    for chart, conditions in PIE_CHARTS.items():
+        for status, condition in conditions.items():
+            aggregates[f'{chart}_{status}'] = Count('school', filter=condition)
 
+    return qs.aggregate(**aggregates)
 
-def aggregate_coverage_default(qs):
-    return {
-        ColorMapSchema.GOOD: 0,
-        ColorMapSchema.MODERATE: 0,
-        ColorMapSchema.NO: 0,
-        ColorMapSchema.UNKNOWN: qs.count(),
-    }
+
+def get_pie_chart(stats, chart=None):
+    """
+    Extracts pie chart from aggregate_statuses result; without chart all statuses are unknown.
+    """
+    if chart is None:
+        return {status: stats['total'] if status == ColorMapSchema.UNKNOWN else 0 for status in STATUSES}
+    return {status: stats.get(f'{chart}_{status}', 0) for status in STATUSES}
@@ -26,6 +26,7 @@ from proco.connection_statistics.serializers import (
 from proco.locations.models import Country
 from proco.schools.models import School
 from proco.utils.cache import cache_manager
+from proco.utils.pagination import DateCursorPagination
 
 
 @method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
@@ -95,6 +96,7 @@ class CountryDailyStatsListAPIView(ListAPIView):
     model = CountryDailyStatus
     queryset = model.objects.all()
     serializer_class = CountryDailyStatusSerializer
+    pagination_class = DateCursorPagination
     filter_backends = (
         DjangoFilterBackend,
         DateYearFilter,
@@ -117,6 +119,7 @@ class SchoolDailyStatsListAPIView(ListAPIView):
     model = SchoolDailyStatus
     queryset = model.objects.all()
     serializer_class = SchoolDailyStatusSerializer
+    pagination_class = DateCursorPagination
     filter_backends = (
         DjangoFilterBackend,
         DateYearFilter,
@@ -0,0 +1,92 @@
+from collections import defaultdict
+from datetime import date as date_type
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.utils import timezone
+
+from django_redis import get_redis_connection
+
+# countries and schools which received new data for the date since the last aggregation
+DIRTY_COUNTRIES_KEY = 'DIRTY_COUNTRIES_{date}'
+DIRTY_SCHOOLS_KEY = 'DIRTY_SCHOOLS_{date}_{country_id}'
+# yesterday data is finalized the next day, so sets should live a bit longer than one day
+DIRTY_KEYS_TIMEOUT = 3 * 24 * 60 * 60
+# date of the last successful aggregation of country data; kept without timeout
+LAST_AGGREGATION_DATE_KEY = 'LAST_AGGREGATION_DATE_{country_id}'
+
+
+def get_measurement_date(created) -> date_type:
+    # the same date as created__date lookup uses
+    return timezone.localtime(created).date() if timezone.is_aware(created) else created.date()
+
+
+def mark_schools_dirty(entries: Iterable[Tuple[date_type, int, int]]):
+    """
+    Remembers schools having new connectivity data. Entries are (date, country_id, school_id) tuples.
+    """
+    schools = defaultdict(set)
+    for date, country_id, school_id in entries:
+        schools[(date, country_id)].add(school_id)
+    if not schools:
+        return
+
+    pipeline = get_redis_connection('default').pipeline()
+    for (date, country_id), schools_ids in schools.items():
+        countries_key = DIRTY_COUNTRIES_KEY.format(date=date)
+        schools_key = DIRTY_SCHOOLS_KEY.format(date=date, country_id=country_id)
+        pipeline.sadd(schools_key, *schools_ids)
+        pipeline.expire(schools_key, DIRTY_KEYS_TIMEOUT)
+        pipeline.sadd(countries_key, country_id)
+        pipeline.expire(countries_key, DIRTY_KEYS_TIMEOUT)
+    pipeline.execute()
+
+
+def mark_country_dirty(country_id: int, date: Optional[date_type] = None):
+    """
+    Remembers country having new data not related to particular schools, e.g. imported weekly statuses.
+    """
+    key = DIRTY_COUNTRIES_KEY.format(date=date or timezone.localdate())
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.sadd(key, country_id)
+    pipeline.expire(key, DIRTY_KEYS_TIMEOUT)
+    pipeline.execute()
+
+
+def _pop_set(key) -> List[int]:
+    # read and delete in one transaction, so members added concurrently are never lost
+    pipeline = get_redis_connection('default').pipeline(transaction=True)
+    pipeline.smembers(key)
+    pipeline.delete(key)
+    members, _deleted = pipeline.execute()
+    return sorted(int(member) for member in members)
+
+
+def pop_dirty_countries(date: date_type) -> List[int]:
+    return _pop_set(DIRTY_COUNTRIES_KEY.format(date=date))
+
+
+def pop_dirty_schools(date: date_type, country_id: int) -> List[int]:
+    return _pop_set(DIRTY_SCHOOLS_KEY.format(date=date, country_id=country_id))
+
+
+def get_last_aggregation_dates(countries_ids: Iterable[int]) -> Dict[int, date_type]:
+    countries_ids = list(countries_ids)
+    if not countries_ids:
+        return {}
+
+    values = get_redis_connection('default').mget([
+        LAST_AGGREGATION_DATE_KEY.format(country_id=country_id) for country_id in countries_ids
+    ])
+    return {
+        country_id: date_type.fromisoformat(value.decode())
+        for country_id, value in zip(countries_ids, values)
+        if value
+    }
+
+
+def get_last_aggregation_date(country_id: int) -> Optional[date_type]:
+    return get_last_aggregation_dates([country_id]).get(country_id)
+
+
+def set_last_aggregation_date(country_id: int, date: date_type):
+    get_redis_connection('default').set(LAST_AGGREGATION_DATE_KEY.format(country_id=country_id), date.isoformat())
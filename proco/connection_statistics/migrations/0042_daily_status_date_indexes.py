@@ -0,0 +1,21 @@
+# Generated by Django 2.2.19 on 2021-05-05 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connection_statistics', '0041_auto_20201201_0956'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='countrydailystatus',
+            index=models.Index(fields=['country', 'date'], name='connection__country_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schooldailystatus',
+            index=models.Index(fields=['school', 'date'], name='connection__school_date_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.19 on 2021-05-07 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0011_auto_20210415_0731'),
+        ('connection_statistics', '0042_daily_status_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryRegionStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('connectivity_speed', models.PositiveIntegerField(blank=True, default=None, help_text='bps', null=True)),
+                ('connectivity_latency', models.PositiveSmallIntegerField(blank=True, default=None, help_text='ms', null=True)),
+                ('admin_level', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('schools_total', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_good', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_moderate', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_no', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_unknown', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_good', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_moderate', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_no', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_unknown', models.PositiveIntegerField(blank=True, default=0)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regions_status', to='locations.Country')),
+            ],
+            options={
+                'verbose_name': 'Country Region Summary',
+                'verbose_name_plural': 'Country Region Summary',
+                'ordering': ('id',),
+                'unique_together': {('country', 'admin_level', 'name')},
+            },
+        ),
+    ]
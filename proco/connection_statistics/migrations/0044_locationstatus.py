@@ -0,0 +1,43 @@
+# Generated by Django 2.2.19 on 2021-06-14 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0013_countrysubdividedgeometry'),
+        ('connection_statistics', '0043_countryregionstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('connectivity_speed', models.PositiveIntegerField(blank=True, default=None, help_text='bps', null=True)),
+                ('connectivity_latency', models.PositiveSmallIntegerField(blank=True, default=None, help_text='ms', null=True)),
+                ('schools_total', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_good', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_moderate', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_no', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_connectivity_unknown', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_good', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_moderate', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_no', models.PositiveIntegerField(blank=True, default=0)),
+                ('schools_coverage_unknown', models.PositiveIntegerField(blank=True, default=0)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locations_status', to='locations.Country')),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='status', to='locations.Location')),
+            ],
+            options={
+                'verbose_name': 'Location Summary',
+                'verbose_name_plural': 'Location Summary',
+                'ordering': ('id',),
+            },
+        ),
+    ]
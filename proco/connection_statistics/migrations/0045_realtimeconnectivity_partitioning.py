@@ -0,0 +1,83 @@
+from datetime import datetime, time, timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'connection_statistics_realtimeconnectivity'
+SCHOOLS_TABLE = 'schools_school'
+# same as in proco.connection_statistics.partitions at the moment of migration
+RETENTION_DAYS = 30
+AHEAD_DAYS = 7
+
+
+def _get_sequence(schema_editor, table):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+        return cursor.fetchone()[0]
+
+
+def _add_constraints(schema_editor, table, primary_key):
+    schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pk PRIMARY KEY ({primary_key})')
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {table}_school_id_fk FOREIGN KEY (school_id) '
+        f'REFERENCES {SCHOOLS_TABLE} (id) DEFERRABLE INITIALLY DEFERRED',
+    )
+    schema_editor.execute(f'CREATE INDEX {table}_school_id_idx ON {table} (school_id)')
+
+
+def partition_table(apps, schema_editor):
+    sequence = _get_sequence(schema_editor, TABLE)
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    schema_editor.execute(f'ALTER INDEX {TABLE}_pkey RENAME TO {TABLE}_old_pkey')
+
+    # primary key of partitioned table has to include partition key
+    schema_editor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS) PARTITION BY RANGE (created)')
+    schema_editor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+    _add_constraints(schema_editor, TABLE, 'id, created')
+
+    schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    today = timezone.localdate()
+    first_date = today - timedelta(days=RETENTION_DAYS)
+    for days in range(RETENTION_DAYS + AHEAD_DAYS + 1):
+        date = first_date + timedelta(days=days)
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE}_p{date.strftime("%Y%m%d")} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+            [
+                timezone.make_aware(datetime.combine(date, time.min)),
+                timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min)),
+            ],
+        )
+
+    # older data would be removed by the cleanup task anyway
+    schema_editor.execute(
+        f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old WHERE created >= %s',
+        [timezone.make_aware(datetime.combine(first_date, time.min))],
+    )
+    schema_editor.execute(f'DROP TABLE {TABLE}_old')
+
+
+def merge_partitions(apps, schema_editor):
+    sequence = _get_sequence(schema_editor, TABLE)
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    for suffix in ['pk', 'school_id_fk']:
+        schema_editor.execute(f'ALTER TABLE {TABLE}_old RENAME CONSTRAINT {TABLE}_{suffix} TO {TABLE}_old_{suffix}')
+    schema_editor.execute(f'ALTER INDEX {TABLE}_school_id_idx RENAME TO {TABLE}_old_school_id_idx')
+
+    schema_editor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS)')
+    schema_editor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+    schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+    _add_constraints(schema_editor, TABLE, 'id')
+
+    # partitions are dropped together with partitioned table
+    schema_editor.execute(f'DROP TABLE {TABLE}_old')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connection_statistics', '0044_locationstatus'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, merge_partitions),
+    ]
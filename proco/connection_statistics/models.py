@@ -1,5 +1,6 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Case, CharField, F, Q, Value, When
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
@@ -7,8 +8,8 @@ from isoweek import Week
 from model_utils import Choices
 from model_utils.models import TimeStampedModel
 
-from proco.locations.models import Country
-from proco.schools.constants import statuses_schema
+from proco.locations.models import Country, Location
+from proco.schools.constants import ColorMapSchema, statuses_schema
 from proco.schools.models import School
 from proco.utils.dates import get_current_week, get_current_year
 from proco.utils.models import ApproxQuerySet
@@ -105,6 +106,66 @@ class CountryWeeklyStatus(ConnectivityStatistics, TimeStampedModel, models.Model
         self.country.save(update_fields=('date_of_join',))
 
 
+class CountryRegionStatus(ConnectivityStatistics, TimeStampedModel, models.Model):
+    """
+    Schools statuses rolled up by administrative region (admin_1_name ... admin_4_name of school).
+    """
+
+    ADMIN_LEVELS = (1, 2, 3, 4)
+
+    country = models.ForeignKey(Country, related_name='regions_status', on_delete=models.CASCADE)
+    admin_level = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=100)
+    schools_total = models.PositiveIntegerField(blank=True, default=0)
+
+    schools_connectivity_good = models.PositiveIntegerField(blank=True, default=0)
+    schools_connectivity_moderate = models.PositiveIntegerField(blank=True, default=0)
+    schools_connectivity_no = models.PositiveIntegerField(blank=True, default=0)
+    schools_connectivity_unknown = models.PositiveIntegerField(blank=True, default=0)
+
+    schools_coverage_good = models.PositiveIntegerField(blank=True, default=0)
+    schools_coverage_moderate = models.PositiveIntegerField(blank=True, default=0)
+    schools_coverage_no = models.PositiveIntegerField(blank=True, default=0)
+    schools_coverage_unknown = models.PositiveIntegerField(blank=True, default=0)
+
+    class Meta:
+        verbose_name = _('Country Region Summary')
+        verbose_name_plural = _('Country Region Summary')
+        ordering = ('id',)
+        unique_together = ('country', 'admin_level', 'name')
+
+    def __str__(self):
+        return f'{self.country.name} {self.name} (level {self.admin_level})'
+
+
+class LocationStatus(ConnectivityStatistics, TimeStampedModel, models.Model):
+    """
+    Schools statuses rolled up for every node of the location tree, schools of all descendants included.
+    """
+
+    country = models.ForeignKey(Country, related_name='locations_status', on_delete=models.CASCADE)
+    location = models.OneToOneField(Location, related_name='status', on_delete=models.CASCADE)
+    schools_total = models.PositiveIntegerField(blank=True, default=0)
+
+    schools_connectivity_good = models.PositiveIntegerField(blank=True, default=0)
+    schools_connectivity_moderate = models.PositiveIntegerField(blank=True, default=0)
+    schools_connectivity_no = models.PositiveIntegerField(blank=True, default=0)
+    schools_connectivity_unknown = models.PositiveIntegerField(blank=True, default=0)
+
+    schools_coverage_good = models.PositiveIntegerField(blank=True, default=0)
+    schools_coverage_moderate = models.PositiveIntegerField(blank=True, default=0)
+    schools_coverage_no = models.PositiveIntegerField(blank=True, default=0)
+    schools_coverage_unknown = models.PositiveIntegerField(blank=True, default=0)
+
+    class Meta:
+        verbose_name = _('Location Summary')
+        verbose_name_plural = _('Location Summary')
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.country.name} {self.location.name}'
+
+
 class SchoolWeeklyStatus(ConnectivityStatistics, TimeStampedModel, models.Model):
     # unable to use choives as should be (COVERAGE_TYPES.4g), because digit goes first
     COVERAGE_UNKNOWN = 'unknown'
@@ -169,6 +230,81 @@ class SchoolWeeklyStatus(ConnectivityStatistics, TimeStampedModel, models.Model)
         elif availability == CountryWeeklyStatus.COVERAGE_TYPES_AVAILABILITY.coverage_availability:
             return statuses_schema.get_status_by_availability(self.coverage_availability)
 
+    @classmethod
+    def _get_availability_condition(cls, availability, values):
+        # availability can be either a constant (country is known) or F expression pointing to the country status
+        if isinstance(availability, F):
+            return Q(**{f'{availability.name}__in': values})
+        return Q() if availability in values else None
+
+    @classmethod
+    def _get_status_expression(cls, conditions, prefix):
+        whens = [
+            When(availability_condition & status_condition, then=Value(status))
+            for availability_condition, status_conditions in conditions
+            if availability_condition is not None
+            for status_condition, status in status_conditions
+        ]
+        if not whens:
+            return Value(None, output_field=CharField())
+
+        if prefix:
+            # school without weekly status has no status at all
+            whens.insert(0, When(Q(**{f'{prefix}id__isnull': True}), then=Value(None)))
+
+        return Case(*whens, default=Value(None), output_field=CharField())
+
+    @classmethod
+    def get_connectivity_status_expression(cls, availability, prefix=''):
+        """
+        SQL version of get_connectivity_status.
+
+        :param availability: country connectivity availability or F expression pointing to it
+        :param prefix: lookup path to the weekly status, e.g. `last_weekly_status__` for schools queryset
+        """
+        speed = f'{prefix}connectivity_speed'
+        connectivity = f'{prefix}connectivity'
+        types = CountryWeeklyStatus.CONNECTIVITY_TYPES_AVAILABILITY
+
+        return cls._get_status_expression([
+            (cls._get_availability_condition(availability, [types.static_speed, types.realtime_speed]), [
+                (Q(**{f'{speed}__isnull': True}), ColorMapSchema.UNKNOWN),
+                (Q(**{speed: 0}), ColorMapSchema.NO),
+                (Q(**{f'{speed}__gte': statuses_schema.CONNECTIVITY_SPEED_FOR_GOOD_CONNECTIVITY_STATUS}),
+                 ColorMapSchema.GOOD),
+                (Q(**{f'{speed}__isnull': False}), ColorMapSchema.MODERATE),
+            ]),
+            (cls._get_availability_condition(availability, [types.connectivity]), [
+                (Q(**{f'{connectivity}__isnull': True}), ColorMapSchema.UNKNOWN),
+                (Q(**{connectivity: True}), ColorMapSchema.GOOD),
+                (Q(**{connectivity: False}), ColorMapSchema.NO),
+            ]),
+        ], prefix)
+
+    @classmethod
+    def get_coverage_status_expression(cls, availability, prefix=''):
+        """
+        SQL version of get_coverage_status.
+
+        :param availability: country coverage availability or F expression pointing to it
+        :param prefix: lookup path to the weekly status, e.g. `last_weekly_status__` for schools queryset
+        """
+        coverage_type = f'{prefix}coverage_type'
+        coverage_availability = f'{prefix}coverage_availability'
+        types = CountryWeeklyStatus.COVERAGE_TYPES_AVAILABILITY
+
+        return cls._get_status_expression([
+            (cls._get_availability_condition(availability, [types.coverage_type]), [
+                (Q(**{coverage_type: value}), status)
+                for value, status in ColorMapSchema.STATUS_BY_COVERAGE_TYPE.items()
+            ]),
+            (cls._get_availability_condition(availability, [types.coverage_availability]), [
+                (Q(**{f'{coverage_availability}__isnull': True}), ColorMapSchema.UNKNOWN),
+                (Q(**{coverage_availability: True}), ColorMapSchema.GOOD),
+                (Q(**{coverage_availability: False}), ColorMapSchema.NO),
+            ]),
+        ], prefix)
+
 
 class CountryDailyStatus(ConnectivityStatistics, TimeStampedModel, models.Model):
     country = models.ForeignKey(Country, related_name='daily_status', on_delete=models.CASCADE)
@@ -179,6 +315,9 @@ class CountryDailyStatus(ConnectivityStatistics, TimeStampedModel, models.Model)
         verbose_name_plural = _('Country Daily Connectivity Summary')
         ordering = ('id',)
         unique_together = ('date', 'country')
+        indexes = [
+            models.Index(fields=['country', 'date'], name='connection__country_date_idx'),
+        ]
 
     def __str__(self):
         year, week, weekday = self.date.isocalendar()
@@ -196,6 +335,9 @@ class SchoolDailyStatus(ConnectivityStatistics, TimeStampedModel, models.Model):
         verbose_name_plural = _('School Daily Connectivity Summary')
         ordering = ('id',)
         unique_together = ('date', 'school')
+        indexes = [
+            models.Index(fields=['school', 'date'], name='connection__school_date_idx'),
+        ]
 
     def __str__(self):
         year, week, weekday = self.date.isocalendar()
@@ -0,0 +1,116 @@
+from datetime import date as date_type
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from proco.connection_statistics.models import RealTimeConnectivity
+from proco.utils.dates import get_day_bounds
+
+# realtime data is partitioned by day of created field, see migration 0045_realtimeconnectivity_partitioning
+REALTIME_DATA_RETENTION_DAYS = 30
+REALTIME_PARTITIONS_AHEAD_DAYS = 7
+PARTITION_DATE_FORMAT = '%Y%m%d'
+
+
+def _get_table():
+    return RealTimeConnectivity._meta.db_table
+
+
+def _get_partition_prefix():
+    return '{0}_p'.format(_get_table())
+
+
+def get_partition_name(date: date_type) -> str:
+    return _get_partition_prefix() + date.strftime(PARTITION_DATE_FORMAT)
+
+
+def get_default_partition_name() -> str:
+    return '{0}_default'.format(_get_table())
+
+
+def get_realtime_partitions() -> Dict[date_type, str]:
+    """
+    Returns daily partitions of realtime data table by date; default partition is not included.
+    """
+    prefix = _get_partition_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [_get_table()],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        try:
+            partitions[datetime.strptime(name[len(prefix):], PARTITION_DATE_FORMAT).date()] = name
+        except ValueError:
+            continue
+    return partitions
+
+
+def create_realtime_partition(date: date_type):
+    """
+    Creates partition for the date. Rows of that date which were already saved to default partition
+    are moved to the new one, otherwise partition can't be attached.
+    """
+    table, name, default_name = _get_table(), get_partition_name(date), get_default_partition_name()
+    start, end = get_day_bounds(date)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS ('
+            f'DELETE FROM {default_name} WHERE created >= %(start)s AND created < %(end)s RETURNING *'
+            f') INSERT INTO {name} SELECT * FROM moved',
+            {'start': start, 'end': end},
+        )
+        # indexes and constraints of partitioned table are created for the partition automatically
+        cursor.execute(
+            f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%(start)s) TO (%(end)s)',
+            {'start': start, 'end': end},
+        )
+
+
+def drop_realtime_partition(date: date_type):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {get_partition_name(date)}')
+
+
+def maintain_realtime_partitions(today: Optional[date_type] = None) -> Dict[str, List[date_type]]:
+    """
+    Creates missing partitions for retention period and a few days ahead, drops expired ones.
+    Expired data is removed by dropping whole partitions, so no long deletes are needed.
+    """
+    today = today or timezone.localdate()
+    first_date = today - timedelta(days=REALTIME_DATA_RETENTION_DAYS)
+    partitions = get_realtime_partitions()
+
+    created = []
+    for days in range(REALTIME_DATA_RETENTION_DAYS + REALTIME_PARTITIONS_AHEAD_DAYS + 1):
+        date = first_date + timedelta(days=days)
+        if date not in partitions:
+            create_realtime_partition(date)
+            created.append(date)
+
+    dropped = []
+    for date in sorted(partitions):
+        if date < first_date:
+            drop_realtime_partition(date)
+            dropped.append(date)
+
+    # default partition keeps only rows out of partitions range, e.g. late measurements
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {get_default_partition_name()} WHERE created < %s',
+            [get_day_bounds(first_date)[0]],
+        )
+
+    return {'created': created, 'dropped': dropped}
@@ -2,7 +2,9 @@ from rest_framework import serializers
 
 from proco.connection_statistics.models import (
     CountryDailyStatus,
+    CountryRegionStatus,
     CountryWeeklyStatus,
+    LocationStatus,
     SchoolDailyStatus,
     SchoolWeeklyStatus,
 )
@@ -33,6 +35,63 @@ class CountryWeeklyStatusSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class CountryRegionStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CountryRegionStatus
+        fields = (
+            'admin_level',
+            'name',
+            'schools_total',
+            'schools_connectivity_unknown',
+            'schools_connectivity_no',
+            'schools_connectivity_moderate',
+            'schools_connectivity_good',
+            'schools_coverage_unknown',
+            'schools_coverage_no',
+            'schools_coverage_moderate',
+            'schools_coverage_good',
+            'connectivity_speed',
+            'connectivity_latency',
+        )
+        read_only_fields = fields
+
+
+class LocationStatusSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='location_id')
+    name = serializers.ReadOnlyField(source='location.name')
+    level = serializers.ReadOnlyField(source='location.level')
+
+    class Meta:
+        model = LocationStatus
+        fields = (
+            'id',
+            'name',
+            'level',
+            'schools_total',
+            'schools_connectivity_unknown',
+            'schools_connectivity_no',
+            'schools_connectivity_moderate',
+            'schools_connectivity_good',
+            'schools_coverage_unknown',
+            'schools_coverage_no',
+            'schools_coverage_moderate',
+            'schools_coverage_good',
+            'connectivity_speed',
+            'connectivity_latency',
+        )
+        read_only_fields = fields
+
+
+class DetailLocationStatusSerializer(LocationStatusSerializer):
+    children = LocationStatusSerializer(many=True, read_only=True, source='children_status')
+
+    class Meta(LocationStatusSerializer.Meta):
+        fields = LocationStatusSerializer.Meta.fields + (
+            'children',
+        )
+        read_only_fields = fields
+
+
 class SchoolWeeklyStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = SchoolWeeklyStatus
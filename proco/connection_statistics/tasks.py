@@ -1,14 +1,27 @@
 from datetime import timedelta
 
+from django.conf import settings
 from django.utils import timezone
 
 from celery import chain, chord, group
 
-from proco.connection_statistics.models import RealTimeConnectivity
+from proco.connection_statistics.dirty import (
+    get_last_aggregation_date,
+    get_last_aggregation_dates,
+    mark_country_dirty,
+    mark_schools_dirty,
+    pop_dirty_countries,
+    pop_dirty_schools,
+    set_last_aggregation_date,
+)
+from proco.connection_statistics.partitions import maintain_realtime_partitions
 from proco.connection_statistics.utils import (
     aggregate_real_time_data_to_school_daily_status,
     aggregate_school_daily_status_to_school_weekly_status,
     aggregate_school_daily_to_country_daily,
+    get_countries_with_outdated_weekly_status,
+    update_country_locations_status,
+    update_country_regions_status,
     update_country_weekly_status,
 )
 from proco.locations.models import Country
@@ -17,30 +30,67 @@ from proco.schools.loaders.brasil_loader import brasil_statistic_loader
 from proco.taskapp import app
 
 
+def _restore_dirty_data(date, country_id, schools_ids):
+    # data is still not aggregated, so it will be picked up by the next run
+    if schools_ids is not None:
+        mark_schools_dirty((date, country_id, school_id) for school_id in schools_ids)
+    mark_country_dirty(country_id, date)
+
+
 @app.task(soft_time_limit=4 * 60 * 60, time_limit=4 * 60 * 60)
-def aggregate_country_data(_prev_result, country_id, *args):
+def aggregate_country_data(_prev_result, country_id, *args, full=False):
     date = timezone.now().date()
     country = Country.objects.get(id=country_id)
-
-    aggregate_real_time_data_to_school_daily_status(country, date)
-    aggregate_school_daily_to_country_daily(country, date)
-    weekly_data_available = aggregate_school_daily_status_to_school_weekly_status(country)
-    if weekly_data_available:
-        update_country_weekly_status(country)
-
+    # only schools with new data are recalculated, country level statuses are always refreshed
+    schools_ids = pop_dirty_schools(date, country_id)
+    last_aggregation_date = get_last_aggregation_date(country_id)
+    if full or last_aggregation_date is None:
+        # without the previous aggregation date it's unknown which weekly statuses are outdated
+        schools_ids = None
+
+    try:
+        schools_daily_updated = aggregate_real_time_data_to_school_daily_status(
+            country, date, schools_chunk_size=settings.SCHOOL_DAILY_STATUS_CHUNK_SIZE, schools_ids=schools_ids,
+        )
+        aggregate_school_daily_to_country_daily(country, date)
+        weekly_data_available = aggregate_school_daily_status_to_school_weekly_status(
+            country, schools_ids=schools_ids, last_aggregation_date=last_aggregation_date,
+        )
+        if weekly_data_available:
+            update_country_weekly_status(country)
+        update_country_regions_status(country)
+        update_country_locations_status(country)
+    except Exception:  # noqa: B902
+        _restore_dirty_data(date, country_id, schools_ids)
+        raise
+
+    set_last_aggregation_date(country_id, date)
     country.invalidate_country_related_cache()
 
+    return {'country_id': country_id, 'schools_daily_updated': schools_daily_updated}
+
 
 @app.task(soft_time_limit=60 * 60, time_limit=60 * 60)
-def finalize_daily_data(_prev_result, country_id, *args):
+def finalize_daily_data(_prev_result, country_id, *args, full=False):
     date = timezone.now().date() - timedelta(days=1)
     country = Country.objects.get(id=country_id)
-
-    aggregate_real_time_data_to_school_daily_status(country, date)
-    aggregate_school_daily_to_country_daily(country, date)
+    schools_ids = pop_dirty_schools(date, country_id)
+    if full:
+        schools_ids = None
+
+    try:
+        schools_daily_updated = aggregate_real_time_data_to_school_daily_status(
+            country, date, schools_chunk_size=settings.SCHOOL_DAILY_STATUS_CHUNK_SIZE, schools_ids=schools_ids,
+        )
+        aggregate_school_daily_to_country_daily(country, date)
+    except Exception:  # noqa: B902
+        _restore_dirty_data(date, country_id, schools_ids)
+        raise
     # todo: ideally data should be aggregated on monday for all previous week,
     #  but it require a lot of work to re-write weekly aggregates, so only sunday daily data will be updated for now
 
+    return {'country_id': country_id, 'schools_daily_updated': schools_daily_updated}
+
 
 @app.task(soft_time_limit=4 * 60 * 60, time_limit=4 * 60 * 60)
 def update_brasil_schools():
@@ -64,9 +114,11 @@ def finalize_task():
 
 
 @app.task
-def update_real_time_data(today=True):
-    countries_ids = Country.objects.values_list('id', flat=True)
-
+def aggregate_countries_data(*args, today=True, full=False):
+    """
+    Fans out aggregation over countries which received new data since the last run or which weekly statuses
+    are outdated, or over all countries if full.
+    """
     if today:
         date = timezone.now().date()
         aggregate_task = aggregate_country_data
@@ -74,19 +126,39 @@ def update_real_time_data(today=True):
         date = timezone.now().date() - timedelta(days=1)
         aggregate_task = finalize_daily_data
 
-    chain(
-        load_data_from_unicef_db.s(),
-        load_brasil_daily_statistics.s(),
+    countries_ids = pop_dirty_countries(date)
+    if full:
+        countries_ids = list(Country.objects.order_by('id').values_list('id', flat=True))
+    elif today:
+        # weekly statuses of countries without new data can be outdated as well, e.g. on a new week
+        all_countries_ids = list(Country.objects.order_by('id').values_list('id', flat=True))
+        countries_ids = sorted(set(countries_ids) | set(get_countries_with_outdated_weekly_status(
+            date, get_last_aggregation_dates(all_countries_ids),
+        )))
+
+    if countries_ids:
         chord(
             group([
-                aggregate_task.s(country_id, date)
+                aggregate_task.s(None, country_id, date, full=full)
                 for country_id in countries_ids
             ]),
             finalize_task.si(),
-        ),
+        ).delay()
+
+    return countries_ids
+
+
+@app.task
+def update_real_time_data(today=True, full=False):
+    # countries to aggregate are known only after new data is loaded
+    chain(
+        load_data_from_unicef_db.s(),
+        load_brasil_daily_statistics.s(),
+        aggregate_countries_data.si(today=today, full=full),
     ).delay()
 
 
 @app.task
-def clean_old_realtime_data():
-    RealTimeConnectivity.objects.filter(created__lt=timezone.now() - timedelta(days=30)).delete()
+def update_realtime_data_partitions():
+    # expired realtime data is dropped together with its partitions
+    return maintain_realtime_partitions()
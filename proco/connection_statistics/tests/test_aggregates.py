@@ -1,15 +1,27 @@
 from datetime import datetime, timedelta
 
+from django.core.cache import cache
+from django.db import transaction
 from django.test import TestCase
 from django.utils import timezone
 
+from proco.connection_statistics.aggregations import aggregate_statuses, get_pie_chart
+from proco.connection_statistics.dirty import (
+    get_last_aggregation_date,
+    mark_schools_dirty,
+    pop_dirty_countries,
+    pop_dirty_schools,
+    set_last_aggregation_date,
+)
 from proco.connection_statistics.models import (
     CountryDailyStatus,
+    CountryRegionStatus,
     CountryWeeklyStatus,
+    LocationStatus,
     SchoolDailyStatus,
     SchoolWeeklyStatus,
 )
-from proco.connection_statistics.tasks import finalize_daily_data
+from proco.connection_statistics.tasks import aggregate_country_data, finalize_daily_data
 from proco.connection_statistics.tests.factories import (
     CountryDailyStatusFactory,
     RealTimeConnectivityFactory,
@@ -20,9 +32,13 @@ from proco.connection_statistics.utils import (
     aggregate_real_time_data_to_school_daily_status,
     aggregate_school_daily_status_to_school_weekly_status,
     aggregate_school_daily_to_country_daily,
+    get_countries_with_outdated_weekly_status,
+    update_country_locations_status,
+    update_country_regions_status,
     update_country_weekly_status,
 )
-from proco.locations.tests.factories import CountryFactory
+from proco.locations.tests.factories import CountryFactory, LocationFactory
+from proco.schools.constants import ColorMapSchema
 from proco.schools.tests.factories import SchoolFactory
 from proco.utils.dates import get_current_week, get_current_year
 
@@ -35,11 +51,62 @@ class AggregateConnectivityDataTestCase(TestCase):
         RealTimeConnectivityFactory(school=cls.school, connectivity_speed=4000000)
         RealTimeConnectivityFactory(school=cls.school, connectivity_speed=6000000)
 
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
     def test_aggregate_real_time_data_to_school_daily_status(self):
         aggregate_real_time_data_to_school_daily_status(self.country, timezone.now().date())
         self.assertEqual(SchoolDailyStatus.objects.count(approx=False), 1)
         self.assertEqual(SchoolDailyStatus.objects.first().connectivity_speed, 5000000)
 
+    def test_aggregate_real_time_data_single_query(self):
+        SchoolFactory(country=self.country)
+
+        with self.assertNumQueries(1):
+            updated = aggregate_real_time_data_to_school_daily_status(self.country, timezone.now().date())
+        self.assertEqual(updated, 1)
+
+    def test_aggregate_real_time_data_updates_existing_status(self):
+        daily_status = SchoolDailyStatusFactory(
+            school=self.school, date=timezone.now().date(), connectivity_speed=1000000,
+        )
+
+        aggregate_real_time_data_to_school_daily_status(self.country, timezone.now().date())
+        daily_status.refresh_from_db()
+        self.assertEqual(daily_status.connectivity_speed, 5000000)
+        self.assertEqual(SchoolDailyStatus.objects.filter(school=self.school).count(), 1)
+
+    def test_aggregate_real_time_data_by_chunks(self):
+        schools = [SchoolFactory(country=self.country) for _i in range(3)]
+        for school in schools:
+            RealTimeConnectivityFactory(school=school, connectivity_speed=2000000, connectivity_latency=15)
+
+        updated = aggregate_real_time_data_to_school_daily_status(
+            self.country, timezone.now().date(), schools_chunk_size=2,
+        )
+        self.assertEqual(updated, 4)
+        self.assertListEqual(
+            list(SchoolDailyStatus.objects.filter(
+                school__in=schools,
+            ).order_by('school_id').values_list('connectivity_speed', 'connectivity_latency')),
+            [(2000000, 15)] * 3,
+        )
+
+    def test_aggregate_real_time_data_by_schools_ids_chunks(self):
+        schools = [SchoolFactory(country=self.country) for _i in range(3)]
+        for school in schools:
+            RealTimeConnectivityFactory(school=school, connectivity_speed=2000000)
+
+        # one statement per slice of given ids, schools without data are not queried
+        with self.assertNumQueries(2):
+            updated = aggregate_real_time_data_to_school_daily_status(
+                self.country, timezone.now().date(), schools_chunk_size=2,
+                schools_ids=[schools[2].id, self.school.id, schools[0].id],
+            )
+        self.assertEqual(updated, 3)
+        self.assertFalse(SchoolDailyStatus.objects.filter(school=schools[1]).exists())
+
     def test_aggregate_real_time_data_to_country_daily_status(self):
         aggregate_real_time_data_to_school_daily_status(self.country, timezone.now().date())
         aggregate_school_daily_to_country_daily(self.country, timezone.now().date())
@@ -51,12 +118,57 @@ class AggregateConnectivityDataTestCase(TestCase):
         RealTimeConnectivityFactory(
             school=self.school, connectivity_speed=3000000, created=timezone.now() - timedelta(days=1),
         )
+        mark_schools_dirty([(yesterday_status.date, self.country.id, self.school.id)])
 
         finalize_daily_data(None, self.country.id, yesterday_status.date)
         yesterday_status.refresh_from_db()
         self.assertEqual(yesterday_status.connectivity_speed, 3000000)
         self.assertEqual(self.country.daily_status.get(date=yesterday_status.date).connectivity_speed, 3000000)
 
+    def test_aggregate_country_data_dirty_schools_only(self):
+        today = timezone.now().date()
+        other_school = SchoolFactory(country=self.country)
+        RealTimeConnectivityFactory(school=other_school, connectivity_speed=2000000)
+        mark_schools_dirty([(today, self.country.id, other_school.id)])
+        set_last_aggregation_date(self.country.id, today - timedelta(days=1))
+
+        result = aggregate_country_data(None, self.country.id)
+        self.assertEqual(result['schools_daily_updated'], 1)
+        self.assertListEqual(
+            list(SchoolDailyStatus.objects.values_list('school_id', flat=True)), [other_school.id],
+        )
+        self.assertListEqual(pop_dirty_schools(today, self.country.id), [])
+        self.assertEqual(self.country.daily_status.get(date=today).connectivity_speed, 2000000)
+        self.assertEqual(get_last_aggregation_date(self.country.id), today)
+
+    def test_aggregate_country_data_without_last_aggregation_date(self):
+        # without the previous run date country is recalculated completely
+        mark_schools_dirty([(timezone.now().date(), self.country.id, SchoolFactory(country=self.country).id)])
+
+        result = aggregate_country_data(None, self.country.id)
+        self.assertEqual(result['schools_daily_updated'], 1)
+        self.assertEqual(SchoolDailyStatus.objects.get(school=self.school).connectivity_speed, 5000000)
+
+    def test_aggregate_country_data_full(self):
+        result = aggregate_country_data(None, self.country.id, full=True)
+        self.assertEqual(result['schools_daily_updated'], 1)
+        self.assertEqual(SchoolDailyStatus.objects.get(school=self.school).connectivity_speed, 5000000)
+
+    def test_mark_schools_dirty(self):
+        today = timezone.now().date()
+        other_country = CountryFactory()
+        mark_schools_dirty([
+            (today, self.country.id, self.school.id),
+            (today, self.country.id, self.school.id),
+            (today, other_country.id, 100),
+            (today - timedelta(days=1), self.country.id, 200),
+        ])
+
+        self.assertListEqual(pop_dirty_countries(today), sorted([self.country.id, other_country.id]))
+        self.assertListEqual(pop_dirty_countries(today), [])
+        self.assertListEqual(pop_dirty_schools(today, self.country.id), [self.school.id])
+        self.assertListEqual(pop_dirty_schools(today - timedelta(days=1), self.country.id), [200])
+
     def test_aggregate_school_daily_to_country_daily(self):
         today = datetime.now().date()
         SchoolDailyStatusFactory(school__country=self.country, connectivity_speed=4000000, date=today)
@@ -106,6 +218,142 @@ class AggregateConnectivityDataTestCase(TestCase):
         self.assertEqual(SchoolWeeklyStatus.objects.last().connectivity_speed, 5000000)
         self.assertEqual(SchoolWeeklyStatus.objects.last().connectivity, True)
 
+    def test_aggregate_school_daily_status_carries_forward_facilities(self):
+        previous_week = timezone.now() - timedelta(days=7)
+        previous_status = SchoolWeeklyStatusFactory(
+            school=self.school, year=previous_week.isocalendar()[0], week=previous_week.isocalendar()[1],
+            num_students=120, num_computers=4, computer_lab=True,
+        )
+        SchoolDailyStatusFactory(school=self.school, connectivity_speed=4000000, date=datetime.now().date())
+
+        self.assertTrue(aggregate_school_daily_status_to_school_weekly_status(self.country))
+
+        self.school.refresh_from_db()
+        weekly_status = self.school.last_weekly_status
+        self.assertNotEqual(weekly_status, previous_status)
+        self.assertEqual((weekly_status.year, weekly_status.week), (get_current_year(), get_current_week()))
+        self.assertEqual(weekly_status.num_students, 120)
+        self.assertEqual(weekly_status.num_computers, 4)
+        self.assertTrue(weekly_status.computer_lab)
+        self.assertTrue(weekly_status.connectivity)
+        self.assertEqual(weekly_status.connectivity_speed, 4000000)
+
+    def test_aggregate_school_daily_status_keeps_current_facilities(self):
+        current_status = SchoolWeeklyStatusFactory(
+            school=self.school, year=get_current_year(), week=get_current_week(), num_students=80,
+        )
+        SchoolDailyStatusFactory(school=self.school, connectivity_speed=4000000, date=datetime.now().date())
+
+        aggregate_school_daily_status_to_school_weekly_status(self.country)
+
+        current_status.refresh_from_db()
+        self.assertEqual(SchoolWeeklyStatus.objects.filter(school=self.school).count(), 1)
+        self.assertEqual(current_status.num_students, 80)
+        self.assertEqual(current_status.connectivity_speed, 4000000)
+
+    def get_weekly_statuses(self, **kwargs):
+        # aggregation results are rolled back, so dirty and full runs can be compared on the same data
+        savepoint = transaction.savepoint()
+        aggregate_school_daily_status_to_school_weekly_status(self.country, **kwargs)
+        statuses = list(SchoolWeeklyStatus.objects.filter(
+            year=get_current_year(), week=get_current_week(),
+        ).order_by('school_id').values_list(
+            'school_id', 'connectivity_speed', 'connectivity_latency', 'num_students', 'school__last_weekly_status_id',
+        ))
+        transaction.savepoint_rollback(savepoint)
+        return statuses
+
+    def test_aggregate_school_daily_status_dirty_schools_new_week(self):
+        today = datetime.now().date()
+        previous_week = timezone.now() - timedelta(days=7)
+        other_school = SchoolFactory(country=self.country)
+        for school in [self.school, other_school]:
+            SchoolWeeklyStatusFactory(
+                school=school, year=previous_week.isocalendar()[0], week=previous_week.isocalendar()[1],
+                num_students=100,
+            )
+        SchoolDailyStatusFactory(school=self.school, connectivity_speed=4000000, date=today)
+        # other school reported only during the last week, but it still gets status for the new week
+        SchoolDailyStatusFactory(school=other_school, connectivity_speed=2000000, date=today - timedelta(days=3))
+
+        dirty_statuses = self.get_weekly_statuses(schools_ids=[self.school.id])
+        self.assertEqual(len(dirty_statuses), 2)
+        self.assertListEqual(dirty_statuses, self.get_weekly_statuses())
+
+    def test_aggregate_school_daily_status_dirty_schools_expired_data(self):
+        today = datetime.now().date()
+        expired_school, unchanged_school = SchoolFactory(country=self.country), SchoolFactory(country=self.country)
+        # current statuses as they were calculated by the previous run
+        for school, speed in [(self.school, 4000000), (expired_school, 2000000), (unchanged_school, 5000)]:
+            SchoolWeeklyStatusFactory(
+                school=school, year=get_current_year(), week=get_current_week(),
+                connectivity=True, connectivity_speed=speed, connectivity_latency=10,
+            )
+        daily_statuses = [
+            (self.school, 6000000, today),
+            # daily status which was in the window during the previous run
+            (expired_school, 1000000, today - timedelta(days=8)),
+            (expired_school, 3000000, today - timedelta(days=2)),
+            (unchanged_school, 5000, today - timedelta(days=2)),
+        ]
+        for school, speed, date in daily_statuses:
+            SchoolDailyStatusFactory(school=school, connectivity_speed=speed, connectivity_latency=10, date=date)
+
+        dirty_statuses = self.get_weekly_statuses(schools_ids=[self.school.id])
+        self.assertEqual({row[0]: row[1] for row in dirty_statuses}[expired_school.id], 3000000)
+        self.assertListEqual(dirty_statuses, self.get_weekly_statuses())
+
+    def test_aggregate_school_daily_status_dirty_schools_two_days_after_previous_run(self):
+        today = datetime.now().date()
+        expired_school = SchoolFactory(country=self.country)
+        for school, speed in [(self.school, 4000000), (expired_school, 2000000)]:
+            SchoolWeeklyStatusFactory(
+                school=school, year=get_current_year(), week=get_current_week(),
+                connectivity=True, connectivity_speed=speed, connectivity_latency=10,
+            )
+        daily_statuses = [
+            (self.school, 6000000, today),
+            # left the window the day before, when country had no new data and wasn't aggregated
+            (expired_school, 1000000, today - timedelta(days=9)),
+            (expired_school, 3000000, today - timedelta(days=3)),
+        ]
+        for school, speed, date in daily_statuses:
+            SchoolDailyStatusFactory(school=school, connectivity_speed=speed, connectivity_latency=10, date=date)
+
+        dirty_statuses = self.get_weekly_statuses(
+            schools_ids=[self.school.id], last_aggregation_date=today - timedelta(days=2),
+        )
+        self.assertEqual({row[0]: row[1] for row in dirty_statuses}[expired_school.id], 3000000)
+        self.assertListEqual(dirty_statuses, self.get_weekly_statuses())
+
+    def test_get_countries_with_outdated_weekly_status(self):
+        today = datetime.now().date()
+        expired_country, aggregated_country, up_to_date_country, new_week_country, new_country = [
+            CountryFactory() for _i in range(5)
+        ]
+        for country, days in [
+            (expired_country, 9), (aggregated_country, 8), (up_to_date_country, 2), (new_week_country, 2),
+        ]:
+            school = SchoolFactory(country=country)
+            SchoolDailyStatusFactory(school=school, date=today - timedelta(days=days))
+            if country != new_week_country:
+                SchoolWeeklyStatusFactory(school=school, year=get_current_year(), week=get_current_week())
+        last_aggregation_dates = {
+            self.country.id: today - timedelta(days=1),
+            expired_country.id: today - timedelta(days=2),
+            aggregated_country.id: today,
+            up_to_date_country.id: today - timedelta(days=1),
+            new_week_country.id: today - timedelta(days=1),
+        }
+
+        self.assertListEqual(
+            get_countries_with_outdated_weekly_status(today, last_aggregation_dates),
+            sorted([expired_country.id, new_week_country.id, new_country.id]),
+        )
+
+    def test_aggregate_school_daily_status_no_data(self):
+        self.assertFalse(aggregate_school_daily_status_to_school_weekly_status(self.country))
+
     def test_aggregate_school_daily_status_to_school_weekly_status_connectivity_unknown(self):
         # daily status is too old, so it wouldn't be involved into country calculations
         today = datetime.now().date()
@@ -128,3 +376,155 @@ class AggregateConnectivityDataTestCase(TestCase):
         aggregate_school_daily_status_to_school_weekly_status(self.country)
         self.assertEqual(SchoolWeeklyStatus.objects.count(), 1)
         self.assertEqual(SchoolWeeklyStatus.objects.last().connectivity, False)
+
+
+class AggregateStatusesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, connectivity_speed=6000000, connectivity_latency=10,
+            connectivity=True, coverage_type=SchoolWeeklyStatus.COVERAGE_4G,
+        )
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, connectivity_speed=1000000, connectivity_latency=20,
+            connectivity=None, coverage_type=SchoolWeeklyStatus.COVERAGE_UNKNOWN,
+        )
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, connectivity_speed=None, connectivity_latency=None,
+            connectivity=False, coverage_type=SchoolWeeklyStatus.COVERAGE_2G,
+        )
+
+    def test_aggregate_statuses_single_query(self):
+        statuses = SchoolWeeklyStatus.objects.filter(school__country=self.country, _school__isnull=False)
+
+        with self.assertNumQueries(1):
+            stats = aggregate_statuses(statuses)
+
+        self.assertEqual(stats['total'], 3)
+        self.assertEqual(stats['connectivity_speed'], 3500000)
+        self.assertEqual(stats['connectivity_latency'], 15)
+        self.assertEqual(stats['with_connectivity_speed'], 2)
+        self.assertEqual(stats['with_coverage_availability'], 0)
+        self.assertDictEqual(get_pie_chart(stats, 'connectivity_by_speed'), {
+            ColorMapSchema.GOOD: 1, ColorMapSchema.MODERATE: 1, ColorMapSchema.NO: 0, ColorMapSchema.UNKNOWN: 1,
+        })
+        self.assertDictEqual(get_pie_chart(stats, 'connectivity_by_availability'), {
+            ColorMapSchema.GOOD: 1, ColorMapSchema.MODERATE: 0, ColorMapSchema.NO: 1, ColorMapSchema.UNKNOWN: 1,
+        })
+        self.assertDictEqual(get_pie_chart(stats, 'coverage_by_types'), {
+            ColorMapSchema.GOOD: 1, ColorMapSchema.MODERATE: 1, ColorMapSchema.NO: 0, ColorMapSchema.UNKNOWN: 1,
+        })
+        self.assertDictEqual(get_pie_chart(stats), {
+            ColorMapSchema.GOOD: 0, ColorMapSchema.MODERATE: 0, ColorMapSchema.NO: 0, ColorMapSchema.UNKNOWN: 3,
+        })
+
+
+class AggregateCountryRegionsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        cls.country.last_weekly_status.connectivity_availability = \
+            CountryWeeklyStatus.CONNECTIVITY_TYPES_AVAILABILITY.static_speed
+        cls.country.last_weekly_status.save()
+
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, school__admin_1_name='North', school__admin_2_name='Hills',
+            connectivity_speed=6000000, connectivity_latency=10,
+        )
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, school__admin_1_name='North', school__admin_2_name='Lakes',
+            connectivity_speed=0, connectivity_latency=20,
+        )
+        SchoolFactory(country=cls.country, admin_1_name='South')
+        SchoolFactory(country=cls.country)
+
+    def test_update_country_regions_status(self):
+        update_country_regions_status(self.country)
+
+        regions = CountryRegionStatus.objects.filter(country=self.country)
+        self.assertEqual(regions.filter(admin_level=1).count(), 2)
+        self.assertEqual(regions.filter(admin_level=2).count(), 2)
+        self.assertFalse(regions.filter(admin_level=3).exists())
+
+        north = regions.get(admin_level=1, name='North')
+        self.assertEqual(north.schools_total, 2)
+        self.assertEqual(north.schools_connectivity_good, 1)
+        self.assertEqual(north.schools_connectivity_no, 1)
+        self.assertEqual(north.connectivity_speed, 6000000)
+        self.assertEqual(north.connectivity_latency, 15)
+
+        south = regions.get(admin_level=1, name='South')
+        self.assertEqual(south.schools_total, 1)
+        self.assertEqual(south.schools_connectivity_unknown, 1)
+
+    def test_update_replaces_regions(self):
+        update_country_regions_status(self.country)
+        self.country.schools.filter(admin_1_name='South').update(admin_1_name='West')
+        update_country_regions_status(self.country)
+
+        self.assertListEqual(
+            list(CountryRegionStatus.objects.filter(
+                country=self.country, admin_level=1,
+            ).order_by('name').values_list('name', flat=True)),
+            ['North', 'West'],
+        )
+
+
+class AggregateCountryLocationsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        cls.country.last_weekly_status.connectivity_availability = \
+            CountryWeeklyStatus.CONNECTIVITY_TYPES_AVAILABILITY.static_speed
+        cls.country.last_weekly_status.save()
+
+        cls.region = LocationFactory(country=cls.country)
+        cls.district_one = LocationFactory(country=cls.country, parent=cls.region)
+        cls.district_two = LocationFactory(country=cls.country, parent=cls.region)
+        cls.village = LocationFactory(country=cls.country, parent=cls.district_one)
+        cls.other_region = LocationFactory(country=cls.country)
+
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, school__location=cls.village,
+            connectivity_speed=6000000, connectivity_latency=10,
+        )
+        SchoolWeeklyStatusFactory(
+            school__country=cls.country, school__location=cls.district_one,
+            connectivity_speed=0, connectivity_latency=20,
+        )
+        SchoolFactory(country=cls.country, location=cls.district_two)
+        SchoolFactory(country=cls.country, location=cls.other_region)
+        SchoolFactory(country=cls.country, location=None)
+
+    def test_update_country_locations_status(self):
+        update_country_locations_status(self.country)
+
+        statuses = {status.location_id: status for status in LocationStatus.objects.filter(country=self.country)}
+        self.assertEqual(len(statuses), 5)
+
+        region = statuses[self.region.id]
+        self.assertEqual(region.schools_total, 3)
+        self.assertEqual(region.schools_connectivity_good, 1)
+        self.assertEqual(region.schools_connectivity_no, 1)
+        self.assertEqual(region.schools_connectivity_unknown, 1)
+        self.assertEqual(region.connectivity_speed, 6000000)
+        self.assertEqual(region.connectivity_latency, 15)
+
+        district_one = statuses[self.district_one.id]
+        self.assertEqual(district_one.schools_total, 2)
+        self.assertEqual(district_one.schools_connectivity_good, 1)
+
+        self.assertEqual(statuses[self.village.id].schools_total, 1)
+        self.assertEqual(statuses[self.district_two.id].schools_total, 1)
+        self.assertIsNone(statuses[self.district_two.id].connectivity_speed)
+        self.assertEqual(statuses[self.other_region.id].schools_total, 1)
+
+    def test_update_replaces_locations_status(self):
+        update_country_locations_status(self.country)
+        self.country.schools.filter(location=self.other_region).update(location=self.district_two)
+        update_country_locations_status(self.country)
+
+        self.assertEqual(LocationStatus.objects.filter(country=self.country).count(), 5)
+        self.assertEqual(LocationStatus.objects.get(location=self.region).schools_total, 4)
+        self.assertEqual(LocationStatus.objects.get(location=self.other_region).schools_total, 0)
@@ -1,5 +1,6 @@
 import random
 from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 
 from django.core.cache import cache
 from django.test import TestCase
@@ -124,10 +125,11 @@ class CountryDailyStatsApiTestCase(TestAPIViewSetMixin, TestCase):
             reverse('connection_statistics:country-daily-stat', kwargs={
                 'country_code': self.country_one.code.lower(),
             }),
+            data={'page_size': 100},
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['count'], self.country_one_stats_number)
+        self.assertEqual(len(response.data['results']), self.country_one_stats_number)
 
         response = self.forced_auth_req(
             'get',
@@ -135,11 +137,26 @@ class CountryDailyStatsApiTestCase(TestAPIViewSetMixin, TestCase):
                 'country_code': self.country_two.code.lower(),
             }),
         )
-        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_country_weekly_stats_pages(self):
+        url = reverse('connection_statistics:country-daily-stat', kwargs={
+            'country_code': self.country_one.code.lower(),
+        })
+        response = self.forced_auth_req('get', url, data={'page_size': 2})
+        dates = [item['date'] for item in response.data['results']]
+
+        while response.data['next']:
+            cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+            response = self.forced_auth_req('get', url, data={'page_size': 2, 'cursor': cursor})
+            dates.extend(item['date'] for item in response.data['results'])
+
+        self.assertEqual(len(dates), self.country_one_stats_number)
+        self.assertListEqual(dates, sorted(dates))
 
     def test_country_weekly_stats_queries(self):
         code = self.country_one.code.lower()
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(2):
             self.forced_auth_req(
                 'get',
                 reverse('connection_statistics:country-daily-stat', kwargs={
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from proco.connection_statistics.models import RealTimeConnectivity
+from proco.connection_statistics.partitions import (
+    REALTIME_DATA_RETENTION_DAYS,
+    REALTIME_PARTITIONS_AHEAD_DAYS,
+    get_default_partition_name,
+    get_partition_name,
+    get_realtime_partitions,
+    maintain_realtime_partitions,
+)
+from proco.connection_statistics.tests.factories import RealTimeConnectivityFactory
+
+
+class RealTimePartitionsTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+
+    def count_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+    def test_partitions_exist(self):
+        partitions = get_realtime_partitions()
+        self.assertIn(self.today, partitions)
+        self.assertIn(self.today + timedelta(days=REALTIME_PARTITIONS_AHEAD_DAYS), partitions)
+
+        RealTimeConnectivityFactory()
+        self.assertEqual(self.count_rows(get_partition_name(self.today)), 1)
+
+    def test_maintain_partitions(self):
+        future = self.today + timedelta(days=REALTIME_DATA_RETENTION_DAYS + 2)
+        RealTimeConnectivityFactory()
+
+        result = maintain_realtime_partitions(today=future)
+
+        partitions = get_realtime_partitions()
+        self.assertNotIn(self.today, partitions)
+        self.assertIn(self.today, result['dropped'])
+        self.assertIn(future + timedelta(days=REALTIME_PARTITIONS_AHEAD_DAYS), partitions)
+        self.assertEqual(min(partitions), future - timedelta(days=REALTIME_DATA_RETENTION_DAYS))
+        self.assertEqual(RealTimeConnectivity.objects.count(approx=False), 0)
+
+    def test_maintain_partitions_idempotency(self):
+        maintain_realtime_partitions()
+        self.assertDictEqual(maintain_realtime_partitions(), {'created': [], 'dropped': []})
+
+    def test_rows_moved_from_default_partition(self):
+        future = self.today + timedelta(days=REALTIME_PARTITIONS_AHEAD_DAYS + 3)
+        entry = RealTimeConnectivityFactory(created=timezone.now() + timedelta(days=REALTIME_PARTITIONS_AHEAD_DAYS + 3))
+        old_entry = RealTimeConnectivityFactory(
+            created=timezone.now() - timedelta(days=REALTIME_DATA_RETENTION_DAYS + 3),
+        )
+        self.assertEqual(self.count_rows(get_default_partition_name()), 2)
+
+        maintain_realtime_partitions(today=future)
+
+        self.assertEqual(self.count_rows(get_default_partition_name()), 0)
+        self.assertEqual(self.count_rows(get_partition_name(future)), 1)
+        self.assertTrue(RealTimeConnectivity.objects.filter(id=entry.id).exists())
+        self.assertFalse(RealTimeConnectivity.objects.filter(id=old_entry.id).exists())
@@ -1,46 +1,99 @@
 import re
 from datetime import timedelta
+from typing import List
 
-from django.db.models import Avg, Count, Q
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Exists, Max, OuterRef, Q, Sum
 from django.utils import timezone
 
-from proco.connection_statistics.aggregations import (
-    aggregate_connectivity_by_availability,
-    aggregate_connectivity_by_speed,
-    aggregate_connectivity_default,
-    aggregate_coverage_by_availability,
-    aggregate_coverage_by_types,
-    aggregate_coverage_default,
-)
+from isoweek import Week
+
+from proco.connection_statistics.aggregations import aggregate_statuses, get_pie_chart
 from proco.connection_statistics.models import (
     CountryDailyStatus,
+    CountryRegionStatus,
     CountryWeeklyStatus,
+    LocationStatus,
     RealTimeConnectivity,
     SchoolDailyStatus,
     SchoolWeeklyStatus,
 )
-from proco.locations.models import Country
+from proco.locations.models import Country, Location
 from proco.schools.constants import ColorMapSchema
 from proco.schools.models import School
-from proco.utils.dates import get_current_week, get_current_year
-
-
-def aggregate_real_time_data_to_school_daily_status(country, date):
-    schools = RealTimeConnectivity.objects.filter(
-        created__date=date, school__country=country,
-    ).order_by('school').values_list('school', flat=True).order_by('school_id').distinct('school_id')
+from proco.utils.dates import get_current_week, get_current_year, get_day_bounds
+
+
+def _iterate_schools_chunks(country, schools_chunk_size, schools_ids=None):
+    """
+    Yields lookups for chunks of country schools: slices of given ids or keyset batches of all country schools,
+    so every chunk contains existing schools only.
+    """
+    if schools_ids is not None:
+        schools_ids = sorted(schools_ids)
+        for start in range(0, len(schools_ids), schools_chunk_size):
+            yield {'school_id__in': schools_ids[start:start + schools_chunk_size]}
+        return
+
+    schools_qs = School.objects.filter(country=country).order_by('id').values_list('id', flat=True)
+    last_id = None
+    while True:
+        batch_qs = schools_qs if last_id is None else schools_qs.filter(id__gt=last_id)
+        batch = list(batch_qs[:schools_chunk_size])
+        if not batch:
+            return
+        last_id = batch[-1]
+        yield {'school_id__gte': batch[0], 'school_id__lte': last_id}
+
+
+def aggregate_real_time_data_to_school_daily_status(country, date, schools_chunk_size=None, schools_ids=None) -> int:
+    """
+    Averages realtime measurements of country schools into school daily statuses with single upsert statement,
+    optionally for chunks of school ids to keep transactions short. Returns amount of inserted or updated rows.
+    When schools_ids is given, only these schools are recalculated.
+    """
+    if schools_ids is not None and not schools_ids:
+        return 0
+
+    day_start, day_end = get_day_bounds(date)
+    realtime = RealTimeConnectivity.objects.filter(
+        created__gte=day_start, created__lt=day_end, school__country=country,
+    )
 
-    for school in schools:
-        aggregate = RealTimeConnectivity.objects.filter(
-            created__date=date, school=school,
-        ).aggregate(
-            Avg('connectivity_speed'),
-            Avg('connectivity_latency'),
+    if schools_chunk_size:
+        chunks = (
+            realtime.filter(**lookup)
+            for lookup in _iterate_schools_chunks(country, schools_chunk_size, schools_ids=schools_ids)
         )
-        school_daily_status, _ = SchoolDailyStatus.objects.get_or_create(school_id=school, date=date)
-        school_daily_status.connectivity_speed = aggregate['connectivity_speed__avg']
-        school_daily_status.connectivity_latency = aggregate['connectivity_latency__avg']
-        school_daily_status.save()
+    elif schools_ids is not None:
+        chunks = [realtime.filter(school_id__in=schools_ids)]
+    else:
+        chunks = [realtime]
+
+    updated = 0
+    for chunk in chunks:
+        aggregate_sql, params = chunk.order_by().values('school_id').annotate(
+            avg_speed=Avg('connectivity_speed'),
+            avg_latency=Avg('connectivity_latency'),
+        ).query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            # fractional part is dropped as it was when value was saved to integer field
+            cursor.execute(
+                f'INSERT INTO {SchoolDailyStatus._meta.db_table} '
+                f'(created, modified, school_id, date, connectivity_speed, connectivity_latency) '
+                f'SELECT now(), now(), averages.school_id, %s, TRUNC(averages.avg_speed), '
+                f'TRUNC(averages.avg_latency) '
+                f'FROM ({aggregate_sql}) averages '
+                f'ON CONFLICT (date, school_id) DO UPDATE SET '
+                f'connectivity_speed = EXCLUDED.connectivity_speed, '
+                f'connectivity_latency = EXCLUDED.connectivity_latency, '
+                f'modified = EXCLUDED.modified',
+                [date, *params],
+            )
+            updated += cursor.rowcount
+
+    return updated
 
 
 def aggregate_school_daily_to_country_daily(country, date) -> bool:
@@ -62,47 +115,147 @@ def aggregate_school_daily_to_country_daily(country, date) -> bool:
     return True
 
 
-def aggregate_school_daily_status_to_school_weekly_status(country) -> bool:
+def _get_daily_statuses_without_current_weekly(week_ago, year, week):
+    current_weekly = SchoolWeeklyStatus.objects.filter(school_id=OuterRef('school_id'), year=year, week=week)
+    return SchoolDailyStatus.objects.filter(date__gte=week_ago).annotate(
+        has_current_weekly=Exists(current_weekly),
+    ).filter(has_current_weekly=False)
+
+
+def get_countries_with_outdated_weekly_status(date, last_aggregation_dates) -> List[int]:
+    """
+    Countries which school weekly statuses change without new data: daily statuses left the last week window
+    since the last aggregation, or schools with data in the window have no status for the current week yet.
+    Countries not aggregated during the whole window, or never, are included as well.
+    """
+    week_ago = date - timedelta(days=7)
+    expired_dates = dict(
+        SchoolDailyStatus.objects.filter(
+            date__gte=week_ago - timedelta(days=7), date__lt=week_ago,
+        ).order_by().values('school__country_id').annotate(
+            last_date=Max('date'),
+        ).values_list('school__country_id', 'last_date'),
+    )
+    without_current_weekly = set(
+        _get_daily_statuses_without_current_weekly(
+            week_ago, get_current_year(), get_current_week(),
+        ).order_by().values_list('school__country_id', flat=True).distinct(),
+    )
+
+    countries_ids = []
+    for country_id in Country.objects.order_by('id').values_list('id', flat=True):
+        last_date = last_aggregation_dates.get(country_id)
+        if last_date is not None and last_date >= date:
+            continue
+        if last_date is None or last_date < week_ago or country_id in without_current_weekly:
+            countries_ids.append(country_id)
+        elif country_id in expired_dates and expired_dates[country_id] >= last_date - timedelta(days=7):
+            # window of the last aggregation contained daily statuses which are out of the window now
+            countries_ids.append(country_id)
+    return countries_ids
+
+
+def aggregate_school_daily_status_to_school_weekly_status(
+    country, schools_ids=None, last_aggregation_date=None,
+) -> bool:
+    """
+    Averages last week daily statuses of country schools into current weekly statuses with single upsert.
+    School facilities (students, computers, etc.) are carried forward from the previous weekly status.
+    Schools are repointed to the new weekly statuses with second bulk update, so no signals are sent.
+    When schools_ids is given, only these schools are recalculated together with schools which daily statuses
+    left the last week window since last_aggregation_date (yesterday by default), unless some schools
+    have no status for the current week yet.
+    """
     date = timezone.now().date()
     week_ago = date - timedelta(days=7)
-    schools = School.objects.filter(
-        country=country,
-        id__in=SchoolDailyStatus.objects.filter(
-            date__gte=week_ago,
-        ).values_list('school', flat=True).order_by('school_id').distinct('school_id'),
-    ).iterator()
-
-    updated = False
-
-    for school in schools:
-        updated = True
-        school_weekly, created = SchoolWeeklyStatus.objects.get_or_create(
-            school=school, week=get_current_week(),
-            year=get_current_year(),
+    year, week = get_current_year(), get_current_week()
+    weekly_date = Week(year, week).monday()
+    last_aggregation_date = last_aggregation_date or date - timedelta(days=1)
+
+    weekly_table = SchoolWeeklyStatus._meta.db_table
+    daily_table = SchoolDailyStatus._meta.db_table
+    school_table = School._meta.db_table
+
+    schools_condition = ''
+    if schools_ids is not None and not _get_daily_statuses_without_current_weekly(
+        week_ago, year, week,
+    ).filter(school__country=country).exists():
+        # average of the last week changes when old daily statuses leave the window, even without new data
+        schools_condition = (
+            f'AND (daily.school_id = ANY(%(schools_ids)s) OR daily.school_id IN ('
+            f'  SELECT expired.school_id FROM {daily_table} expired '
+            f'  INNER JOIN {school_table} expired_school ON expired_school.id = expired.school_id '
+            f'  WHERE expired_school.country_id = %(country_id)s '
+            f'    AND expired.date >= %(expired_from)s AND expired.date <= %(week_ago)s'
+            f')) '
         )
-
-        aggregate = SchoolDailyStatus.objects.filter(
-            school=school, date__gte=week_ago,
-        ).aggregate(
-            Avg('connectivity_speed'), Avg('connectivity_latency'),
+    carried_fields = (
+        'num_students', 'num_teachers', 'num_classroom', 'num_latrines',
+        'running_water', 'electricity_availability', 'computer_lab', 'num_computers',
+    )
+    carried_defaults = {field: SchoolWeeklyStatus._meta.get_field(field).get_default() for field in carried_fields}
+    carried_columns = ', '.join(carried_fields)
+    carried_values = ', '.join(
+        f'COALESCE(previous.{field}, current_weekly.{field}, %({field})s)' for field in carried_fields
+    )
+    carried_updates = ', '.join(f'{field} = EXCLUDED.{field}' for field in carried_fields)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # values are taken from the previous week if available, otherwise existing row values are kept
+        cursor.execute(
+            f'WITH averages AS ('
+            f'  SELECT daily.school_id, TRUNC(AVG(daily.connectivity_speed)) AS connectivity_speed, '
+            f'    TRUNC(AVG(daily.connectivity_latency)) AS connectivity_latency '
+            f'  FROM {daily_table} daily '
+            f'  INNER JOIN {school_table} school ON school.id = daily.school_id '
+            f'  WHERE school.country_id = %(country_id)s AND daily.date >= %(week_ago)s {schools_condition}'
+            f'  GROUP BY daily.school_id'
+            f') '
+            f'INSERT INTO {weekly_table} '
+            f'(created, modified, school_id, year, week, date, connectivity, connectivity_speed, connectivity_latency, '
+            f'connectivity_type, coverage_availability, coverage_type, {carried_columns}) '
+            f'SELECT now(), now(), averages.school_id, %(year)s, %(week)s, %(date)s, TRUE, '
+            f'averages.connectivity_speed, averages.connectivity_latency, '
+            f'%(connectivity_type)s, NULL, %(coverage_type)s, {carried_values} '
+            f'FROM averages '
+            f'LEFT JOIN LATERAL ('
+            f'  SELECT * FROM {weekly_table} previous '
+            f'  WHERE previous.school_id = averages.school_id AND previous.date < %(date)s '
+            f'  ORDER BY previous.id DESC LIMIT 1'
+            f') previous ON TRUE '
+            f'LEFT JOIN {weekly_table} current_weekly ON current_weekly.school_id = averages.school_id '
+            f'  AND current_weekly.year = %(year)s AND current_weekly.week = %(week)s '
+            f'ON CONFLICT (year, week, school_id) DO UPDATE SET '
+            f'modified = EXCLUDED.modified, connectivity = EXCLUDED.connectivity, '
+            f'connectivity_speed = EXCLUDED.connectivity_speed, connectivity_latency = EXCLUDED.connectivity_latency, '
+            f'{carried_updates}',
+            {
+                'country_id': country.id,
+                'schools_ids': list(schools_ids or []),
+                'expired_from': last_aggregation_date - timedelta(days=7),
+                'week_ago': week_ago,
+                'year': year,
+                'week': week,
+                'date': weekly_date,
+                'connectivity_type': SchoolWeeklyStatus._meta.get_field('connectivity_type').get_default(),
+                'coverage_type': SchoolWeeklyStatus._meta.get_field('coverage_type').get_default(),
+                **carried_defaults,
+            },
+        )
+        updated = cursor.rowcount > 0
+
+        cursor.execute(
+            f'UPDATE {school_table} school SET last_weekly_status_id = weekly.id '
+            f'FROM {weekly_table} weekly '
+            f'WHERE weekly.school_id = school.id AND weekly.year = %(year)s AND weekly.week = %(week)s '
+            f'  AND school.country_id = %(country_id)s '
+            f'  AND school.last_weekly_status_id IS DISTINCT FROM weekly.id '
+            f'  AND NOT EXISTS ('
+            f'    SELECT 1 FROM {weekly_table} last_weekly '
+            f'    WHERE last_weekly.id = school.last_weekly_status_id AND last_weekly.date >= weekly.date'
+            f'  )',
+            {'country_id': country.id, 'year': year, 'week': week},
         )
-
-        school_weekly.connectivity = True
-        school_weekly.connectivity_speed = aggregate['connectivity_speed__avg']
-        school_weekly.connectivity_latency = aggregate['connectivity_latency__avg']
-
-        prev_weekly = SchoolWeeklyStatus.objects.filter(school=school, date__lt=school_weekly.date).last()
-        if prev_weekly:
-            school_weekly.num_students = prev_weekly.num_students
-            school_weekly.num_teachers = prev_weekly.num_teachers
-            school_weekly.num_classroom = prev_weekly.num_classroom
-            school_weekly.num_latrines = prev_weekly.num_latrines
-            school_weekly.running_water = prev_weekly.running_water
-            school_weekly.electricity_availability = prev_weekly.electricity_availability
-            school_weekly.computer_lab = prev_weekly.computer_lab
-            school_weekly.num_computers = prev_weekly.num_computers
-
-        school_weekly.save()
 
     return updated
 
@@ -118,33 +271,34 @@ def update_country_weekly_status(country: Country):
         country.last_weekly_status.integration_status = last_weekly_status_country.integration_status
         country.last_weekly_status.save(update_fields=('integration_status',))
 
-    # calculate pie charts. first we need to understand which case is applicable for country
+    # all pie charts variants are calculated at once, then we choose which case is applicable for country
     latest_statuses = SchoolWeeklyStatus.objects.filter(school__country=country, _school__isnull=False)
+    schools_stats = aggregate_statuses(latest_statuses)
     connectivity_types = CountryWeeklyStatus.CONNECTIVITY_TYPES_AVAILABILITY
     coverage_types = CountryWeeklyStatus.COVERAGE_TYPES_AVAILABILITY
 
     if RealTimeConnectivity.objects.filter(school__country=country).exists():
         country_status.connectivity_availability = connectivity_types.realtime_speed
-        connectivity_stats = aggregate_connectivity_by_speed(latest_statuses)
-    elif latest_statuses.filter(connectivity_speed__gte=0).exists():
+        connectivity_stats = get_pie_chart(schools_stats, 'connectivity_by_speed')
+    elif schools_stats['with_connectivity_speed']:
         country_status.connectivity_availability = connectivity_types.static_speed
-        connectivity_stats = aggregate_connectivity_by_speed(latest_statuses)
-    elif latest_statuses.filter(connectivity__isnull=False).exists():
+        connectivity_stats = get_pie_chart(schools_stats, 'connectivity_by_speed')
+    elif schools_stats['with_connectivity']:
         country_status.connectivity_availability = connectivity_types.connectivity
-        connectivity_stats = aggregate_connectivity_by_availability(latest_statuses)
+        connectivity_stats = get_pie_chart(schools_stats, 'connectivity_by_availability')
     else:
         country_status.connectivity_availability = connectivity_types.no_connectivity
-        connectivity_stats = aggregate_connectivity_default(latest_statuses)
+        connectivity_stats = get_pie_chart(schools_stats)
 
-    if latest_statuses.exclude(coverage_type=SchoolWeeklyStatus.COVERAGE_TYPES.unknown).exists():
+    if schools_stats['with_coverage_type']:
         country_status.coverage_availability = coverage_types.coverage_type
-        coverage_stats = aggregate_coverage_by_types(latest_statuses)
-    elif latest_statuses.filter(coverage_availability__isnull=False).exists():
+        coverage_stats = get_pie_chart(schools_stats, 'coverage_by_types')
+    elif schools_stats['with_coverage_availability']:
         country_status.coverage_availability = coverage_types.coverage_availability
-        coverage_stats = aggregate_coverage_by_availability(latest_statuses)
+        coverage_stats = get_pie_chart(schools_stats, 'coverage_by_availability')
     else:
         country_status.coverage_availability = coverage_types.no_coverage
-        coverage_stats = aggregate_coverage_default(latest_statuses)
+        coverage_stats = get_pie_chart(schools_stats)
 
     # remember connectivity pie chart
     country_status.schools_connectivity_good = connectivity_stats[ColorMapSchema.GOOD]
@@ -158,13 +312,7 @@ def update_country_weekly_status(country: Country):
     country_status.schools_coverage_no = coverage_stats[ColorMapSchema.NO]
     country_status.schools_coverage_unknown = coverage_stats[ColorMapSchema.UNKNOWN]
 
-    # calculate speed & latency where available
-    schools_stats = latest_statuses.aggregate(
-        total=Count('*'),
-        connectivity_speed=Avg('connectivity_speed', filter=Q(connectivity_speed__gt=0)),
-        connectivity_latency=Avg('connectivity_latency', filter=Q(connectivity_latency__gt=0)),
-    )
-
+    # speed & latency where available
     country_status.connectivity_speed = schools_stats['connectivity_speed']
     country_status.connectivity_latency = schools_stats['connectivity_latency']
 
@@ -203,6 +351,132 @@ def update_country_weekly_status(country: Country):
     country_status.save()
 
 
+def _annotate_schools_statuses(country: Country):
+    last_weekly_status = country.last_weekly_status
+    return School.objects.filter(country=country).annotate(
+        connectivity_status=SchoolWeeklyStatus.get_connectivity_status_expression(
+            last_weekly_status.connectivity_availability if last_weekly_status else None,
+            prefix='last_weekly_status__',
+        ),
+        coverage_status=SchoolWeeklyStatus.get_coverage_status_expression(
+            last_weekly_status.coverage_availability if last_weekly_status else None,
+            prefix='last_weekly_status__',
+        ),
+    ).order_by()
+
+
+def _count_status(field, status):
+    condition = Q(**{field: status})
+    if status == ColorMapSchema.UNKNOWN:
+        # schools without status are shown as unknown on the map
+        condition |= Q(**{f'{field}__isnull': True})
+    return Count('id', filter=condition)
+
+
+def _get_statuses_aggregates():
+    return {
+        'schools_total': Count('id'),
+        'schools_connectivity_good': _count_status('connectivity_status', ColorMapSchema.GOOD),
+        'schools_connectivity_moderate': _count_status('connectivity_status', ColorMapSchema.MODERATE),
+        'schools_connectivity_no': _count_status('connectivity_status', ColorMapSchema.NO),
+        'schools_connectivity_unknown': _count_status('connectivity_status', ColorMapSchema.UNKNOWN),
+        'schools_coverage_good': _count_status('coverage_status', ColorMapSchema.GOOD),
+        'schools_coverage_moderate': _count_status('coverage_status', ColorMapSchema.MODERATE),
+        'schools_coverage_no': _count_status('coverage_status', ColorMapSchema.NO),
+        'schools_coverage_unknown': _count_status('coverage_status', ColorMapSchema.UNKNOWN),
+    }
+
+
+def update_country_regions_status(country: Country):
+    schools = _annotate_schools_statuses(country)
+
+    regions = []
+    for admin_level in CountryRegionStatus.ADMIN_LEVELS:
+        name_field = f'admin_{admin_level}_name'
+        regions_stats = schools.exclude(**{name_field: ''}).values(name_field).annotate(
+            **_get_statuses_aggregates(),
+            connectivity_speed=Avg(
+                'last_weekly_status__connectivity_speed', filter=Q(last_weekly_status__connectivity_speed__gt=0),
+            ),
+            connectivity_latency=Avg(
+                'last_weekly_status__connectivity_latency', filter=Q(last_weekly_status__connectivity_latency__gt=0),
+            ),
+        )
+
+        regions.extend(
+            CountryRegionStatus(country=country, admin_level=admin_level, name=stats.pop(name_field), **stats)
+            for stats in regions_stats
+        )
+
+    with transaction.atomic():
+        CountryRegionStatus.objects.filter(country=country).delete()
+        CountryRegionStatus.objects.bulk_create(regions)
+
+
+def update_country_locations_status(country: Country):
+    """
+    Rolls schools statuses up the location tree. Schools are aggregated once per their own location,
+    then totals are pushed to ancestors in a single pass over locations ordered by nested set bounds:
+    node is closed when the next one is outside of its lft/rght range, so its totals go to the parent.
+    """
+    counters = list(_get_statuses_aggregates().keys())
+    schools_stats = _annotate_schools_statuses(country).filter(location__isnull=False).values(
+        'location_id',
+    ).annotate(
+        **_get_statuses_aggregates(),
+        speed_sum=Sum(
+            'last_weekly_status__connectivity_speed', filter=Q(last_weekly_status__connectivity_speed__gt=0),
+        ),
+        speed_count=Count('id', filter=Q(last_weekly_status__connectivity_speed__gt=0)),
+        latency_sum=Sum(
+            'last_weekly_status__connectivity_latency', filter=Q(last_weekly_status__connectivity_latency__gt=0),
+        ),
+        latency_count=Count('id', filter=Q(last_weekly_status__connectivity_latency__gt=0)),
+    )
+    own_stats = {}
+    for stats in schools_stats:
+        own_stats[stats.pop('location_id')] = stats
+    empty_stats = dict.fromkeys(counters + ['speed_sum', 'speed_count', 'latency_sum', 'latency_count'], 0)
+
+    locations_status = []
+    # open nodes of the current tree: (rght, location_id, stats); parent of the node is always the previous one
+    stack = []
+
+    def close_last_node():
+        _rght, location_id, stats = stack.pop()
+        locations_status.append(LocationStatus(
+            country=country,
+            location_id=location_id,
+            connectivity_speed=stats['speed_sum'] / stats['speed_count'] if stats['speed_count'] else None,
+            connectivity_latency=stats['latency_sum'] / stats['latency_count'] if stats['latency_count'] else None,
+            **{counter: stats[counter] for counter in counters},
+        ))
+        if stack:
+            parent_stats = stack[-1][2]
+            for key, value in stats.items():
+                parent_stats[key] += value
+
+    current_tree_id = None
+    locations = Location.objects.filter(country=country).order_by('tree_id', 'lft').values_list(
+        'id', 'tree_id', 'lft', 'rght',
+    )
+    for location_id, tree_id, lft, rght in locations:
+        while stack and (tree_id != current_tree_id or stack[-1][0] < lft):
+            close_last_node()
+        current_tree_id = tree_id
+
+        stats = dict(empty_stats)
+        stats.update((key, value or 0) for key, value in own_stats.get(location_id, {}).items())
+        stack.append((rght, location_id, stats))
+
+    while stack:
+        close_last_node()
+
+    with transaction.atomic():
+        LocationStatus.objects.filter(country=country).delete()
+        LocationStatus.objects.bulk_create(locations_status)
+
+
 def update_country_data_source_by_csv_filename(imported_file):
     match = re.search(r'-(\D+)(?:-\d+)*-[^-]+\.\w+$', imported_file.filename)  # noqa: DUO138
     if match:
@@ -1,27 +1,71 @@
 from django.conf import settings
-from django.db.models import BooleanField, F, Func
+from django.contrib.gis.db.models import MultiPolygonField
+from django.db.models import OuterRef, Subquery
 from django.db.models.functions.text import Lower
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_control
 
 from rest_framework import mixins, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter
-from rest_framework.generics import ListAPIView
+from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.settings import api_settings
 
-from proco.locations.models import Country
+from django_filters.rest_framework import DjangoFilterBackend
+
+from proco.connection_statistics.models import CountryRegionStatus, LocationStatus
+from proco.connection_statistics.serializers import CountryRegionStatusSerializer, DetailLocationStatusSerializer
+from proco.locations.models import Country, CountrySimplifiedGeometry
+from proco.locations.renderers import TopoJSONCountriesRenderer
 from proco.locations.serializers import (
+    BoundaryLevelListCountrySerializer,
     BoundaryListCountrySerializer,
     CountrySerializer,
     DetailCountrySerializer,
+    DetailLevelCountrySerializer,
     ListCountrySerializer,
 )
 from proco.utils.filters import NullsAlwaysLastOrderingFilter
 from proco.utils.mixins import CachedListMixin, CachedRetrieveMixin
 
 
+class CountryGeometryLevelMixin(object):
+    """
+    Allows to request precomputed level of detail for country geometry directly with ?lod=
+    or to pick it by web map zoom with ?zoom=. Without both parameters default geometry is used.
+    """
+
+    LEVEL_KEY = 'lod'
+    ZOOM_KEY = 'zoom'
+
+    def get_geometry_level(self):
+        level = self.request.query_params.get(self.LEVEL_KEY)
+        if level is not None:
+            if level not in map(str, CountrySimplifiedGeometry.LEVELS):
+                raise ValidationError({self.LEVEL_KEY: 'Level of detail should be one of: {0}.'.format(
+                    ', '.join(map(str, CountrySimplifiedGeometry.LEVELS)),
+                )})
+            return int(level)
+
+        zoom = self.request.query_params.get(self.ZOOM_KEY)
+        if zoom is not None:
+            if not zoom.isdigit():
+                raise ValidationError({self.ZOOM_KEY: 'Zoom should be a positive integer.'})
+            return CountrySimplifiedGeometry.get_level_for_zoom(int(zoom))
+
+        return None
+
+    def annotate_geometry_level(self, queryset, level):
+        return queryset.annotate(geometry_lod=Subquery(
+            CountrySimplifiedGeometry.objects.filter(country=OuterRef('pk'), level=level).values('geometry')[:1],
+            output_field=MultiPolygonField(),
+        ))
+
+
 @method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
 class CountryViewSet(
+    CountryGeometryLevelMixin,
     CachedListMixin,
     CachedRetrieveMixin,
     mixins.RetrieveModelMixin,
@@ -32,10 +76,9 @@ class CountryViewSet(
     RETRIEVE_CACHE_KEY_PREFIX = 'COUNTRY_INFO'
 
     pagination_class = None
-    queryset = Country.objects.all().annotate(
-        geometry_empty=Func(F('geometry'), function='ST_IsEmpty', output_field=BooleanField()),
-    ).select_related('last_weekly_status').filter(geometry_empty=False)
+    queryset = Country.objects.filter(has_geometry=True).select_related('last_weekly_status')
     serializer_class = CountrySerializer
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [TopoJSONCountriesRenderer]
     filter_backends = (
         NullsAlwaysLastOrderingFilter, SearchFilter,
     )
@@ -43,29 +86,124 @@ class CountryViewSet(
     ordering_fields = ('name',)
     search_fields = ('name',)
 
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == 'list':
+            # countries list has no geometry
+            renderers = [renderer for renderer in renderers if not isinstance(renderer, TopoJSONCountriesRenderer)]
+        return renderers
+
     def get_serializer_class(self):
         if self.action == 'list':
             serializer_class = ListCountrySerializer
+        elif self.get_geometry_level() is not None:
+            serializer_class = DetailLevelCountrySerializer
         else:
             serializer_class = DetailCountrySerializer
         return serializer_class
 
     def get_object(self):
-        return get_object_or_404(self.queryset.annotate(code_lower=Lower('code')), code_lower=self.kwargs.get('pk'))
+        return get_object_or_404(
+            self.get_queryset().annotate(code_lower=Lower('code')), code_lower=self.kwargs.get('pk'),
+        )
 
     def get_queryset(self):
         qs = super().get_queryset()
         if self.action == 'list':
             qs = qs.defer('geometry', 'geometry_simplified')
+        else:
+            level = self.get_geometry_level()
+            if level is not None:
+                qs = self.annotate_geometry_level(qs.defer('geometry', 'geometry_simplified'), level)
         return qs
 
 
 @method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
-class CountryBoundaryListAPIView(CachedListMixin, ListAPIView):
+class CountryBoundaryListAPIView(CountryGeometryLevelMixin, CachedListMixin, ListAPIView):
     LIST_CACHE_KEY_PREFIX = 'COUNTRY_BOUNDARY'
 
-    queryset = Country.objects.all().annotate(
-        geometry_empty=Func(F('geometry'), function='ST_IsEmpty', output_field=BooleanField()),
-    ).filter(geometry_empty=False).only('id', 'code', 'geometry_simplified')
+    queryset = Country.objects.filter(has_geometry=True)
     serializer_class = BoundaryListCountrySerializer
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [TopoJSONCountriesRenderer]
     pagination_class = None
+
+    def get_list_cache_key(self):
+        level = self.get_geometry_level()
+        if level is None:
+            return super().get_list_cache_key()
+        # different zoom values share the same level, so cache by level only
+        return '{0}_lod_{1}{2}'.format(self.LIST_CACHE_KEY_PREFIX, level, self.get_format_cache_key_suffix())
+
+    def get_serializer_class(self):
+        if self.get_geometry_level() is not None:
+            return BoundaryLevelListCountrySerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        level = self.get_geometry_level()
+        if level is None:
+            return qs.only('id', 'code', 'geometry_simplified')
+        return self.annotate_geometry_level(qs.only('id', 'code'), level)
+
+
+@method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
+class CountryRegionsListAPIView(CachedListMixin, ListAPIView):
+    LIST_CACHE_KEY_PREFIX = 'COUNTRY_REGIONS'
+
+    queryset = CountryRegionStatus.objects.all()
+    serializer_class = CountryRegionStatusSerializer
+    pagination_class = None
+    filter_backends = (
+        DjangoFilterBackend,
+    )
+    filterset_fields = ('admin_level',)
+
+    def get_list_cache_key(self):
+        params = dict(self.request.query_params)
+        params.pop(self.CACHE_KEY, None)
+        params.pop(self.FORMAT_KEY, None)
+        return '{0}_{1}_{2}{3}'.format(
+            self.LIST_CACHE_KEY_PREFIX,
+            self.kwargs['country_code'].lower(),
+            '_'.join(map(lambda x: '{0}_{1}'.format(x[0], x[1]), sorted(params.items()))),
+            self.get_format_cache_key_suffix(),
+        )
+
+    def get_queryset(self):
+        country = get_object_or_404(
+            Country.objects.defer('geometry', 'geometry_simplified').annotate(code_lower=Lower('code')),
+            code_lower=self.kwargs.get('country_code').lower(),
+        )
+        return super().get_queryset().filter(country=country).order_by('admin_level', 'name')
+
+
+@method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
+class LocationStatsAPIView(CachedRetrieveMixin, RetrieveAPIView):
+    """
+    Schools statuses rolled up for the location subtree together with its direct children, used for drill-down maps.
+    """
+
+    RETRIEVE_CACHE_KEY_PREFIX = 'COUNTRY_LOCATIONS'
+
+    queryset = LocationStatus.objects.select_related('location')
+    serializer_class = DetailLocationStatusSerializer
+
+    def get_retrieve_cache_key(self):
+        return '{0}_{1}_{2}{3}'.format(
+            self.RETRIEVE_CACHE_KEY_PREFIX,
+            self.kwargs['country_code'].lower(),
+            self.kwargs['location_id'],
+            self.get_format_cache_key_suffix(),
+        )
+
+    def get_object(self):
+        location_status = get_object_or_404(
+            self.get_queryset().annotate(country_code_lower=Lower('country__code')),
+            country_code_lower=self.kwargs['country_code'].lower(),
+            location_id=self.kwargs['location_id'],
+        )
+        location_status.children_status = list(
+            self.get_queryset().filter(location__parent_id=location_status.location_id).order_by('location__name'),
+        )
+        return location_status
@@ -12,5 +12,15 @@ app_name = 'locations'
 
 urlpatterns = [
     path('countries-boundary/', api.CountryBoundaryListAPIView.as_view(), name='countries-boundary'),
+    path(
+        'countries/<str:country_code>/regions/',
+        api.CountryRegionsListAPIView.as_view(),
+        name='country-regions',
+    ),
+    path(
+        'countries/<str:country_code>/locations/<int:location_id>/stats/',
+        api.LocationStatsAPIView.as_view(),
+        name='country-location-stats',
+    ),
     path('', include(router.urls)),
 ]
@@ -1,12 +1,23 @@
 import csv
 from datetime import datetime
+from itertools import chain
 
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+
+
+class Echo:
+    """
+    File-like object returning written value instead of storing it, so csv writer can feed a stream.
+    """
+
+    def write(self, value):
+        return value
 
 
 class SchoolsCSVWriterBackend:
-    def __init__(self, serializer, country):
-        self.serializer = serializer
+    def __init__(self, rows, fields, country):
+        self.rows = rows
+        self.fields = fields
         self.filename = self.get_filename(country)
 
     def get_filename(self, country):
@@ -15,21 +26,21 @@ class SchoolsCSVWriterBackend:
 
     def writeheader(self, writer, header, labels):
         header = dict(zip(header, labels))
-        writer.writerow(header)
+        return writer.writerow(header)
 
     def remove_underscore(self, field):
         return field.replace('_', ' ')
 
     def write(self):
-        response = HttpResponse(content_type='text/csv')
+        labels = [self.remove_underscore(field.title()) for field in self.fields]
+        writer = csv.DictWriter(Echo(), fieldnames=self.fields)
+
+        response = StreamingHttpResponse(
+            chain(
+                [self.writeheader(writer, self.fields, labels)],
+                (writer.writerow(row) for row in self.rows),
+            ),
+            content_type='text/csv',
+        )
         response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
-
-        csv_header = self.serializer.child.__class__.Meta.fields
-        labels = [self.remove_underscore(field.title()) for field in csv_header]
-        writer = csv.DictWriter(response, fieldnames=csv_header)
-        self.writeheader(writer, csv_header, labels)
-
-        for row in self.serializer.data:
-            writer.writerow(row)
-
         return response
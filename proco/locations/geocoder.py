@@ -0,0 +1,145 @@
+"""
+In-memory reverse geocoding of points to countries.
+
+No STRtree implementation is available in the project, so candidates are pruned by a sweep over points
+sorted by longitude against polygons bounding boxes, vectorized with numpy. Candidates inside a bounding box
+are still checked by prepared geometry one point at a time, so the final classification isn't vectorized.
+"""
+import threading
+
+from django.contrib.gis.geos import MultiPoint, Point
+from django.core.cache import cache
+
+import numpy as np
+
+from proco.locations.models import Country, CountrySubdividedGeometry
+
+
+class CountryIndex(object):
+    """
+    Immutable spatial index of simplified country polygons with their bounding boxes. Points are sorted
+    by longitude, so every polygon checks only points in its bounds, one by one with prepared geometry.
+    """
+
+    def __init__(self, countries_geometries):
+        country_ids, bounds, polygons = [], [], []
+        self.geometries = {}
+        for country_id, geometry in countries_geometries:
+            if geometry is None or geometry.empty:
+                continue
+
+            self.geometries[country_id] = geometry
+            for polygon in geometry:
+                if polygon.empty:
+                    continue
+                country_ids.append(country_id)
+                bounds.append(polygon.extent)
+                polygons.append(polygon.prepared)
+
+        self.country_ids = np.array(country_ids, dtype=np.int64)
+        self.bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+        self.polygons = polygons
+        self._buffered_geometries = {}
+
+    def find_countries(self, lons, lats):
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        result = np.zeros(len(lons), dtype=np.int64)
+        if not len(lons) or not self.polygons:
+            return result
+
+        order = np.argsort(lons, kind='stable')
+        sorted_lons, sorted_lats = lons[order], lats[order]
+        resolved = np.zeros(len(lons), dtype=bool)
+
+        starts = np.searchsorted(sorted_lons, self.bounds[:, 0], side='left')
+        ends = np.searchsorted(sorted_lons, self.bounds[:, 2], side='right')
+        for i, polygon in enumerate(self.polygons):
+            if starts[i] == ends[i]:
+                continue
+
+            candidates_lats = sorted_lats[starts[i]:ends[i]]
+            candidates = np.flatnonzero(
+                ~resolved[starts[i]:ends[i]] & (candidates_lats >= self.bounds[i, 1]) & (
+                    candidates_lats <= self.bounds[i, 3]),
+            ) + starts[i]
+            for candidate in candidates:
+                if polygon.covers(Point(sorted_lons[candidate], sorted_lats[candidate])):
+                    result[order[candidate]] = self.country_ids[i]
+                    resolved[candidate] = True
+
+        return result
+
+    def get_buffered_geometry(self, country_id, margin):
+        key = (country_id, margin)
+        if key not in self._buffered_geometries:
+            geometry = self.geometries.get(country_id)
+            self._buffered_geometries[key] = geometry.buffer(margin).prepared if geometry else None
+        return self._buffered_geometries[key]
+
+
+class CountryGeocoder(object):
+    """
+    Worker-local reverse geocoder answering which country contains lon/lat points without database queries.
+    Index is built lazily from simplified country geometries and rebuilt when country boundaries version changes.
+    """
+
+    # simplified geometry may deviate from the real border by simplification tolerance
+    BORDER_MARGIN = 0.1
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_index(self) -> CountryIndex:
+        version = cache.get(Country.BOUNDARIES_VERSION_CACHE_KEY, 0)
+        if self._index is None or self._version != version:
+            with self._lock:
+                if self._index is None or self._version != version:
+                    self._index = CountryIndex(
+                        Country.objects.filter(geometry_simplified__isnull=False).values_list(
+                            'id', 'geometry_simplified',
+                        ),
+                    )
+                    self._version = version
+        return self._index
+
+    def find_countries(self, lons, lats, exact_fallback=False):
+        """
+        Returns array with country id for every point, zero if point is outside of all countries.
+        With exact_fallback points not found in simplified geometries are checked in database
+        against subdivided country geometries with single query.
+        """
+        result = self.get_index().find_countries(lons, lats)
+
+        if exact_fallback:
+            unresolved = np.flatnonzero(result == 0)
+            if len(unresolved):
+                points = MultiPoint([Point(float(lons[i]), float(lats[i])) for i in unresolved])
+                for point_index, country_id in CountrySubdividedGeometry.get_points_countries(points).items():
+                    result[unresolved[point_index]] = country_id
+
+        return result
+
+    def get_points_outside_country(self, country_id, lons, lats):
+        """
+        Returns mask of points surely located outside of the country: inside other country
+        and far enough from the country border to not be affected by geometry simplification.
+        """
+        index = self.get_index()
+        countries = index.find_countries(lons, lats)
+        outside = (countries != 0) & (countries != country_id)
+
+        buffered_geometry = index.get_buffered_geometry(country_id, self.BORDER_MARGIN)
+        if buffered_geometry is None:
+            # nothing to compare with
+            return np.zeros(len(countries), dtype=bool)
+
+        for i in np.flatnonzero(outside):
+            if buffered_geometry.covers(Point(float(lons[i]), float(lats[i]))):
+                outside[i] = False
+        return outside
+
+
+country_geocoder = CountryGeocoder()
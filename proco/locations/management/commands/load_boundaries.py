@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.gis.gdal import DataSource, GDALException
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from proco.locations.models import Country, GeometryMixin, Location
+from proco.schools.tasks import update_schools_locations
+from proco.utils.tasks import update_countries_boundary_cache
+
+SRID = 4326
+POLYGON_TYPES = ('Polygon', 'MultiPolygon')
+
+
+def prepare_geometry(wkb):
+    # executed in the worker process; geometries are passed as wkb to keep pickling cheap
+    geometry = GeometryMixin.to_multipolygon(GEOSGeometry(memoryview(wkb)))
+    geometry_simplified = GeometryMixin.optimize_geometry(geometry)
+    return bytes(geometry.wkb), bytes(geometry_simplified.wkb)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load countries or admin boundaries geometries from GeoJSON, GeoPackage, shapefile or any other '
+        'format supported by GDAL. Existing countries are updated by code, locations are created or updated '
+        'by country, parent and name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+        parser.add_argument('--layer', type=str, default='0', help='Layer index or name.')
+        parser.add_argument(
+            '--locations', action='store_true',
+            help='Load admin boundaries into locations tree instead of countries geometries.',
+        )
+        parser.add_argument('--code-field', type=str, default='code', help='Field with country code.')
+        parser.add_argument('--name-field', type=str, default='name', help='Field with location name.')
+        parser.add_argument(
+            '--parent-field', type=str, default=None,
+            help='Field with name of existing parent location. Locations are loaded as roots by default.',
+        )
+        parser.add_argument('--parent-level', type=int, default=None, help='Tree level of parent locations.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Simplification processes.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read_features(self, options):
+        try:
+            data_source = DataSource(options['path'])
+            layer_index = options['layer']
+            layer = data_source[int(layer_index) if layer_index.isdigit() else layer_index]
+        except (GDALException, IndexError) as e:
+            raise CommandError(e)
+
+        fields = [options['code_field']]
+        if options['locations']:
+            fields.append(options['name_field'])
+            if options['parent_field']:
+                fields.append(options['parent_field'])
+        missing_fields = set(fields) - set(layer.fields)
+        if missing_fields:
+            raise CommandError('Fields not found in layer: {0}'.format(', '.join(sorted(missing_fields))))
+
+        features, skipped = [], 0
+        for feature in layer:
+            geometry = feature.geom
+            geometry.coord_dim = 2
+            if geometry.geom_type.name not in POLYGON_TYPES or geometry.empty:
+                skipped += 1
+                continue
+
+            if geometry.srs and geometry.srid != SRID:
+                geometry.transform(SRID)
+
+            features.append(({field: feature.get(field) for field in fields}, bytes(geometry.wkb)))
+
+        if skipped:
+            self.stderr.write(f'{skipped} features without polygon geometry skipped')
+        return features
+
+    def prepare_geometries(self, wkbs, workers):
+        # workers are forked to have django configured; they don't touch inherited database connections
+        # and exit without closing them, so transaction of the main process stays untouched
+        chunksize = max(1, len(wkbs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            return [
+                (GEOSGeometry(memoryview(geometry), srid=SRID), GEOSGeometry(memoryview(simplified), srid=SRID))
+                for geometry, simplified in executor.map(prepare_geometry, wkbs, chunksize=chunksize)
+            ]
+
+    def load_countries(self, features, options):
+        countries = {
+            country.code.lower(): country
+            for country in Country.objects.defer('geometry', 'geometry_simplified')
+        }
+
+        matched_countries, wkbs = [], []
+        for values, wkb in features:
+            country = countries.get(str(values[options['code_field']] or '').lower())
+            if not country:
+                self.stderr.write('Unknown country: {0}'.format(values[options['code_field']]))
+                continue
+            matched_countries.append(country)
+            wkbs.append(wkb)
+
+        geometries = self.prepare_geometries(wkbs, options['workers'])
+        for country, (geometry, geometry_simplified) in zip(matched_countries, geometries):
+            country.geometry = geometry
+            country.geometry_simplified = geometry_simplified
+            country.set_has_geometry()
+
+        with transaction.atomic():
+            Country.objects.bulk_update(
+                matched_countries, ['geometry', 'geometry_simplified', 'has_geometry'],
+                batch_size=options['batch_size'],
+            )
+            for country in matched_countries:
+                country.update_derived_geometries()
+                country.invalidate_country_related_cache(fields=['geometry'])
+
+            transaction.on_commit(lambda: update_countries_boundary_cache.delay())
+
+        self.stdout.write(f'{len(matched_countries)} countries updated')
+
+    def load_locations(self, features, options):
+        countries = dict(Country.objects.values_list('code', 'id'))
+        countries = {code.lower(): country_id for code, country_id in countries.items()}
+
+        parents = {}
+        if options['parent_field']:
+            parents_qs = Location.objects.all()
+            if options['parent_level'] is not None:
+                parents_qs = parents_qs.filter(level=options['parent_level'])
+            parents = {
+                (country_id, name): location_id
+                for location_id, country_id, name in parents_qs.values_list('id', 'country_id', 'name')
+            }
+
+        existing_locations = {
+            (location.country_id, location.parent_id, location.name): location
+            for location in Location.objects.only('id', 'country_id', 'parent_id', 'name')
+        }
+
+        locations, wkbs, skipped, seen = [], [], 0, set()
+        for values, wkb in features:
+            country_id = countries.get(str(values[options['code_field']] or '').lower())
+            parent_id = None
+            if options['parent_field']:
+                parent_id = parents.get((country_id, values[options['parent_field']]))
+            if not country_id or (options['parent_field'] and not parent_id):
+                skipped += 1
+                continue
+
+            key = (country_id, parent_id, values[options['name_field']])
+            if key in seen:
+                skipped += 1
+                continue
+            seen.add(key)
+
+            location = existing_locations.get(key)
+            if location is None:
+                # tree fields are filled by the rebuild
+                location = Location(
+                    name=key[2], country_id=country_id, parent_id=parent_id, lft=0, rght=0, tree_id=0, level=0,
+                )
+            locations.append(location)
+            wkbs.append(wkb)
+
+        if skipped:
+            self.stderr.write(f'{skipped} features without known country or parent or duplicated skipped')
+
+        geometries = self.prepare_geometries(wkbs, options['workers'])
+        for location, (geometry, geometry_simplified) in zip(locations, geometries):
+            location.geometry = geometry
+            location.geometry_simplified = geometry_simplified
+
+        new_locations = [location for location in locations if location.pk is None]
+        updated_locations = [location for location in locations if location.pk is not None]
+
+        with transaction.atomic():
+            with Location.objects.disable_mptt_updates():
+                Location.objects.bulk_create(new_locations, batch_size=options['batch_size'])
+                Location.objects.bulk_update(
+                    updated_locations, ['geometry', 'geometry_simplified'], batch_size=options['batch_size'],
+                )
+            if new_locations:
+                Location.objects.rebuild()
+
+            # schools assignment depends on locations geometries
+            for country_id in {location.country_id for location in locations}:
+                transaction.on_commit(lambda country_id=country_id: update_schools_locations.delay(country_id))
+
+        self.stdout.write(f'{len(new_locations)} locations created, {len(updated_locations)} locations updated')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('At least one worker is required')
+
+        features = self.read_features(options)
+        if options['locations']:
+            self.load_locations(features, options)
+        else:
+            self.load_countries(features, options)
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.18 on 2021-05-04 10:12
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_simplified_geometries(apps, schema_editor):
+    schema_editor.execute(
+        'INSERT INTO locations_countrysimplifiedgeometry (country_id, level, geometry) '
+        'SELECT country.id, levels.level, ST_Multi(ST_SimplifyPreserveTopology(country.geometry, levels.tolerance)) '
+        'FROM locations_country country '
+        'CROSS JOIN (VALUES (0, 0.1::float), (1, 0.03::float), (2, 0.01::float), (3, 0.003::float)) '
+        'AS levels (level, tolerance) '
+        'WHERE country.geometry IS NOT NULL AND NOT ST_IsEmpty(country.geometry)',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0011_auto_20210415_0731'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountrySimplifiedGeometry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('geometry', django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simplified_geometries', to='locations.Country')),
+            ],
+            options={
+                'unique_together': {('country', 'level')},
+            },
+        ),
+        migrations.RunPython(fill_simplified_geometries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.18 on 2021-05-11 09:27
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_subdivided_geometries(apps, schema_editor):
+    schema_editor.execute(
+        'INSERT INTO locations_countrysubdividedgeometry (country_id, geometry) '
+        'SELECT pieces.country_id, pieces.geometry FROM ('
+        '  SELECT country.id AS country_id, (ST_Dump(ST_Subdivide(country.geometry, 256))).geom AS geometry '
+        '  FROM locations_country country '
+        '  WHERE country.geometry IS NOT NULL AND NOT ST_IsEmpty(country.geometry)'
+        ') pieces '
+        "WHERE GeometryType(pieces.geometry) = 'POLYGON'",
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0012_countrysimplifiedgeometry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountrySubdividedGeometry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geometry', django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subdivided_geometries', to='locations.Country')),
+            ],
+        ),
+        migrations.RunPython(fill_subdivided_geometries, migrations.RunPython.noop),
+    ]
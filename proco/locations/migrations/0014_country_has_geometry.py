@@ -0,0 +1,25 @@
+# Generated by Django 2.2.19 on 2021-05-18 08:41
+
+from django.db import migrations, models
+
+
+def fill_has_geometry(apps, schema_editor):
+    schema_editor.execute(
+        'UPDATE locations_country SET has_geometry = geometry IS NOT NULL AND NOT ST_IsEmpty(geometry)',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0013_countrysubdividedgeometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='has_geometry',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(fill_has_geometry, migrations.RunPython.noop),
+    ]
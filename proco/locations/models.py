@@ -1,17 +1,21 @@
-from django.contrib.gis.db.models import MultiPolygonField
-from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Polygon
-from django.db import models
+from django.conf import settings
+from django.contrib.gis.db.models import MultiPolygonField, PolygonField
+from django.contrib.gis.geos import GEOSGeometry, MultiPoint, MultiPolygon, Polygon
+from django.contrib.postgres.aggregates import StringAgg
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 
 import numpy as np
+from model_utils import FieldTracker
 from model_utils.models import TimeStampedModel
 from mptt.models import MPTTModel, TreeForeignKey
-from sklearn.cluster import MiniBatchKMeans
-from sklearn.neighbors import DistanceMetric
 
 from proco.locations.managers import CountryManager
 from proco.locations.utils import get_random_name_image
 from proco.utils.cache import cache_manager
+from proco.utils.geometry import estimate_mean_pairwise_distance
 
 
 class GeometryMixin(models.Model):
@@ -44,13 +48,47 @@ class GeometryMixin(models.Model):
 
         return geometry
 
+    def is_geometry_changed(self, update_fields=None):
+        if update_fields is not None and 'geometry' not in update_fields:
+            return False
+
+        # tracker should be declared in every concrete model, it's not inherited from abstract one
+        tracker = getattr(self, 'tracker', None)
+        return tracker is None or tracker.has_changed('geometry')
+
     def save(self, *args, **kwargs):
-        self.geometry_simplified = self.optimize_geometry(self.geometry)
+        update_fields = kwargs.get('update_fields')
+        if self.is_geometry_changed(update_fields):
+            self.geometry_simplified = self.optimize_geometry(self.geometry)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'geometry_simplified'}
 
         super().save(*args, **kwargs)
 
 
 class Country(GeometryMixin, TimeStampedModel):
+    DATA_VERSION_CACHE_KEY = 'COUNTRY_DATA_VERSION_{0}'
+    # changed every time geometry of any country changed; used to rebuild in-process country geocoder
+    BOUNDARIES_VERSION_CACHE_KEY = 'COUNTRY_BOUNDARIES_VERSION'
+    AVG_DISTANCE_SCHOOL_CACHE_KEY = 'COUNTRY_AVG_DISTANCE_SCHOOL_{0}'
+
+    COUNTRY_INFO_CACHE_KEYS = ('COUNTRIES_LIST*', 'COUNTRY_INFO_pk_{code}', 'COUNTRY_INFO_pk_{code}_*')
+    RELATED_CACHE_KEYS = COUNTRY_INFO_CACHE_KEYS + (
+        'GLOBAL_STATS', 'SCHOOLS_{code}_*', 'COUNTRY_REGIONS_{code}_*', 'COUNTRY_LOCATIONS_{code}_*',
+    )
+    # cache keys affected by change of country field; schools data version is changed together with schools keys
+    FIELDS_RELATED_CACHE_KEYS = {
+        'name': COUNTRY_INFO_CACHE_KEYS,
+        'flag': COUNTRY_INFO_CACHE_KEYS,
+        'map_preview': COUNTRY_INFO_CACHE_KEYS,
+        'description': COUNTRY_INFO_CACHE_KEYS,
+        'data_source': COUNTRY_INFO_CACHE_KEYS,
+        'date_of_join': COUNTRY_INFO_CACHE_KEYS,
+        'date_schools_mapped': COUNTRY_INFO_CACHE_KEYS,
+        'last_weekly_status': COUNTRY_INFO_CACHE_KEYS + ('GLOBAL_STATS', 'SCHOOLS_{code}_*'),
+        'geometry': COUNTRY_INFO_CACHE_KEYS + ('COUNTRY_BOUNDARY*',),
+    }
+
     name = models.CharField(max_length=255)
     code = models.CharField(max_length=32)
 
@@ -63,6 +101,9 @@ class Country(GeometryMixin, TimeStampedModel):
     date_of_join = models.DateField(null=True, blank=True, default=None)
     date_schools_mapped = models.DateField(null=True, blank=True, default=None)
 
+    # kept in sync with geometry, so countries can be filtered without reading heavy geometry column
+    has_geometry = models.BooleanField(default=False, db_index=True, editable=False)
+
     last_weekly_status = models.ForeignKey(
         'connection_statistics.CountryWeeklyStatus',
         null=True,
@@ -72,6 +113,10 @@ class Country(GeometryMixin, TimeStampedModel):
     )
 
     objects = CountryManager()
+    tracker = FieldTracker(fields=(
+        'name', 'code', 'flag', 'map_preview', 'description', 'data_source',
+        'date_of_join', 'date_schools_mapped', 'last_weekly_status', 'geometry',
+    ))
 
     class Meta:
         ordering = ('name',)
@@ -81,40 +126,97 @@ class Country(GeometryMixin, TimeStampedModel):
     def __str__(self):
         return f'{self.name}'
 
-    def invalidate_country_related_cache(self):
-        cache_manager.invalidate((
-            'GLOBAL_STATS',
-            'COUNTRIES_LIST*',
-            'COUNTRY_INFO_pk_{0}'.format(self.code.lower()),
-            'SCHOOLS_{0}_*'.format(self.code.lower()),
-        ))
+    @property
+    def data_version(self):
+        # changed every time country related cache invalidated; useful for versioned cache keys
+        return cache.get(self.DATA_VERSION_CACHE_KEY.format(self.id), 0)
+
+    def _invalidate_cache_keys(self, keys, code):
+        keys = set(keys)
+        if 'SCHOOLS_{code}_*' in keys:
+            cache.set(self.DATA_VERSION_CACHE_KEY.format(self.id), timezone.now().timestamp(), None)
+        cache_manager.invalidate(tuple(key.format(code=code.lower()) for key in sorted(keys)))
+
+    def invalidate_country_related_cache(self, fields=None):
+        if fields is None:
+            keys = self.RELATED_CACHE_KEYS
+        else:
+            keys = [key for field in fields for key in self.FIELDS_RELATED_CACHE_KEYS.get(field, ())]
+
+        if keys:
+            self._invalidate_cache_keys(keys, self.code)
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        is_new = self._state.adding
+        changed_fields = set(self.tracker.changed())
+        if update_fields is not None:
+            changed_fields &= set(update_fields)
+        previous_code = self.tracker.previous('code')
+
+        if self.is_geometry_changed(update_fields):
+            self.set_has_geometry()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'has_geometry'}
+
         super().save(*args, **kwargs)
-        self.invalidate_country_related_cache()
-        cache_manager.invalidate('COUNTRY_BOUNDARY')
 
-    def _calculate_batch_avg_distance_school(self, points):
-        earth_radius = 6371.0088
-        dist = DistanceMetric.get_metric('haversine')
-        distances = dist.pairwise(np.radians(points))
-        indexes = np.tril_indices(n=distances.shape[0], k=-1, m=distances.shape[1])
-        return earth_radius * np.mean(distances[indexes])
+        if 'geometry' in changed_fields:
+            self.update_derived_geometries()
+
+        if is_new or 'code' in changed_fields:
+            # all keys depend on country code, including ones already cached for the previous value
+            if previous_code and previous_code != self.code:
+                self._invalidate_cache_keys(self.RELATED_CACHE_KEYS, previous_code)
+            self.invalidate_country_related_cache()
+            cache_manager.invalidate('COUNTRY_BOUNDARY*')
+        else:
+            self.invalidate_country_related_cache(fields=changed_fields)
+
+        if 'geometry' in changed_fields:
+            # boundaries are heavy to render, so they are prepared in advance
+            from proco.utils.tasks import update_countries_boundary_cache
+            transaction.on_commit(lambda: update_countries_boundary_cache.delay(country_code=self.code))
+
+    def set_has_geometry(self):
+        self.has_geometry = self.geometry is not None and not self.geometry.empty
+
+    def update_derived_geometries(self):
+        # should be called every time geometry is changed, including bulk updates skipping save
+        CountrySimplifiedGeometry.update_country_levels(self)
+        CountrySubdividedGeometry.update_country_pieces(self)
+        cache.set(self.BOUNDARIES_VERSION_CACHE_KEY, timezone.now().timestamp(), None)
+
+    def get_schools_fingerprint(self):
+        # changed when any school is added, removed or moved
+        return self.schools.filter(geopoint__isnull=False).aggregate(fingerprint=models.Func(
+            StringAgg(
+                models.Func(models.F('geopoint'), function='ST_GeoHash', output_field=models.CharField()),
+                ',', ordering='id',
+            ),
+            function='md5', output_field=models.CharField(),
+        ))['fingerprint']
 
     def calculate_avg_distance_school(self):
-        schools_count = self.schools.count()
-        schools_point = self.schools.annotate(
+        cache_key = self.AVG_DISTANCE_SCHOOL_CACHE_KEY.format(self.id)
+        fingerprint = self.get_schools_fingerprint()
+        cached_value = cache.get(cache_key)
+        if cached_value and cached_value['fingerprint'] == fingerprint:
+            return cached_value['value']
+
+        schools_points = self.schools.filter(geopoint__isnull=False).annotate(
             lon=models.Func(models.F('geopoint'), function='ST_X', output_field=models.FloatField()),
             lat=models.Func(models.F('geopoint'), function='ST_Y', output_field=models.FloatField()),
         ).values_list('lat', 'lon')
 
-        if schools_count < 2:
-            return None
-        elif schools_count < 5000:
-            return self._calculate_batch_avg_distance_school(schools_point)
-        else:
-            kmeans = MiniBatchKMeans(n_clusters=5000, batch_size=250, random_state=0).fit(schools_point)
-            return self._calculate_batch_avg_distance_school(kmeans.cluster_centers_)
+        value = estimate_mean_pairwise_distance(
+            np.fromiter(
+                (coordinate for point in schools_points.iterator() for coordinate in point), dtype=np.float64,
+            ),
+            relative_error=settings.AVG_DISTANCE_SCHOOL_RELATIVE_ERROR,
+        )
+        cache.set(cache_key, {'fingerprint': fingerprint, 'value': value}, None)
+        return value
 
     def _clear_data_country(self):
         from proco.connection_statistics.models import CountryWeeklyStatus
@@ -126,6 +228,98 @@ class Country(GeometryMixin, TimeStampedModel):
         self.save(update_fields=('last_weekly_status',))
 
 
+class CountrySimplifiedGeometry(models.Model):
+    # level of detail -> topology preserving simplification tolerance in degrees; the higher level the more details
+    LEVELS_TOLERANCE = (
+        (0, 0.1),
+        (1, 0.03),
+        (2, 0.01),
+        (3, 0.003),
+    )
+    LEVELS = tuple(level for level, _tolerance in LEVELS_TOLERANCE)
+
+    country = models.ForeignKey(Country, related_name='simplified_geometries', on_delete=models.CASCADE)
+    level = models.PositiveSmallIntegerField()
+    geometry = MultiPolygonField()
+
+    class Meta:
+        unique_together = ('country', 'level')
+
+    def __str__(self):
+        return f'{self.country} - {self.level}'
+
+    @classmethod
+    def get_level_for_zoom(cls, zoom: int) -> int:
+        # every level covers two zoom levels of the web map
+        return min(max(zoom, 0) // 2, cls.LEVELS[-1])
+
+    @classmethod
+    def update_country_levels(cls, country):
+        cls.objects.filter(country=country).delete()
+
+        # simplification done completely in database, geometries never travel to python
+        with connection.cursor() as cursor:
+            levels_values = ', '.join(['(%s, %s::float)'] * len(cls.LEVELS_TOLERANCE))
+            cursor.execute(
+                f'INSERT INTO {cls._meta.db_table} (country_id, level, geometry) '
+                f'SELECT country.id, levels.level, '
+                f'ST_Multi(ST_SimplifyPreserveTopology(country.geometry, levels.tolerance)) '
+                f'FROM {Country._meta.db_table} country '
+                f'CROSS JOIN (VALUES {levels_values}) AS levels (level, tolerance) '
+                f'WHERE country.id = %s AND country.geometry IS NOT NULL AND NOT ST_IsEmpty(country.geometry)',
+                [value for level_tolerance in cls.LEVELS_TOLERANCE for value in level_tolerance] + [country.id],
+            )
+
+
+class CountrySubdividedGeometry(models.Model):
+    """
+    Country geometry split into small pieces with limited number of vertices. Point in polygon checks against them
+    are cheap and use spatial index, so they should be used instead of full country geometry.
+    """
+
+    MAX_VERTICES = 256
+
+    country = models.ForeignKey(Country, related_name='subdivided_geometries', on_delete=models.CASCADE)
+    geometry = PolygonField()
+
+    def __str__(self):
+        return f'{self.country} - {self.id}'
+
+    @classmethod
+    def update_country_pieces(cls, country):
+        cls.objects.filter(country=country).delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {cls._meta.db_table} (country_id, geometry) '
+                f'SELECT pieces.country_id, pieces.geometry FROM ('
+                f'  SELECT country.id AS country_id, (ST_Dump(ST_Subdivide(country.geometry, %s))).geom AS geometry '
+                f'  FROM {Country._meta.db_table} country '
+                f'  WHERE country.id = %s AND country.geometry IS NOT NULL AND NOT ST_IsEmpty(country.geometry)'
+                f') pieces '
+                f"WHERE GeometryType(pieces.geometry) = 'POLYGON'",
+                [cls.MAX_VERTICES, country.id],
+            )
+
+    @classmethod
+    def get_points_countries(cls, points: MultiPoint) -> dict:
+        """
+        Returns country id for every point covered by any country, keys are indexes of points in collection
+        """
+        if not points:
+            return {}
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT DISTINCT ON (points.path[1]) points.path[1] - 1, pieces.country_id '
+                f'FROM ST_Dump(ST_SetSRID(ST_GeomFromWKB(%s), 4326)) points '
+                f'INNER JOIN {cls._meta.db_table} pieces ON ST_Intersects(pieces.geometry, points.geom) '
+                f'ORDER BY points.path[1], pieces.country_id',
+                [bytes(points.wkb)],
+            )
+            return dict(cursor.fetchall())
+
+
 class Location(GeometryMixin, TimeStampedModel, MPTTModel):
     name = models.CharField(max_length=255)
     country = models.ForeignKey(Country, related_name='country_location', on_delete=models.CASCADE)
@@ -138,6 +332,8 @@ class Location(GeometryMixin, TimeStampedModel, MPTTModel):
         on_delete=models.CASCADE,
     )
 
+    tracker = FieldTracker(fields=('geometry',))
+
     class Meta:
         ordering = ('id',)
 
@@ -0,0 +1,46 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from proco.utils.topojson import DEFAULT_QUANTIZATION, build_topology
+
+
+class TopoJSONCountriesRenderer(BaseRenderer):
+    """
+    Renders countries as TopoJSON topology: borders shared by neighbours are stored once
+    and coordinates are quantized and delta-encoded. Fields except geometry are kept in properties.
+    """
+
+    media_type = 'application/vnd.proco.topojson+json'
+    format = 'topojson'
+    charset = None
+
+    object_name = 'countries'
+    geometry_fields = ('geometry_simplified', 'geometry')
+    quantization = DEFAULT_QUANTIZATION
+
+    def _render_error(self, data, accepted_media_type, renderer_context):
+        response = renderer_context.get('response') if renderer_context else None
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, accepted_media_type, renderer_context)
+
+    def _get_feature(self, item):
+        item = dict(item)
+        geometry = None
+        for field in self.geometry_fields:
+            if field in item:
+                geometry = item.pop(field)
+                break
+        return item.pop('id', None), item, geometry
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = renderer_context.get('response') if renderer_context else None
+        if response is not None and response.exception:
+            return self._render_error(data, accepted_media_type, renderer_context)
+
+        items = data if isinstance(data, list) else [data]
+        topology = build_topology(
+            [self._get_feature(item) for item in items], self.object_name, quantization=self.quantization,
+        )
+        return json.dumps(topology, separators=(',', ':')).encode('utf-8')
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from rest_framework_gis.fields import GeometryField
+
 from proco.connection_statistics.serializers import CountryWeeklyStatusSerializer
 from proco.locations.models import Country
 
@@ -37,6 +39,10 @@ class BoundaryListCountrySerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class BoundaryLevelListCountrySerializer(BoundaryListCountrySerializer):
+    geometry_simplified = GeometryField(source='geometry_lod', read_only=True)
+
+
 class ListCountrySerializer(BaseCountrySerializer):
     integration_status = serializers.SerializerMethodField()
     schools_with_data_percentage = serializers.SerializerMethodField()
@@ -75,3 +81,7 @@ class DetailCountrySerializer(BaseCountrySerializer):
 
     def get_statistics(self, instance):
         return CountryWeeklyStatusSerializer(instance.last_weekly_status if instance.last_weekly_status else None).data
+
+
+class DetailLevelCountrySerializer(DetailCountrySerializer):
+    geometry = GeometryField(source='geometry_lod', read_only=True)
@@ -1,3 +1,5 @@
+import json
+
 from django.contrib.gis.geos import GEOSGeometry
 from django.core.cache import cache
 from django.test import TestCase
@@ -6,9 +8,11 @@ from django.urls import reverse
 from rest_framework import status
 
 from proco.connection_statistics.tests.factories import CountryWeeklyStatusFactory
-from proco.locations.tests.factories import CountryFactory
+from proco.connection_statistics.utils import update_country_locations_status, update_country_regions_status
+from proco.locations.models import Country, CountrySimplifiedGeometry
+from proco.locations.tests.factories import CountryFactory, LocationFactory
 from proco.schools.tests.factories import SchoolFactory
-from proco.utils.tests import TestAPIViewSetMixin
+from proco.utils.tests import APITestCaseMixin, TestAPIViewSetMixin
 
 
 class CountryApiTestCase(TestAPIViewSetMixin, TestCase):
@@ -43,6 +47,41 @@ class CountryApiTestCase(TestAPIViewSetMixin, TestCase):
             )
         self.assertIn('statistics', response.data)
 
+    def test_country_detail_level_of_detail(self):
+        with self.assertNumQueries(1):
+            response = self.forced_auth_req('get', self.get_detail_url(self.country_one), data={'lod': 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['geometry']['coordinates'],
+            json.loads(self.country_one.simplified_geometries.get(level=0).geometry.json)['coordinates'],
+        )
+
+    def test_country_detail_level_cached_separately(self):
+        response = self.forced_auth_req('get', self.get_detail_url(self.country_one))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            response = self.forced_auth_req('get', self.get_detail_url(self.country_one), data={'lod': 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.forced_auth_req('get', self.get_detail_url(self.country_one), data={'lod': 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_country_detail_topojson(self):
+        response = self.forced_auth_req('get', self.get_detail_url(self.country_one), data={'format': 'topojson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        geometries = json.loads(response.content)['objects']['countries']['geometries']
+        self.assertEqual(len(geometries), 1)
+        self.assertEqual(geometries[0]['id'], self.country_one.id)
+        self.assertEqual(geometries[0]['type'], 'MultiPolygon')
+        self.assertIn('statistics', geometries[0]['properties'])
+
+    def test_country_list_topojson_not_available(self):
+        response = self.forced_auth_req('get', self.get_list_url(), data={'format': 'topojson'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_country_list_cached(self):
         with self.assertNumQueries(1):
             self._test_list(
@@ -54,6 +93,29 @@ class CountryApiTestCase(TestAPIViewSetMixin, TestCase):
                 user=None, expected_objects=[self.country_one, self.country_two],
             )
 
+    def test_country_list_not_modified(self):
+        response = self._test_list(
+            user=None, expected_objects=[self.country_one, self.country_two],
+        )
+        self.assertIn('ETag', response)
+
+        with self.assertNumQueries(0):
+            response = self.forced_auth_req(
+                'get', self.get_list_url(), HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_country_list_cached_compressed(self):
+        response = self._test_list(
+            user=None, expected_objects=[self.country_one, self.country_two],
+        )
+
+        for encoding in ['gzip', 'br']:
+            cached_response = self.forced_auth_req('get', self.get_list_url(), HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(cached_response['Content-Encoding'], encoding)
+            self.assertEqual(cached_response.data, json.loads(response.content))
+
     def test_empty_countries_hidden(self):
         CountryFactory(geometry=GEOSGeometry('{"type": "MultiPolygon", "coordinates": []}'))
         self._test_list(
@@ -90,8 +152,176 @@ class CountryBoundaryApiTestCase(TestAPIViewSetMixin, TestCase):
             response = self.forced_auth_req('get', reverse(self.base_view))
             self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_countries_list_topojson(self):
+        with self.assertNumQueries(1):
+            response = self.forced_auth_req('get', reverse(self.base_view), data={'format': 'topojson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.proco.topojson+json')
+
+        topology = json.loads(response.content)
+        self.assertEqual(topology['type'], 'Topology')
+        geometries = topology['objects']['countries']['geometries']
+        self.assertCountEqual([g['id'] for g in geometries], [self.country_one.id, self.country_two.id])
+        self.assertEqual(geometries[0]['properties'], {'code': Country.objects.get(id=geometries[0]['id']).code})
+
+        # both countries have the same borders, so all arcs are shared
+        self.assertListEqual(geometries[0]['arcs'], geometries[1]['arcs'])
+
+    def test_countries_list_topojson_cached(self):
+        response = self.forced_auth_req('get', reverse(self.base_view), data={'format': 'topojson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            cached_response = self.forced_auth_req('get', reverse(self.base_view), data={'format': 'topojson'})
+        self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached_response['Content-Type'], 'application/vnd.proco.topojson+json')
+        self.assertEqual(cached_response.content, response.content)
+
+        # regular representation is cached separately
+        response = self.forced_auth_req('get', reverse(self.base_view))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(json.loads(response.content), list)
+
+    def test_countries_list_topojson_wrong_level_of_detail(self):
+        response = self.forced_auth_req('get', reverse(self.base_view), data={'format': 'topojson', 'lod': 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('lod', json.loads(response.content))
+
+    def test_countries_list_level_of_detail(self):
+        with self.assertNumQueries(1):
+            response = self.forced_auth_req('get', reverse(self.base_view), data={'lod': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        geometries = {r['id']: r['geometry_simplified']['coordinates'] for r in response.data}
+        for country in [self.country_one, self.country_two]:
+            self.assertEqual(
+                geometries[country.id],
+                json.loads(country.simplified_geometries.get(level=1).geometry.json)['coordinates'],
+            )
+
+    def test_countries_list_zoom_shares_level_cache(self):
+        level = CountrySimplifiedGeometry.get_level_for_zoom(5)
+        response = self.forced_auth_req('get', reverse(self.base_view), data={'lod': level})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            zoom_response = self.forced_auth_req('get', reverse(self.base_view), data={'zoom': 5})
+        self.assertEqual(zoom_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(zoom_response.data, json.loads(response.content))
+
+    def test_countries_list_wrong_level_of_detail(self):
+        response = self.forced_auth_req('get', reverse(self.base_view), data={'lod': 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.forced_auth_req('get', reverse(self.base_view), data={'zoom': 'world'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_countries_list_level_cache_invalidated(self):
+        response = self.forced_auth_req('get', reverse(self.base_view), data={'lod': 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(cache.get('SOFT_CACHE_COUNTRY_BOUNDARY_lod_0')['invalidated'])
+
+        country = Country.objects.get(id=self.country_one.id)
+        country.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 3, 3 3, 3 0, 0 0)))')
+        country.save()
+        self.assertTrue(cache.get('SOFT_CACHE_COUNTRY_BOUNDARY_lod_0')['invalidated'])
+
     def test_empty_countries_hidden(self):
         CountryFactory(geometry=GEOSGeometry('{"type": "MultiPolygon", "coordinates": []}'))
         response = self.forced_auth_req('get', reverse(self.base_view))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertCountEqual([r['id'] for r in response.data], [self.country_one.id, self.country_two.id])
+
+
+class CountryRegionsApiTestCase(APITestCaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        SchoolFactory(country=cls.country, admin_1_name='North', admin_2_name='Hills')
+        SchoolFactory(country=cls.country, admin_1_name='South', admin_2_name='Lakes')
+        update_country_regions_status(cls.country)
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def get_url(self):
+        return reverse('locations:country-regions', kwargs={'country_code': self.country.code.lower()})
+
+    def test_regions_list(self):
+        response = self.forced_auth_req('get', self.get_url())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 4)
+        self.assertIn('schools_connectivity_good', response.data[0])
+
+    def test_regions_list_admin_level(self):
+        response = self.forced_auth_req('get', self.get_url(), data={'admin_level': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual([region['name'] for region in response.data], ['North', 'South'])
+
+    def test_regions_list_cached(self):
+        with self.assertNumQueries(2):
+            self.forced_auth_req('get', self.get_url())
+
+        with self.assertNumQueries(0):
+            response = self.forced_auth_req('get', self.get_url())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_regions_cache_invalidated(self):
+        self.forced_auth_req('get', self.get_url())
+        self.country.invalidate_country_related_cache()
+
+        keys = cache.keys('SOFT_CACHE_COUNTRY_REGIONS_{0}_*'.format(self.country.code.lower()))
+        self.assertTrue(keys)
+        self.assertTrue(all(cache.get(key)['invalidated'] for key in keys))
+
+
+class LocationStatsApiTestCase(APITestCaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        cls.region = LocationFactory(country=cls.country, name='Region')
+        cls.district_one = LocationFactory(country=cls.country, parent=cls.region, name='Hills')
+        cls.district_two = LocationFactory(country=cls.country, parent=cls.region, name='Lakes')
+        SchoolFactory(country=cls.country, location=cls.district_one)
+        SchoolFactory(country=cls.country, location=cls.district_two)
+        SchoolFactory(country=cls.country, location=cls.district_two)
+        update_country_locations_status(cls.country)
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def get_url(self, location):
+        return reverse('locations:country-location-stats', kwargs={
+            'country_code': self.country.code.lower(), 'location_id': location.id,
+        })
+
+    def test_location_stats(self):
+        response = self.forced_auth_req('get', self.get_url(self.region))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.region.id)
+        self.assertEqual(response.data['schools_total'], 3)
+        self.assertListEqual(
+            [(child['name'], child['schools_total']) for child in response.data['children']],
+            [('Hills', 1), ('Lakes', 2)],
+        )
+
+    def test_location_stats_other_country(self):
+        response = self.forced_auth_req('get', self.get_url(LocationFactory()))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_location_stats_cached(self):
+        self.forced_auth_req('get', self.get_url(self.region))
+
+        with self.assertNumQueries(0):
+            response = self.forced_auth_req('get', self.get_url(self.region))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_location_stats_cache_invalidated(self):
+        self.forced_auth_req('get', self.get_url(self.region))
+        self.country.invalidate_country_related_cache()
+
+        keys = cache.keys('SOFT_CACHE_COUNTRY_LOCATIONS_{0}_*'.format(self.country.code.lower()))
+        self.assertTrue(keys)
+        self.assertTrue(all(cache.get(key)['invalidated'] for key in keys))
@@ -0,0 +1,69 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from proco.locations.models import Country, Location
+from proco.locations.tests.factories import CountryFactory, LocationFactory
+
+
+class LoadBoundariesCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory(code='AA')
+        cls.region = LocationFactory(country=cls.country, name='North')
+
+    def load(self, features, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson') as data_file:
+            json.dump({'type': 'FeatureCollection', 'features': features}, data_file)
+            data_file.flush()
+            call_command(
+                'load_boundaries', data_file.name, '--workers', '1', *args, stdout=StringIO(), stderr=StringIO(),
+            )
+
+    def get_feature(self, properties, offset=0):
+        return {
+            'type': 'Feature',
+            'properties': properties,
+            'geometry': {
+                'type': 'Polygon',
+                'coordinates': [[
+                    [offset, 0], [offset, 1], [offset + 1, 1], [offset + 1, 0], [offset, 0],
+                ]],
+            },
+        }
+
+    def test_load_countries(self):
+        self.load([self.get_feature({'code': 'aa'}, offset=10), self.get_feature({'code': 'ZZ'})])
+
+        country = Country.objects.get(id=self.country.id)
+        self.assertEqual(country.geometry.extent, (10, 0, 11, 1))
+        self.assertFalse(country.geometry_simplified.empty)
+        self.assertEqual(country.simplified_geometries.get(level=0).geometry.extent, (10, 0, 11, 1))
+        self.assertFalse(Country.objects.filter(code='ZZ').exists())
+
+    def test_load_locations(self):
+        self.load(
+            [
+                self.get_feature({'code': 'AA', 'name': 'Hills', 'parent': 'North'}),
+                self.get_feature({'code': 'AA', 'name': 'Lakes', 'parent': 'North'}, offset=1),
+                self.get_feature({'code': 'AA', 'name': 'Woods', 'parent': 'South'}, offset=2),
+            ],
+            '--locations', '--parent-field', 'parent',
+        )
+
+        region = Location.objects.get(id=self.region.id)
+        children = region.get_children().order_by('name')
+        self.assertListEqual([child.name for child in children], ['Hills', 'Lakes'])
+        self.assertTrue(all(child.level == 1 and child.tree_id == region.tree_id for child in children))
+        self.assertEqual(region.get_descendant_count(), 2)
+        self.assertEqual(children[1].geometry.extent, (1, 0, 2, 1))
+        self.assertFalse(Location.objects.filter(name='Woods').exists())
+
+    def test_reload_locations_updates_geometry(self):
+        self.load([self.get_feature({'code': 'AA', 'name': 'North'}, offset=5)], '--locations')
+
+        self.assertEqual(Location.objects.filter(country=self.country).count(), 1)
+        self.assertEqual(Location.objects.get(id=self.region.id).geometry.extent, (5, 0, 6, 1))
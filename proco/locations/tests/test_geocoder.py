@@ -0,0 +1,54 @@
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import TestCase
+
+from proco.locations.geocoder import CountryGeocoder
+from proco.locations.models import Country
+from proco.locations.tests.factories import CountryFactory
+
+
+class TestCountryGeocoder(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country_one = CountryFactory(geometry=GEOSGeometry('MultiPolygon(((0 0, 0 2, 2 2, 2 0, 0 0)))'))
+        cls.country_two = CountryFactory(geometry=GEOSGeometry(
+            'MultiPolygon(((2 0, 2 2, 4 2, 4 0, 2 0)), ((10 10, 10 11, 11 11, 11 10, 10 10)))',
+        ))
+
+    def setUp(self):
+        super().setUp()
+        self.geocoder = CountryGeocoder()
+
+    def test_find_countries(self):
+        countries = self.geocoder.find_countries([1, 3, 10.5, 20, 3.5], [1, 1, 10.5, 20, 0.5])
+        self.assertListEqual(
+            countries.tolist(), [self.country_one.id, self.country_two.id, self.country_two.id, 0, self.country_two.id],
+        )
+
+    def test_find_countries_empty(self):
+        self.assertListEqual(self.geocoder.find_countries([], []).tolist(), [])
+
+    def test_index_cached(self):
+        self.geocoder.find_countries([1], [1])
+
+        with self.assertNumQueries(0):
+            self.geocoder.find_countries([1], [1])
+
+    def test_index_rebuilt_on_geometry_change(self):
+        self.assertListEqual(self.geocoder.find_countries([20], [20]).tolist(), [0])
+
+        country = Country.objects.get(id=self.country_one.id)
+        country.geometry = GEOSGeometry(
+            'MultiPolygon(((0 0, 0 2, 2 2, 2 0, 0 0)), ((20 20, 20 21, 21 21, 21 20, 20 20)))',
+        )
+        country.save()
+
+        self.assertListEqual(self.geocoder.find_countries([20.5], [20.5]).tolist(), [self.country_one.id])
+
+    def test_exact_fallback(self):
+        countries = self.geocoder.find_countries([1, 20], [1, 20], exact_fallback=True)
+        self.assertListEqual(countries.tolist(), [self.country_one.id, 0])
+
+    def test_points_outside_country(self):
+        outside = self.geocoder.get_points_outside_country(self.country_one.id, [1, 3, 2.05, 20], [1, 1, 1, 20])
+        # point close to the border can be affected by simplification, point in the sea is checked later in db
+        self.assertListEqual(outside.tolist(), [False, True, False, False])
@@ -1,9 +1,15 @@
-from django.contrib.gis.geos import GEOSGeometry
+from unittest.mock import patch
+
+from django.contrib.gis.geos import GEOSGeometry, MultiPoint, Point
+from django.core.cache import cache
 from django.test import TestCase
 
 from proco.connection_statistics.models import CountryWeeklyStatus
+from proco.locations.models import Country, CountrySimplifiedGeometry, CountrySubdividedGeometry
 from proco.locations.tests.factories import CountryFactory
 from proco.schools.tests.factories import SchoolFactory
+from proco.utils.cache import cache_manager
+from proco.utils.geometry import estimate_mean_pairwise_distance, mean_pairwise_distance
 
 
 class TestCountryModel(TestCase):
@@ -25,6 +31,144 @@ class TestCountryModel(TestCase):
 
         self.assertIsNone(country.geometry)
         self.assertIsNone(country.geometry_simplified)
+        self.assertFalse(country.has_geometry)
+
+    def test_has_geometry(self):
+        country = CountryFactory(geometry=GEOSGeometry('{"type": "MultiPolygon", "coordinates": []}'))
+        self.assertFalse(Country.objects.get(id=country.id).has_geometry)
+
+        country = Country.objects.get(id=country.id)
+        country.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 1, 1 1, 1 0, 0 0)))')
+        country.save(update_fields=('geometry',))
+        self.assertTrue(Country.objects.get(id=country.id).has_geometry)
+
+        country = Country.objects.get(id=country.id)
+        country.geometry = None
+        country.save()
+        self.assertFalse(Country.objects.get(id=country.id).has_geometry)
+
+    def test_simplified_geometry_levels(self):
+        with open('proco/locations/tests/data/anquila.json') as geometry_file:
+            country = CountryFactory(geometry=geometry_file.read())
+
+        levels = country.simplified_geometries.order_by('level')
+        self.assertListEqual([level.level for level in levels], list(CountrySimplifiedGeometry.LEVELS))
+        # higher level keeps more details
+        points = [level.geometry.num_points for level in levels]
+        self.assertListEqual(points, sorted(points))
+        self.assertLessEqual(points[-1], country.geometry.num_points)
+
+    def test_simplified_geometry_levels_empty_geometry(self):
+        country = CountryFactory(geometry=GEOSGeometry('{"type": "MultiPolygon", "coordinates": []}'))
+        self.assertFalse(country.simplified_geometries.exists())
+
+    def test_simplified_geometry_levels_updated(self):
+        country = CountryFactory()
+        country.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 3, 3 3, 3 0, 0 0)))')
+        country.save()
+
+        self.assertEqual(country.simplified_geometries.count(), len(CountrySimplifiedGeometry.LEVELS))
+        self.assertEqual(country.simplified_geometries.get(level=0).geometry.extent, (0, 0, 3, 3))
+
+    def test_subdivided_geometry(self):
+        with open('proco/locations/tests/data/anquila.json') as geometry_file:
+            country = CountryFactory(geometry=geometry_file.read())
+
+        pieces = country.subdivided_geometries.all()
+        self.assertTrue(pieces)
+        self.assertTrue(all(piece.geometry.num_points <= CountrySubdividedGeometry.MAX_VERTICES for piece in pieces))
+        self.assertAlmostEqual(sum(piece.geometry.area for piece in pieces), country.geometry.area)
+
+    def test_subdivided_geometry_points_countries(self):
+        country_one = CountryFactory(geometry=GEOSGeometry('MultiPolygon(((0 0, 0 1, 1 1, 1 0, 0 0)))'))
+        country_two = CountryFactory(geometry=GEOSGeometry('MultiPolygon(((1 0, 1 1, 2 1, 2 0, 1 0)))'))
+
+        country_one.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 2, 1 2, 1 0, 0 0)))')
+        country_one.save()
+
+        points = MultiPoint(Point(0.5, 0.5), Point(5, 5), Point(1.5, 0.5), Point(0.5, 1.5))
+        self.assertDictEqual(
+            CountrySubdividedGeometry.get_points_countries(points),
+            {0: country_one.id, 2: country_two.id, 3: country_one.id},
+        )
+        self.assertDictEqual(CountrySubdividedGeometry.get_points_countries(MultiPoint()), {})
+
+    def test_geometry_not_optimized_without_changes(self):
+        country = Country.objects.get(id=CountryFactory().id)
+
+        with patch('proco.locations.models.Country.optimize_geometry', return_value=None) as optimize_mock:
+            country.date_schools_mapped = '2021-01-01'
+            country.save(update_fields=('date_schools_mapped',))
+            country.data_source = 'Test source'
+            country.save()
+            optimize_mock.assert_not_called()
+
+            country.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 3, 3 3, 3 0, 0 0)))')
+            country.save()
+            optimize_mock.assert_called_once()
+
+    def test_geometry_optimized_with_update_fields(self):
+        country = CountryFactory()
+        country.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 3, 3 3, 3 0, 0 0)))')
+        country.save(update_fields=('geometry',))
+
+        country.refresh_from_db()
+        self.assertEqual(country.geometry_simplified.extent, (0, 0, 3, 3))
+
+    def test_save_invalidates_changed_fields_cache(self):
+        cache.clear()
+        country = CountryFactory()
+        code = country.code.lower()
+        for key in ['GLOBAL_STATS', f'COUNTRY_INFO_pk_{code}', f'SCHOOLS_{code}_', 'COUNTRY_BOUNDARY_']:
+            cache_manager.set(key, 'value')
+
+        country.data_source = 'Test source'
+        country.save()
+        self.assertTrue(cache.get(f'SOFT_CACHE_COUNTRY_INFO_pk_{code}')['invalidated'])
+        self.assertFalse(cache.get('SOFT_CACHE_GLOBAL_STATS')['invalidated'])
+        self.assertFalse(cache.get(f'SOFT_CACHE_SCHOOLS_{code}_')['invalidated'])
+        self.assertFalse(cache.get('SOFT_CACHE_COUNTRY_BOUNDARY_')['invalidated'])
+
+        country.geometry = GEOSGeometry('MultiPolygon(((0 0, 0 3, 3 3, 3 0, 0 0)))')
+        country.save()
+        self.assertTrue(cache.get('SOFT_CACHE_COUNTRY_BOUNDARY_')['invalidated'])
+        self.assertFalse(cache.get(f'SOFT_CACHE_SCHOOLS_{code}_')['invalidated'])
+
+    def test_avg_distance_school(self):
+        country = CountryFactory()
+        SchoolFactory(country=country, geopoint=GEOSGeometry('Point(0 0)'))
+        SchoolFactory(country=country, geopoint=GEOSGeometry('Point(1 0)'))
+        SchoolFactory(country=country, geopoint=None)
+
+        self.assertAlmostEqual(country.calculate_avg_distance_school(), 111.195, places=3)
+
+    def test_avg_distance_school_not_enough_schools(self):
+        country = CountryFactory()
+        SchoolFactory(country=country)
+
+        self.assertIsNone(country.calculate_avg_distance_school())
+
+    def test_avg_distance_school_cached_by_schools(self):
+        cache.clear()
+        country = CountryFactory()
+        SchoolFactory(country=country, geopoint=GEOSGeometry('Point(0 0)'))
+        school = SchoolFactory(country=country, geopoint=GEOSGeometry('Point(1 0)'))
+        distance = country.calculate_avg_distance_school()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(country.calculate_avg_distance_school(), distance)
+
+        school.geopoint = GEOSGeometry('Point(2 0)')
+        school.save()
+        self.assertAlmostEqual(country.calculate_avg_distance_school(), distance * 2, places=3)
+
+    def test_mean_pairwise_distance_estimation(self):
+        points = [(lat / 10, lon / 10) for lat in range(-50, 50) for lon in range(0, 40)]
+        exact = mean_pairwise_distance(points)
+
+        estimated = estimate_mean_pairwise_distance(points, relative_error=0.01, exact_threshold=100)
+        self.assertLess(abs(estimated - exact) / exact, 0.02)
+        self.assertEqual(estimate_mean_pairwise_distance(points), exact)
 
     def test_clear_data_function(self):
         country = CountryFactory()
@@ -1,10 +1,12 @@
 from datetime import timedelta
 
+from django.contrib.gis.geos import GEOSGeometry
 from django.core.cache import cache
 from django.db.models import Sum
 from django.test import TestCase
 from django.utils import timezone
 
+from proco.connection_statistics.dirty import pop_dirty_countries, pop_dirty_schools
 from proco.connection_statistics.models import RealTimeConnectivity
 from proco.realtime_unicef.models import Measurement
 from proco.realtime_unicef.tests.db.test import init_test_db
@@ -23,7 +25,7 @@ class SyncTestCase(TestCase):
 
     def setUp(self) -> None:
         super().setUp()
-        cache.delete(Measurement.MEASUREMENT_DATE_CACHE_KEY)
+        cache.clear()
 
     def test_empty_cache(self):
         school = SchoolFactory(external_id='test_1')
@@ -38,6 +40,16 @@ class SyncTestCase(TestCase):
 
         self.assertGreater(Measurement.get_last_measurement_date(), timezone.now() - timedelta(hours=23, seconds=5))
 
+    def test_schools_marked_dirty(self):
+        school = SchoolFactory(external_id='test_1')
+        MeasurementFactory(school_id='test_1', download=1)
+
+        sync_realtime_data()
+
+        today = timezone.localdate()
+        self.assertListEqual(pop_dirty_countries(today), [school.country_id])
+        self.assertListEqual(pop_dirty_schools(today, school.country_id), [school.id])
+
     def test_cached_measurement_date(self):
         SchoolFactory(external_id='test_1')
         MeasurementFactory(timestamp=timezone.now() - timedelta(days=1, hours=1), school_id='test_1', download=1)
@@ -107,6 +119,20 @@ class SyncTestCase(TestCase):
         self.assertEqual(RealTimeConnectivity.objects.count(approx=False), 1)
         self.assertEqual(RealTimeConnectivity.objects.first().school, school)
 
+    def test_school_matching_by_location(self):
+        school = SchoolFactory(
+            external_id='test_1', country__geometry=GEOSGeometry('MultiPolygon(((0 0, 0 1, 1 1, 1 0, 0 0)))'),
+        )
+        SchoolFactory(external_id='test_1', country__geometry=GEOSGeometry('MultiPolygon(((5 5, 5 6, 6 6, 6 5, 5 5)))'))
+
+        Measurement.set_last_measurement_date(timezone.now() - timedelta(seconds=1))
+        MeasurementFactory(school_id='test_1')
+
+        sync_realtime_data()
+
+        self.assertEqual(RealTimeConnectivity.objects.count(approx=False), 1)
+        self.assertEqual(RealTimeConnectivity.objects.first().school, school)
+
     def test_school_matching_unknown(self):
         SchoolFactory(external_id='test_1')
         Measurement.set_last_measurement_date(timezone.now() - timedelta(seconds=1))
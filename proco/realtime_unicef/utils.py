@@ -1,8 +1,11 @@
 import logging
+from collections import defaultdict
 
 from django.utils import timezone
 
+from proco.connection_statistics.dirty import get_measurement_date, mark_schools_dirty
 from proco.connection_statistics.models import RealTimeConnectivity
+from proco.locations.geocoder import country_geocoder
 from proco.locations.models import Country
 from proco.realtime_unicef.models import Measurement
 from proco.schools.models import School
@@ -10,6 +13,38 @@ from proco.schools.models import School
 logger = logging.getLogger('django.' + __name__)
 
 
+def _get_measurements_countries(measurements) -> dict:
+    lons, lats, points_measurements = [], [], []
+    for measurement in measurements:
+        try:
+            lon, lat = float(measurement.client_info['Longitude']), float(measurement.client_info['Latitude'])
+        except (TypeError, ValueError, KeyError):
+            continue
+
+        lons.append(lon)
+        lats.append(lat)
+        points_measurements.append(measurement.pk)
+
+    if not points_measurements:
+        return {}
+
+    countries = country_geocoder.find_countries(lons, lats, exact_fallback=True)
+    return {
+        measurement_pk: country_id
+        for measurement_pk, country_id in zip(points_measurements, countries.tolist())
+        if country_id
+    }
+
+
+def _pick_school(schools, country_id=None):
+    if country_id:
+        for school in schools:
+            if school.country_id == country_id:
+                return school
+    # last one is used when country is unknown
+    return schools[-1]
+
+
 def sync_realtime_data():
     measurements = Measurement.objects.filter(timestamp__gt=Measurement.get_last_measurement_date())
 
@@ -26,13 +61,20 @@ def sync_realtime_data():
         if country:
             schools_qs = schools_qs.filter(country=country)
 
-        schools_ids = {m.school_id for m in measurements if m.client_info.get('Country') == country_code}
-        schools = {
-            school.external_id: school
-            for school in schools_qs.filter(external_id__in=schools_ids)
-        }
+        country_measurements = [m for m in measurements if m.client_info.get('Country') == country_code]
+        schools_ids = {m.school_id for m in country_measurements}
+        schools = defaultdict(list)
+        for school in schools_qs.filter(external_id__in=schools_ids):
+            schools[school.external_id].append(school)
+
+        measurements_countries = {}
+        if not country:
+            # external ids aren't unique between countries, so location of measurement is used to pick the school
+            measurements_countries = _get_measurements_countries([
+                m for m in country_measurements if len(schools.get(m.school_id, [])) > 1
+            ])
 
-        for measurement in measurements:
+        for measurement in country_measurements:
             if measurement.school_id not in schools:
                 logger.debug(f'skipping measurement {measurement.uuid}: unknown school {measurement.school_id}')
                 continue
@@ -41,10 +83,13 @@ def sync_realtime_data():
                 created=measurement.timestamp,
                 connectivity_speed=measurement.download * 1024,  # kb/s -> b/s
                 connectivity_latency=measurement.latency,
-                school=schools[measurement.school_id],
+                school=_pick_school(schools[measurement.school_id], measurements_countries.get(measurement.pk)),
             ))
 
     RealTimeConnectivity.objects.bulk_create(realtime)
+    mark_schools_dirty(
+        (get_measurement_date(entry.created), entry.school.country_id, entry.school_id) for entry in realtime
+    )
 
     # not using aggregate because there can be new entries between two operations
     if measurements:
@@ -1,6 +1,7 @@
 from django.contrib import admin, messages
 from django.contrib.admin.options import csrf_protect_m
 from django.core.exceptions import PermissionDenied
+from django.db.models import Q
 from django.shortcuts import redirect
 from django.urls import path, reverse
 from django.utils.safestring import mark_safe
@@ -8,6 +9,7 @@ from django.utils.safestring import mark_safe
 from mapbox_location_field.admin import MapAdmin
 
 from proco.locations.filters import CountryFilterList
+from proco.locations.models import Country, Location
 from proco.schools.forms import ImportSchoolsCSVForm, SchoolAdminForm
 from proco.schools.models import FileImport, School
 from proco.schools.tasks import process_loaded_file
@@ -30,7 +32,8 @@ class SchoolAdmin(ImportFormMixin, CountryNameDisplayAdminMixin, MapAdmin):
     form = SchoolAdminForm
     list_display = ('name', 'get_country_name', 'address', 'education_level', 'school_type')
     list_filter = (CountryFilterList, 'education_level', 'environment', 'school_type')
-    search_fields = ('name', 'country__name', 'location__name')
+    # name_lower is covered by trigram index, countries and locations are resolved in get_search_results
+    search_fields = ('name_lower__contains',)
     change_list_template = 'admin/schools/change_list.html'
     ordering = ('country', 'name')
     readonly_fields = ('get_weekly_stats_url',)
@@ -49,6 +52,20 @@ class SchoolAdmin(ImportFormMixin, CountryNameDisplayAdminMixin, MapAdmin):
             qs = qs.filter(country__in=request.user.countries_available.all())
         return qs.prefetch_related('country').defer('location')
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip().lower()
+        schools_qs, use_distinct = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return schools_qs, use_distinct
+
+        # ids are looked up on small tables first, so every condition on schools is backed by its own index
+        # and joined lookups don't force a scan of the whole schools table
+        countries_ids = list(Country.objects.filter(name__icontains=search_term).values_list('id', flat=True))
+        locations_ids = list(Location.objects.filter(name__icontains=search_term).values_list('id', flat=True))
+        if countries_ids or locations_ids:
+            schools_qs |= queryset.filter(Q(country_id__in=countries_ids) | Q(location_id__in=locations_ids))
+        return schools_qs, use_distinct
+
     def import_csv(self, request):
         user = request.user
         if user.is_authenticated and user.has_perm('schools.add_fileimport') and request.method == 'POST':
@@ -1,5 +1,13 @@
 from django.conf import settings
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BinaryField, F, FloatField, Func, Q, Value
 from django.db.models.functions.text import Lower
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_control
@@ -7,19 +15,28 @@ from django.views.decorators.cache import cache_control
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
 from django_filters.rest_framework import DjangoFilterBackend
 
+from proco.connection_statistics.models import SchoolWeeklyStatus
 from proco.locations.backends.csv import SchoolsCSVWriterBackend
 from proco.locations.models import Country
-from proco.schools.models import School
+from proco.schools.models import RandomSchoolSample, School
+from proco.schools.renderers import ColumnarSchoolsRenderer, MapboxVectorTileRenderer
 from proco.schools.serializers import (
-    CSVSchoolsListSerializer,
     ListSchoolSerializer,
+    NearestSchoolSerializer,
+    NearestSchoolsQuerySerializer,
     SchoolPointSerializer,
     SchoolSerializer,
+    SearchSchoolSerializer,
 )
-from proco.utils.mixins import CachedListMixin
+from proco.utils.geometry import GeometryDistance, get_tile_bounds
+from proco.utils.mixins import CachedListMixin, UseCachedDataMixin
 
 
 @method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
@@ -30,6 +47,8 @@ class SchoolsViewSet(
     viewsets.GenericViewSet,
 ):
     LIST_CACHE_KEY_PREFIX = 'SCHOOLS'
+    CSV_EXPORT_FIELDS = ('name', 'geopoint', 'connectivity_status')
+    CSV_EXPORT_CHUNK_SIZE = 2000
 
     queryset = School.objects.all().select_related('last_weekly_status')
     pagination_class = None
@@ -38,6 +57,13 @@ class SchoolsViewSet(
         DjangoFilterBackend,
     )
     related_model = Country
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarSchoolsRenderer]
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action != 'list':
+            renderers = [renderer for renderer in renderers if not isinstance(renderer, ColumnarSchoolsRenderer)]
+        return renderers
 
     def get_serializer(self, *args, **kwargs):
         kwargs['country'] = self.get_country()
@@ -46,10 +72,12 @@ class SchoolsViewSet(
     def get_list_cache_key(self):
         params = dict(self.request.query_params)
         params.pop(self.CACHE_KEY, None)
-        return '{0}_{1}_{2}'.format(
+        params.pop(self.FORMAT_KEY, None)
+        return '{0}_{1}_{2}{3}'.format(
             getattr(self.__class__, 'LIST_CACHE_KEY_PREFIX', self.__class__.__name__) or self.__class__.__name__,
             self.kwargs['country_code'].lower(),
             '_'.join(map(lambda x: '{0}_{1}'.format(x[0], x[1]), sorted(params.items()))),
+            self.get_format_cache_key_suffix(),
         )
 
     def get_country(self):
@@ -69,29 +97,43 @@ class SchoolsViewSet(
         serializer_class = self.serializer_class
         if self.action == 'list':
             serializer_class = ListSchoolSerializer
-        if self.action == 'export_csv_schools':
-            serializer_class = CSVSchoolsListSerializer
         return serializer_class
 
+    def get_csv_rows(self, country):
+        last_weekly_status = country.last_weekly_status
+        schools = self.get_queryset().annotate(
+            lon=Func(F('geopoint'), function='ST_X', output_field=FloatField()),
+            lat=Func(F('geopoint'), function='ST_Y', output_field=FloatField()),
+            connectivity_status=SchoolWeeklyStatus.get_connectivity_status_expression(
+                last_weekly_status.connectivity_availability if last_weekly_status else None,
+                prefix='last_weekly_status__',
+            ),
+        ).values_list('name', 'lon', 'lat', 'connectivity_status')
+
+        for name, lon, lat, connectivity_status in schools.iterator(chunk_size=self.CSV_EXPORT_CHUNK_SIZE):
+            yield {
+                'name': name,
+                'geopoint': f'{lon}: {lat}' if lon is not None else None,
+                'connectivity_status': connectivity_status,
+            }
+
     @action(methods=['get'], detail=False, url_path='export-csv-schools', url_name='export_csv_schools')
     def export_csv_schools(self, request, *args, **kwargs):
-        country = get_object_or_404(
-            self.get_queryset().annotate(code_lower=Lower('code')),
-            code_lower=self.kwargs.get('country_code'),
-        )
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        csvwriter = SchoolsCSVWriterBackend(serializer, country)
-        response = csvwriter.write()
-        return response
+        country = self.get_country()
+        csvwriter = SchoolsCSVWriterBackend(self.get_csv_rows(country), self.CSV_EXPORT_FIELDS, country)
+        return csvwriter.write()
 
 
 @method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
 class RandomSchoolsListAPIView(CachedListMixin, ListAPIView):
     LIST_CACHE_KEY_PREFIX = 'RANDOM_SCHOOLS'
 
-    queryset = School.objects.order_by('?')[:settings.RANDOM_SCHOOLS_DEFAULT_AMOUNT]
     serializer_class = SchoolPointSerializer
     pagination_class = None
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarSchoolsRenderer]
+
+    def get_queryset(self):
+        return RandomSchoolSample.get_schools(int(settings.RANDOM_SCHOOLS_DEFAULT_AMOUNT))
 
     def get_serializer(self, *args, **kwargs):
         countries_statuses = Country.objects.all().defer('geometry', 'geometry_simplified').select_related(
@@ -101,3 +143,157 @@ class RandomSchoolsListAPIView(CachedListMixin, ListAPIView):
         )
         kwargs['countries_statuses'] = dict(countries_statuses)
         return super(RandomSchoolsListAPIView, self).get_serializer(*args, **kwargs)
+
+
+@method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
+class SchoolsSearchAPIView(ListAPIView):
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    queryset = School.objects.all()
+    serializer_class = SearchSchoolSerializer
+    pagination_class = None
+    permission_classes = (AllowAny,)
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            limit = self.DEFAULT_LIMIT
+        return max(1, min(limit, self.MAX_LIMIT))
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip().lower()
+        if not query:
+            return School.objects.none()
+
+        queryset = super().get_queryset()
+
+        country_code = self.request.query_params.get('country_code')
+        if country_code:
+            queryset = queryset.filter(country__code__iexact=country_code)
+
+        # both conditions are served by trigram index on name_lower
+        return queryset.filter(
+            Q(name_lower__contains=query) | Q(name_lower__trigram_similar=query),
+        ).annotate(
+            similarity=TrigramSimilarity('name_lower', query),
+        ).order_by('-similarity', 'id')[:self.get_limit()]
+
+
+class NearestSchoolsAPIView(ListAPIView):
+    # index driven <-> ordering is planar in degrees, so a few times more candidates are taken
+    # and then ordered by geodesic distance, as longitude degree is shorter at higher latitudes
+    CANDIDATES_FACTOR = 4
+
+    queryset = School.objects.filter(geopoint__isnull=False)
+    serializer_class = NearestSchoolSerializer
+    pagination_class = None
+    permission_classes = (AllowAny,)
+
+    def get_query_params(self):
+        if not hasattr(self, '_query_params'):
+            serializer = NearestSchoolsQuerySerializer(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._query_params = serializer.validated_data
+        return self._query_params
+
+    def get_queryset(self):
+        params = self.get_query_params()
+        point = Point(params['lon'], params['lat'], srid=4326)
+
+        queryset = super().get_queryset().annotate(
+            connectivity_status=SchoolWeeklyStatus.get_connectivity_status_expression(
+                F('country__last_weekly_status__connectivity_availability'), prefix='last_weekly_status__',
+            ),
+        )
+
+        if params.get('country_code'):
+            queryset = queryset.filter(country__code__iexact=params['country_code'])
+        if params.get('education_level'):
+            queryset = queryset.filter(education_level__iexact=params['education_level'])
+        if params.get('connectivity_status'):
+            queryset = queryset.filter(connectivity_status=params['connectivity_status'].lower())
+
+        candidates = queryset.order_by(
+            GeometryDistance(F('geopoint'), Value(point, output_field=PointField(srid=4326))),
+        ).values('id')[:params['k'] * self.CANDIDATES_FACTOR]
+
+        return queryset.filter(id__in=candidates).annotate(
+            distance=Distance('geopoint', point),
+        ).order_by('distance', 'id')[:params['k']]
+
+
+@method_decorator([cache_control(public=True, max_age=settings.CACHE_CONTROL_MAX_AGE)], name='dispatch')
+class SchoolsTileAPIView(UseCachedDataMixin, APIView):
+    TILE_CACHE_KEY_PREFIX = 'SCHOOLS_TILE'
+    TILE_LAYER_NAME = 'schools'
+    MAX_ZOOM = 22
+
+    permission_classes = (AllowAny,)
+    renderer_classes = (MapboxVectorTileRenderer,)
+
+    def get_country(self):
+        return get_object_or_404(
+            Country.objects.defer(
+                'geometry', 'geometry_simplified',
+            ).select_related('last_weekly_status').annotate(code_lower=Lower('code')),
+            code_lower=self.kwargs.get('country_code'),
+        )
+
+    def get_tile_cache_key(self, country, zoom, x, y):
+        return '{0}_{1}_{2}_{3}_{4}_{5}'.format(
+            self.TILE_CACHE_KEY_PREFIX, country.code.lower(), country.data_version, zoom, x, y,
+        )
+
+    def get_tile(self, country, zoom, x, y):
+        bounds = get_tile_bounds(zoom, x, y)
+        envelope = Polygon.from_bbox(bounds)
+        envelope.srid = 3857
+
+        last_weekly_status = country.last_weekly_status
+        connectivity_availability = last_weekly_status.connectivity_availability if last_weekly_status else None
+        coverage_availability = last_weekly_status.coverage_availability if last_weekly_status else None
+
+        schools = School.objects.filter(
+            country=country, geopoint__bboverlaps=envelope,
+        ).annotate(
+            # output field is not geometry to avoid bytea casting, tile is built inside the database anyway
+            geometry=Func(
+                Func(F('geopoint'), Value(3857), function='ST_Transform'),
+                Func(*(Value(coord) for coord in bounds), Value(3857), function='ST_MakeEnvelope'),
+                function='ST_AsMVTGeom',
+                output_field=BinaryField(),
+            ),
+            connectivity_status=SchoolWeeklyStatus.get_connectivity_status_expression(
+                connectivity_availability, prefix='last_weekly_status__',
+            ),
+            coverage_status=SchoolWeeklyStatus.get_coverage_status_expression(
+                coverage_availability, prefix='last_weekly_status__',
+            ),
+        ).values('id', 'geometry', 'connectivity_status', 'coverage_status')
+
+        schools_sql, params = schools.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT ST_AsMVT(tile, %s) FROM ({schools_sql}) AS tile',  # noqa: S608
+                (self.TILE_LAYER_NAME, *params),
+            )
+            tile = cursor.fetchone()[0]
+
+        return bytes(tile) if tile else b''
+
+    def get(self, request, *args, **kwargs):
+        zoom, x, y = int(self.kwargs['z']), int(self.kwargs['x']), int(self.kwargs['y'])
+        if zoom > self.MAX_ZOOM or x >= 2 ** zoom or y >= 2 ** zoom:
+            raise Http404
+
+        country = self.get_country()
+        cache_key = self.get_tile_cache_key(country, zoom, x, y)
+
+        tile = cache.get(cache_key) if self.use_cached_data() else None
+        if tile is None:
+            tile = self.get_tile(country, zoom, x, y)
+            cache.set(cache_key, tile, settings.SCHOOLS_TILE_CACHE_TIMEOUT)
+
+        return Response(tile)
@@ -1,4 +1,4 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 from rest_framework.routers import SimpleRouter
 
@@ -12,4 +12,11 @@ app_name = 'schools'
 urlpatterns = [
     path('', include(country_schools.urls)),
     path('schools/random/', api.RandomSchoolsListAPIView.as_view(), name='random-schools'),
+    path('schools/search/', api.SchoolsSearchAPIView.as_view(), name='search-schools'),
+    path('schools/nearest/', api.NearestSchoolsAPIView.as_view(), name='nearest-schools'),
+    re_path(
+        r'^countries/(?P<country_code>\w+)/schools/tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$',
+        api.SchoolsTileAPIView.as_view(),
+        name='schools-tiles',
+    ),
 ]
@@ -6,6 +6,7 @@ import requests
 from dateutil import parser as dateutil_parser
 from pytz import UTC
 
+from proco.connection_statistics.dirty import get_measurement_date, mark_schools_dirty
 from proco.connection_statistics.models import RealTimeConnectivity, SchoolWeeklyStatus
 from proco.locations.models import Country
 from proco.schools.models import School
@@ -135,11 +136,17 @@ class BrasilSimnetLoader(object):
             )
 
             if len(new_entries) == 5000:
-                RealTimeConnectivity.objects.bulk_create(new_entries)
+                self.save_statistic(new_entries)
                 new_entries = []
 
         if len(new_entries) > 0:
-            RealTimeConnectivity.objects.bulk_create(new_entries)
+            self.save_statistic(new_entries)
+
+    def save_statistic(self, entries):
+        RealTimeConnectivity.objects.bulk_create(entries)
+        mark_schools_dirty(
+            (get_measurement_date(entry.created), entry.school.country_id, entry.school_id) for entry in entries
+        )
 
 
 brasil_statistic_loader = BrasilSimnetLoader()
@@ -3,13 +3,15 @@ from datetime import date
 from typing import Iterable, List, Tuple
 
 from django.contrib.gis.geos import Point
-from django.db.models import F
+from django.db.models import Exists, OuterRef
 from django.utils.translation import ugettext_lazy as _
 
+import numpy as np
 from scipy.spatial import KDTree
 
 from proco.connection_statistics.models import SchoolWeeklyStatus
-from proco.locations.models import Country
+from proco.locations.geocoder import country_geocoder
+from proco.locations.models import Country, CountrySubdividedGeometry
 from proco.schools.loaders.validation import validate_point_distance, validate_row
 from proco.schools.models import School
 from proco.utils.geometry import cartesian
@@ -93,9 +95,31 @@ def get_validated_rows(country: Country, loaded: Iterable[dict]) -> Tuple[List[d
             'history_data': history_data,
         })
 
+    errors.extend(remove_rows_outside_country(country, rows))
+
     return rows, errors, warnings
 
 
+def remove_rows_outside_country(country: Country, rows: List[dict]) -> List[str]:
+    # quick check of all points at once without database, precise check is done after schools saved
+    if not rows:
+        return []
+
+    outside = country_geocoder.get_points_outside_country(
+        country.id,
+        np.fromiter((data['school_data']['geopoint'].x for data in rows), dtype=np.float64, count=len(rows)),
+        np.fromiter((data['school_data']['geopoint'].y for data in rows), dtype=np.float64, count=len(rows)),
+    )
+
+    errors = []
+    for i in reversed(np.flatnonzero(outside)):
+        errors.append(_('Row {0}: Bad data provided for geopoint: point outside country').format(rows[i]['row_index']))
+        del rows[i]
+
+    logger.info(f'{len(errors)} rows are outside country')
+    return errors[::-1]
+
+
 def map_schools_by_external_id(country: Country, rows: List[dict]):
     # search by external id
     schools_with_external_id = {
@@ -345,8 +369,12 @@ def update_existing_schools(rows: List[dict]):
 def delete_schools_not_in_bounds(country: Country, rows: List[dict]) -> List[str]:
     errors = []
 
-    # check & remove schools not in bounds. this is the fastest way
-    School.objects.filter(country=country).exclude(geopoint__within=F('country__geometry')).delete()
+    # check & remove schools not in bounds. subdivided geometry pieces are small and indexed, so check is cheap
+    School.objects.filter(country=country).annotate(
+        in_bounds=Exists(CountrySubdividedGeometry.objects.filter(
+            country=country, geometry__intersects=OuterRef('geopoint'),
+        )),
+    ).filter(in_bounds=False).delete()
     logger.info(f'{len(rows)} schools before filtering')
 
     schools_within = School.objects.filter(id__in=[d['school'].id for d in rows]).values_list('id', flat=True)
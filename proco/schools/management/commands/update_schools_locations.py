@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand, CommandError
+
+from proco.locations.models import Country
+from proco.schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Assign schools to the deepest location containing them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--country', type=str, help='Country code, all countries are processed by default.')
+        parser.add_argument(
+            '--only-unassigned', action='store_true',
+            help='Skip schools already linked to the location covering them.',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        countries = Country.objects.defer('geometry', 'geometry_simplified').order_by('id')
+        if options['country']:
+            countries = countries.filter(code__iexact=options['country'])
+            if not countries:
+                raise CommandError('Country not found')
+
+        for country in countries:
+            updated = School.update_locations(
+                country, only_unassigned=options['only_unassigned'], batch_size=options['batch_size'],
+            )
+            self.stdout.write(f'{country}: {updated} schools updated')
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.19 on 2021-05-04 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0021_auto_20210415_0731'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RandomSchoolSample',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pool', models.PositiveSmallIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='random_samples', to='schools.School')),
+            ],
+            options={
+                'ordering': ('pool', 'position'),
+                'unique_together': {('pool', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.19 on 2021-05-06 08:47
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0022_randomschoolsample'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='school',
+            index=GinIndex(fields=['name_lower'], name='schools_sch_name_lo_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
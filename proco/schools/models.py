@@ -1,6 +1,9 @@
 from django.conf import settings
 from django.contrib.gis.db.models import PointField
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models import Count
 from django.utils.translation import ugettext as _
 
 from model_utils import Choices
@@ -46,6 +49,9 @@ class School(TimeStampedModel):
 
     class Meta:
         ordering = ('id',)
+        indexes = [
+            GinIndex(fields=['name_lower'], name='schools_sch_name_lo_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return f'{self.country} - {self.name}'
@@ -55,6 +61,171 @@ class School(TimeStampedModel):
         self.external_id = str(self.external_id).lower()
         super().save(**kwargs)
 
+    @classmethod
+    def update_locations(cls, country, only_unassigned=False, batch_size=10000):
+        """
+        Assign schools of the country to the deepest location containing them.
+
+        Schools are processed by batches with single spatial join per batch, only changed rows are written.
+        When only_unassigned is set, schools already linked to the location covering them are skipped.
+        """
+        unassigned_condition = ''
+        if only_unassigned:
+            unassigned_condition = f"""
+                AND NOT EXISTS (
+                    SELECT 1 FROM {Location._meta.db_table} current_location
+                    WHERE current_location.id = s.location_id AND ST_Intersects(current_location.geometry, s.geopoint)
+                )
+            """
+
+        last_id, updated_total = 0, 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    WITH batch AS (
+                        SELECT s.id, s.geopoint
+                        FROM {cls._meta.db_table} s
+                        WHERE s.country_id = %s AND s.id > %s {unassigned_condition}
+                        ORDER BY s.id
+                        LIMIT %s
+                    ), matched AS (
+                        SELECT batch.id AS school_id, deepest_location.id AS location_id
+                        FROM batch
+                        LEFT JOIN LATERAL (
+                            SELECT l.id
+                            FROM {Location._meta.db_table} l
+                            WHERE l.country_id = %s AND ST_Intersects(l.geometry, batch.geopoint)
+                            ORDER BY l.level DESC, l.id
+                            LIMIT 1
+                        ) deepest_location ON TRUE
+                    ), updated AS (
+                        UPDATE {cls._meta.db_table} s
+                        SET location_id = matched.location_id
+                        FROM matched
+                        WHERE s.id = matched.school_id AND s.location_id IS DISTINCT FROM matched.location_id
+                        RETURNING s.id
+                    )
+                    SELECT (SELECT MAX(id) FROM batch), (SELECT COUNT(*) FROM updated)
+                """, [country.id, last_id, batch_size, country.id])  # noqa: S608
+                last_id, updated = cursor.fetchone()
+
+            if last_id is None:
+                break
+            updated_total += updated
+
+        return updated_total
+
+
+class RandomSchoolSample(models.Model):
+    """
+    Pre-calculated random schools sample, stratified by country.
+
+    Two pools are maintained: one is served while another is refreshed,
+    so sample can be rotated without sorting whole schools table by random on request.
+    """
+
+    ACTIVE_POOL_CACHE_KEY = 'RANDOM_SCHOOLS_SAMPLE_POOL'
+    POOLS = (0, 1)
+    OVERSAMPLING_FACTOR = 3
+
+    pool = models.PositiveSmallIntegerField()
+    position = models.PositiveIntegerField()
+    school = models.ForeignKey(School, related_name='random_samples', on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ('pool', 'position')
+        unique_together = ('pool', 'position')
+
+    def __str__(self):
+        return f'{self.pool} - {self.position}'
+
+    @classmethod
+    def get_active_pool(cls):
+        return cache.get(cls.ACTIVE_POOL_CACHE_KEY, cls.POOLS[0])
+
+    @classmethod
+    def get_schools(cls, amount):
+        pool = cls.get_active_pool()
+        if not cls.objects.filter(pool=pool).exists():
+            # sample wasn't calculated yet
+            return School.objects.order_by('?')[:amount]
+        return School.objects.filter(random_samples__pool=pool).order_by('random_samples__position')[:amount]
+
+    @classmethod
+    def _get_countries_quotas(cls, amount):
+        schools_per_country = dict(
+            School.objects.order_by().values('country_id').annotate(
+                total=Count('id'),
+            ).values_list('country_id', 'total'),
+        )
+        total = sum(schools_per_country.values())
+        if not total:
+            return {}, 0
+
+        # every country with schools gets at least one place in sample, the rest is split proportionally
+        return {
+            country_id: max(1, round(amount * schools_count / total))
+            for country_id, schools_count in schools_per_country.items()
+        }, total
+
+    @classmethod
+    def refresh(cls, amount):
+        """
+        Refill inactive pool with new sample and make it active.
+
+        Schools are picked by TABLESAMPLE SYSTEM with oversampling, then trimmed by per-country quotas.
+        Countries missed by sampling are topped up by random schools, so each country with schools is represented.
+        """
+        quotas, total = cls._get_countries_quotas(amount)
+        active_pool = cls.get_active_pool()
+        new_pool = next(pool for pool in cls.POOLS if pool != active_pool)
+
+        with transaction.atomic():
+            cls.objects.filter(pool=new_pool).delete()
+            if quotas:
+                sample_percent = min(100.0, 100.0 * cls.OVERSAMPLING_FACTOR * amount / total)
+                quotas_values = ', '.join(['(%s, %s)'] * len(quotas))
+                quotas_params = [value for item in quotas.items() for value in item]
+
+                with connection.cursor() as cursor:
+                    # page sampling can miss small countries completely, so countries left below their quota
+                    # are topped up with random schools of that country
+                    cursor.execute(f"""
+                        WITH quotas (country_id, quota) AS (
+                            VALUES {quotas_values}
+                        ), sampled AS (
+                            SELECT numbered.id, numbered.country_id
+                            FROM (
+                                SELECT s.id, s.country_id,
+                                    row_number() OVER (PARTITION BY s.country_id ORDER BY random()) AS country_position
+                                FROM {School._meta.db_table} s TABLESAMPLE SYSTEM (%s)
+                            ) numbered
+                            INNER JOIN quotas ON quotas.country_id = numbered.country_id
+                            WHERE numbered.country_position <= quotas.quota
+                        ), missing AS (
+                            SELECT quotas.country_id, quotas.quota - COUNT(sampled.id) AS amount
+                            FROM quotas
+                            LEFT JOIN sampled ON sampled.country_id = quotas.country_id
+                            GROUP BY quotas.country_id, quotas.quota
+                            HAVING quotas.quota > COUNT(sampled.id)
+                        ), topped_up AS (
+                            SELECT extra.id
+                            FROM missing
+                            CROSS JOIN LATERAL (
+                                SELECT s.id FROM {School._meta.db_table} s
+                                WHERE s.country_id = missing.country_id AND s.id NOT IN (SELECT id FROM sampled)
+                                ORDER BY random()
+                                LIMIT missing.amount
+                            ) extra
+                        )
+                        INSERT INTO {cls._meta.db_table} (pool, position, school_id)
+                        SELECT %s, row_number() OVER (ORDER BY random()), picked.id
+                        FROM (SELECT id FROM sampled UNION ALL SELECT id FROM topped_up) picked
+                    """, [*quotas_params, sample_percent, new_pool])  # noqa: S608
+
+        cache.set(cls.ACTIVE_POOL_CACHE_KEY, new_pool, None)
+        return new_pool
+
 
 class FileImport(TimeStampedModel):
     STATUSES = Choices(
@@ -0,0 +1,125 @@
+import json
+import struct
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+import numpy as np
+
+
+class MapboxVectorTileRenderer(BaseRenderer):
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'mvt'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # errors can't be represented as tile, so only status code is meaningful for them
+        if not isinstance(data, bytes):
+            return b''
+        return data
+
+
+class ColumnarSchoolsRenderer(BaseRenderer):
+    """
+    Packs list of schools into column arrays instead of json object per school.
+
+    Layout: uint32 header length, json header, then column buffers, every part aligned to 4 bytes,
+    so client can map buffers directly to typed arrays. All numbers are little-endian.
+    Header describes every column: name, type, offset (from the end of header) & length in bytes,
+    and extra decoding info:
+    - int32: integers, null is represented as -2^31;
+    - point: lon & lat pairs as int32 multiplied by `scale`, null is represented as -2^31;
+    - bool: uint8, null is represented as 255;
+    - category: uint8 index in `categories` list, null is represented as 255;
+    - string: uint32 `offsets` (count + 1 items) followed by utf-8 encoded data.
+    """
+
+    media_type = 'application/vnd.proco.columnar'
+    format = 'columnar'
+    charset = None
+    render_style = 'binary'
+
+    VERSION = 1
+    ALIGNMENT = 4
+    INT32_NULL = -2 ** 31
+    UINT8_NULL = 255
+    MAX_CATEGORIES = 255
+    POINT_SCALE = 10 ** 6
+
+    def _pad(self, buffer, filler=b'\0'):
+        return buffer + filler * (-len(buffer) % self.ALIGNMENT)
+
+    def _get_column_type(self, values):
+        not_null = [value for value in values if value is not None]
+        if all(isinstance(value, bool) for value in not_null):
+            return 'bool'
+        if all(isinstance(value, int) for value in not_null):
+            return 'int32'
+        if all(isinstance(value, dict) and value.get('type') == 'Point' for value in not_null):
+            return 'point'
+        if len(set(not_null)) < self.MAX_CATEGORIES:
+            return 'category'
+        return 'string'
+
+    def _pack_int32(self, values):
+        return np.array(
+            [self.INT32_NULL if value is None else value for value in values], dtype='<i4',
+        ).tobytes(), {}
+
+    def _pack_point(self, values):
+        coordinates = np.array(
+            [(self.INT32_NULL, self.INT32_NULL) if value is None else [
+                round(coord * self.POINT_SCALE) for coord in value['coordinates'][:2]
+            ] for value in values],
+            dtype='<i4',
+        )
+        return coordinates.tobytes(), {'scale': self.POINT_SCALE}
+
+    def _pack_bool(self, values):
+        return np.array(
+            [self.UINT8_NULL if value is None else int(value) for value in values], dtype='u1',
+        ).tobytes(), {}
+
+    def _pack_category(self, values):
+        categories = sorted({str(value) for value in values if value is not None})
+        indexes = {category: i for i, category in enumerate(categories)}
+        return np.array(
+            [self.UINT8_NULL if value is None else indexes[str(value)] for value in values], dtype='u1',
+        ).tobytes(), {'categories': categories}
+
+    def _pack_string(self, values):
+        encoded = [b'' if value is None else str(value).encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        return offsets.tobytes() + b''.join(encoded), {}
+
+    def _render_error(self, data, accepted_media_type, renderer_context):
+        response = renderer_context.get('response') if renderer_context else None
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, accepted_media_type, renderer_context)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, list):
+            # errors and non-list responses can't be packed into columns
+            return self._render_error(data, accepted_media_type, renderer_context)
+
+        column_names = list(data[0].keys()) if data else []
+        columns, buffers = [], []
+        offset = 0
+        for name in column_names:
+            values = [item[name] for item in data]
+            column_type = self._get_column_type(values)
+            buffer, extra = getattr(self, '_pack_{0}'.format(column_type))(values)
+            buffer = self._pad(buffer)
+            columns.append(dict(name=name, type=column_type, offset=offset, length=len(buffer), **extra))
+            buffers.append(buffer)
+            offset += len(buffer)
+
+        header = self._pad(json.dumps({
+            'version': self.VERSION,
+            'count': len(data),
+            'columns': columns,
+        }, separators=(',', ':')).encode('utf-8'), filler=b' ')
+
+        return struct.pack('<I', len(header)) + header + b''.join(buffers)
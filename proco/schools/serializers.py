@@ -1,8 +1,11 @@
+from collections import OrderedDict
+
+from django.db.models import F, FloatField, Func, QuerySet
+
 from rest_framework import serializers
 
-from proco.connection_statistics.models import CountryWeeklyStatus
+from proco.connection_statistics.models import CountryWeeklyStatus, SchoolWeeklyStatus
 from proco.connection_statistics.serializers import SchoolWeeklyStatusSerializer
-from proco.locations.fields import GeoPointCSVField
 from proco.schools.models import School
 
 
@@ -29,12 +32,82 @@ class SchoolPointSerializer(BaseSchoolSerializer):
         return self.countries_statuses[obj.country_id]
 
 
+class SearchSchoolSerializer(BaseSchoolSerializer):
+    class Meta(BaseSchoolSerializer.Meta):
+        fields = BaseSchoolSerializer.Meta.fields + ('country_id',)
+
+
+class NearestSchoolsQuerySerializer(serializers.Serializer):
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    k = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    country_code = serializers.CharField(required=False)
+    education_level = serializers.CharField(required=False)
+    connectivity_status = serializers.CharField(required=False)
+
+
+class NearestSchoolSerializer(BaseSchoolSerializer):
+    connectivity_status = serializers.CharField(read_only=True)
+    distance = serializers.SerializerMethodField()
+
+    class Meta(BaseSchoolSerializer.Meta):
+        fields = BaseSchoolSerializer.Meta.fields + (
+            'country_id', 'education_level', 'connectivity_status', 'distance',
+        )
+
+    def get_distance(self, obj):
+        # meters
+        return obj.distance.m
+
+
 class CountryToSerializerMixin(object):
     def __init__(self, *args, **kwargs):
         self.country = kwargs.pop('country', None)
         super(CountryToSerializerMixin, self).__init__(*args, **kwargs)
 
 
+class ValuesListSchoolSerializer(serializers.ListSerializer):
+    """
+    Fast path for schools list: reads only needed columns and calculates statuses in database
+    instead of building model instance per school. Output is identical to the regular list serializer.
+    """
+
+    def to_representation(self, data):
+        if not isinstance(data, QuerySet):
+            return super().to_representation(data)
+
+        last_weekly_status = self.child.country.last_weekly_status
+        connectivity_availability = last_weekly_status.connectivity_availability if last_weekly_status else None
+        coverage_availability = last_weekly_status.coverage_availability if last_weekly_status else None
+        is_verified = self.child.get_is_verified(None)
+
+        schools = data.annotate(
+            lon=Func(F('geopoint'), function='ST_X', output_field=FloatField()),
+            lat=Func(F('geopoint'), function='ST_Y', output_field=FloatField()),
+            connectivity_status=SchoolWeeklyStatus.get_connectivity_status_expression(
+                connectivity_availability, prefix='last_weekly_status__',
+            ),
+            coverage_status=SchoolWeeklyStatus.get_coverage_status_expression(
+                coverage_availability, prefix='last_weekly_status__',
+            ),
+        ).values_list('id', 'name', 'lon', 'lat', 'connectivity_status', 'coverage_status')
+
+        return [
+            OrderedDict((
+                ('id', school_id),
+                ('name', name),
+                ('geopoint', OrderedDict((
+                    ('type', 'Point'),
+                    ('coordinates', [lon, lat]),
+                )) if lon is not None else None),
+                ('connectivity_status', connectivity_status),
+                ('coverage_status', coverage_status),
+                ('is_verified', is_verified),
+            ))
+            for school_id, name, lon, lat, connectivity_status, coverage_status in schools
+        ]
+
+
 class ListSchoolSerializer(CountryToSerializerMixin, BaseSchoolSerializer):
     connectivity_status = serializers.SerializerMethodField()
     coverage_status = serializers.SerializerMethodField()
@@ -44,6 +117,7 @@ class ListSchoolSerializer(CountryToSerializerMixin, BaseSchoolSerializer):
         fields = BaseSchoolSerializer.Meta.fields + (
             'connectivity_status', 'coverage_status', 'is_verified',
         )
+        list_serializer_class = ValuesListSchoolSerializer
 
     def get_connectivity_status(self, obj):
         availability = self.country.last_weekly_status.connectivity_availability
@@ -65,13 +139,6 @@ class ListSchoolSerializer(CountryToSerializerMixin, BaseSchoolSerializer):
         ]
 
 
-class CSVSchoolsListSerializer(ListSchoolSerializer):
-    geopoint = GeoPointCSVField()
-
-    class Meta(BaseSchoolSerializer.Meta):
-        fields = ('name', 'geopoint', 'connectivity_status')
-
-
 class SchoolSerializer(CountryToSerializerMixin, BaseSchoolSerializer):
     statistics = serializers.SerializerMethodField()
     connectivity_status = serializers.SerializerMethodField()
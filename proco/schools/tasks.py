@@ -5,16 +5,23 @@ from copy import copy
 from random import randint  # noqa
 from typing import List
 
-from django.contrib.gis.geos import MultiPoint, Point
+from django.conf import settings
 from django.db import transaction
-
-from proco.connection_statistics.utils import update_country_data_source_by_csv_filename, update_country_weekly_status
+from django.urls import reverse
+
+from proco.connection_statistics.dirty import mark_country_dirty
+from proco.connection_statistics.utils import (
+    update_country_data_source_by_csv_filename,
+    update_country_regions_status,
+    update_country_weekly_status,
+)
+from proco.locations.geocoder import country_geocoder
 from proco.locations.models import Country
 from proco.schools.loaders import ingest
 from proco.schools.loaders.ingest import UnsupportedFileFormatException, load_data
-from proco.schools.models import FileImport
+from proco.schools.models import FileImport, RandomSchoolSample, School
 from proco.taskapp import app
-from proco.utils.tasks import update_country_related_cache
+from proco.utils.tasks import update_cached_value, update_country_related_cache
 
 
 class FailedImportError(Exception):
@@ -22,41 +29,32 @@ class FailedImportError(Exception):
 
 
 def _find_country(loaded: List[dict]) -> [Country]:
-    points = MultiPoint()
+    lons, lats = [], []
 
     shuffled_data = copy(loaded)
     random.shuffle(shuffled_data)  # noqa
 
     for data in shuffled_data:
-        if len(points) == 2000:
+        if len(lons) == 2000:
             # exit if we already collected optimal number of points to proceed
             break
 
         try:
-            point = Point(x=float(data['lon']), y=float(data['lat']))
+            lon, lat = float(data['lon']), float(data['lat'])
         except (TypeError, ValueError, KeyError):
             continue
 
-        if point == Point(x=0, y=0):
+        if lon == 0 and lat == 0:
             continue
 
-        points.append(point)
-
-    countries = list(Country.objects.filter(geometry__intersects=points))
+        lons.append(lon)
+        lats.append(lat)
 
-    if not countries:
+    countries = country_geocoder.find_countries(lons, lats, exact_fallback=True)
+    countries_counter = Counter(countries[countries != 0].tolist())
+    if not countries_counter:
         return None
-    elif len(countries) == 1:
-        return countries[0]
-    else:
-        countries_counter = Counter()
-        for country in countries:
-            instersections = country.geometry.intersection(points)
-            if isinstance(instersections, Point):
-                countries_counter[country] = 1
-            else:
-                countries_counter[country] = len(instersections)
-        return countries_counter.most_common()[0][0]
+    return Country.objects.get(id=countries_counter.most_common()[0][0])
 
 
 @app.task(soft_time_limit=4 * 60 * 60, time_limit=4 * 60 * 60)
@@ -111,9 +109,13 @@ def process_loaded_file(pk: int, force: bool = False):
         if not errors or force:
             def update_stats():
                 update_country_weekly_status(imported_file.country)
+                update_country_regions_status(imported_file.country)
                 update_country_data_source_by_csv_filename(imported_file)
+                # country aggregates are refreshed by the next realtime data run
+                mark_country_dirty(imported_file.country_id)
                 imported_file.country.invalidate_country_related_cache()
                 update_country_related_cache.delay(imported_file.country.code)
+                update_schools_locations.delay(imported_file.country_id, only_unassigned=True)
 
             transaction.on_commit(update_stats)
     except UnsupportedFileFormatException as e:
@@ -126,3 +128,19 @@ def process_loaded_file(pk: int, force: bool = False):
         imported_file.errors = traceback.format_exc()
         imported_file.save()
         raise
+
+
+@app.task(soft_time_limit=2 * 60 * 60, time_limit=2 * 60 * 60)
+def update_schools_locations(country_id: int, only_unassigned: bool = False):
+    country = Country.objects.filter(id=country_id).defer('geometry', 'geometry_simplified').first()
+    if not country:
+        return
+
+    School.update_locations(country, only_unassigned=only_unassigned)
+
+
+@app.task(soft_time_limit=30 * 60, time_limit=30 * 60)
+def update_random_schools_sample():
+    RandomSchoolSample.refresh(int(settings.RANDOM_SCHOOLS_DEFAULT_AMOUNT))
+    # cached response is replaced in place, so clients never wait for the new sample
+    update_cached_value(url=reverse('schools:random-schools'))
@@ -1,14 +1,25 @@
+import csv
+import json
+import struct
+
+from django.contrib.gis.geos import Point
 from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+import numpy as np
 
 from proco.connection_statistics.models import CountryWeeklyStatus
 from proco.connection_statistics.tests.factories import SchoolWeeklyStatusFactory
 from proco.locations.tests.factories import CountryFactory
+from proco.schools.models import School
+from proco.schools.serializers import ListSchoolSerializer
 from proco.schools.tests.factories import SchoolFactory
-from proco.utils.tests import TestAPIViewSetMixin
+from proco.utils.tests import APITestCaseMixin, TestAPIViewSetMixin
 
 
 class SchoolsApiTestCase(TestAPIViewSetMixin, TestCase):
@@ -103,6 +114,21 @@ class SchoolsApiTestCase(TestAPIViewSetMixin, TestCase):
         self.assertEqual(response.data[2]['connectivity_status'], 'unknown')
         self.assertEqual(response.data[2]['coverage_status'], 'unknown')
 
+    def test_schools_list_same_as_regular_serializer(self):
+        connectivity_availability = CountryWeeklyStatus.CONNECTIVITY_TYPES_AVAILABILITY.realtime_speed
+        self.country.last_weekly_status.connectivity_availability = connectivity_availability
+        self.country.last_weekly_status.save()
+
+        response = self.forced_auth_req(
+            'get',
+            reverse('schools:schools-list', args=[self.country.code.lower()]),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        schools = School.objects.filter(country=self.country).select_related('last_weekly_status')
+        regular_data = ListSerializer(schools, child=ListSchoolSerializer(country=self.country)).data
+        self.assertEqual(json.loads(response.content), json.loads(JSONRenderer().render(regular_data)))
+
     def test_authorization_user(self):
         response = self.forced_auth_req(
             'get',
@@ -121,6 +147,59 @@ class SchoolsApiTestCase(TestAPIViewSetMixin, TestCase):
         self.assertEqual(response.data['id'], self.school_one.id)
         self.assertIn('statistics', response.data)
 
+    def test_schools_list_columnar(self):
+        response = self.forced_auth_req(
+            'get',
+            reverse('schools:schools-list', args=[self.country.code.lower()]),
+            data={'format': 'columnar'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.proco.columnar')
+
+        header_length = struct.unpack('<I', response.content[:4])[0]
+        header = json.loads(response.content[4:4 + header_length])
+        self.assertEqual(header['count'], 3)
+        columns = {column['name']: column for column in header['columns']}
+        self.assertListEqual(
+            list(sorted(columns.keys())),  # noqa: C413
+            ['connectivity_status', 'coverage_status', 'geopoint', 'id', 'is_verified', 'name'],
+        )
+        self.assertEqual(columns['geopoint']['type'], 'point')
+        self.assertEqual(columns['connectivity_status']['type'], 'category')
+
+        data_offset = 4 + header_length + columns['id']['offset']
+        ids = np.frombuffer(response.content[data_offset:data_offset + columns['id']['length']], dtype='<i4')
+        self.assertListEqual(
+            list(sorted(ids.tolist())),  # noqa: C413
+            sorted([self.school_one.id, self.school_two.id, self.school_three.id]),
+        )
+
+    def test_schools_detail_columnar(self):
+        response = self.forced_auth_req(
+            'get',
+            reverse('schools:schools-detail', args=[self.country.code.lower(), self.school_one.id]),
+            data={'format': 'columnar'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_csv_schools(self):
+        connectivity_availability = CountryWeeklyStatus.CONNECTIVITY_TYPES_AVAILABILITY.connectivity
+        self.country.last_weekly_status.connectivity_availability = connectivity_availability
+        self.country.last_weekly_status.save()
+
+        response = self.forced_auth_req(
+            'get',
+            reverse('schools:schools-export_csv_schools', args=[self.country.code.lower()]),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertListEqual(rows[0], ['Name', 'Geopoint', 'Connectivity Status'])
+        self.assertListEqual(rows[1], [self.school_one.name, '1.0: 1.0', 'good'])
+        self.assertListEqual([row[2] for row in rows[2:]], ['no', 'unknown'])
+
     def test_update_keys(self):
         # todo: move me to proper place
         from proco.locations.models import Country
@@ -136,3 +215,134 @@ class SchoolsApiTestCase(TestAPIViewSetMixin, TestCase):
                 f'SOFT_CACHE_SCHOOLS_{self.country.code.lower()}_',
             ])),
         )
+
+
+class SchoolsTileApiTestCase(APITestCaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        cls.school = SchoolFactory(country=cls.country, location__country=cls.country)
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def get_tile_url(self, z, x, y):
+        return reverse('schools:schools-tiles', kwargs={
+            'country_code': self.country.code.lower(), 'z': z, 'x': x, 'y': y,
+        })
+
+    def test_tile(self):
+        response = self.forced_auth_req('get', self.get_tile_url(0, 0, 0))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertTrue(response.content)
+
+    def test_empty_tile(self):
+        # school is located at (1, 1), so north-west tile of the first zoom level is empty
+        response = self.forced_auth_req('get', self.get_tile_url(1, 0, 0))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+
+    def test_tile_cached(self):
+        response = self.forced_auth_req('get', self.get_tile_url(0, 0, 0))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            cached_response = self.forced_auth_req('get', self.get_tile_url(0, 0, 0))
+        self.assertEqual(cached_response.content, response.content)
+
+    def test_tile_invalidated_with_country_data(self):
+        self.forced_auth_req('get', self.get_tile_url(0, 0, 0))
+        self.country.invalidate_country_related_cache()
+
+        with self.assertNumQueries(2):
+            self.forced_auth_req('get', self.get_tile_url(0, 0, 0))
+
+    def test_tile_out_of_range(self):
+        response = self.forced_auth_req('get', self.get_tile_url(1, 2, 0))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SchoolsSearchApiTestCase(APITestCaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country_one = CountryFactory()
+        cls.country_two = CountryFactory()
+        cls.school_one = SchoolFactory(country=cls.country_one, name='Green Valley Primary School')
+        cls.school_two = SchoolFactory(country=cls.country_one, name='Green Vally School')
+        cls.school_three = SchoolFactory(country=cls.country_two, name='Green Valley High School')
+        cls.school_four = SchoolFactory(country=cls.country_two, name='Sunrise Academy')
+
+    def search(self, **params):
+        response = self.forced_auth_req('get', reverse('schools:search-schools'), data=params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_search(self):
+        data = self.search(q='green valley')
+        self.assertCountEqual(
+            [school['id'] for school in data],
+            [self.school_one.id, self.school_two.id, self.school_three.id],
+        )
+
+    def test_search_ranking(self):
+        data = self.search(q='green vally school')
+        self.assertEqual(data[0]['id'], self.school_two.id)
+
+    def test_search_country(self):
+        data = self.search(q='green valley', country_code=self.country_two.code.lower())
+        self.assertListEqual([school['id'] for school in data], [self.school_three.id])
+
+    def test_search_limit(self):
+        self.assertEqual(len(self.search(q='green', limit=1)), 1)
+
+    def test_empty_query(self):
+        self.assertListEqual(self.search(q=''), [])
+
+
+class NearestSchoolsApiTestCase(APITestCaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country_one = CountryFactory()
+        cls.country_two = CountryFactory()
+        cls.school_one = SchoolFactory(country=cls.country_one, geopoint=Point(10, 10), education_level='Primary')
+        cls.school_two = SchoolFactory(country=cls.country_one, geopoint=Point(10.1, 10), education_level='Secondary')
+        cls.school_three = SchoolFactory(country=cls.country_two, geopoint=Point(10.05, 10))
+        cls.school_far = SchoolFactory(country=cls.country_two, geopoint=Point(50, 50))
+
+    def nearest(self, expected_status=status.HTTP_200_OK, **params):
+        response = self.forced_auth_req('get', reverse('schools:nearest-schools'), data=params)
+        self.assertEqual(response.status_code, expected_status)
+        return response.data
+
+    def test_nearest(self):
+        data = self.nearest(lon=10.01, lat=10, k=3)
+        self.assertListEqual(
+            [school['id'] for school in data],
+            [self.school_one.id, self.school_three.id, self.school_two.id],
+        )
+        self.assertLess(data[0]['distance'], data[1]['distance'])
+
+    def test_nearest_high_latitude(self):
+        # closer in degrees, but further in meters
+        school_north = SchoolFactory(country=self.country_one, geopoint=Point(0, 70.3))
+        school_east = SchoolFactory(country=self.country_one, geopoint=Point(0.5, 70))
+
+        data = self.nearest(lon=0, lat=70, k=2)
+        self.assertListEqual([school['id'] for school in data], [school_east.id, school_north.id])
+        self.assertLess(data[0]['distance'], data[1]['distance'])
+
+        data = self.nearest(lon=0, lat=70, k=1)
+        self.assertListEqual([school['id'] for school in data], [school_east.id])
+
+    def test_nearest_filters(self):
+        data = self.nearest(lon=10.01, lat=10, country_code=self.country_one.code)
+        self.assertListEqual([school['id'] for school in data], [self.school_one.id, self.school_two.id])
+
+        data = self.nearest(lon=10.01, lat=10, education_level='secondary')
+        self.assertListEqual([school['id'] for school in data], [self.school_two.id])
+
+    def test_invalid_params(self):
+        self.nearest(expected_status=status.HTTP_400_BAD_REQUEST, lon=10)
+        self.nearest(expected_status=status.HTTP_400_BAD_REQUEST, lon=200, lat=10)
@@ -0,0 +1,99 @@
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.cache import cache
+from django.test import TestCase
+
+from proco.locations.tests.factories import CountryFactory, LocationFactory
+from proco.schools.models import RandomSchoolSample, School
+from proco.schools.tests.factories import SchoolFactory
+
+
+class TestRandomSchoolSampleModel(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country_one = CountryFactory()
+        cls.country_two = CountryFactory()
+        cls.schools_one = [SchoolFactory(country=cls.country_one) for _ in range(3)]
+        cls.school_two = SchoolFactory(country=cls.country_two)
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_fallback_without_sample(self):
+        self.assertEqual(RandomSchoolSample.get_schools(2).count(), 2)
+
+    def test_refresh(self):
+        active_pool = RandomSchoolSample.get_active_pool()
+        new_pool = RandomSchoolSample.refresh(2)
+
+        self.assertNotEqual(new_pool, active_pool)
+        self.assertEqual(RandomSchoolSample.get_active_pool(), new_pool)
+        self.assertFalse(RandomSchoolSample.objects.filter(pool=active_pool).exists())
+
+        # smaller country is represented in sample anyway
+        sampled_countries = set(RandomSchoolSample.get_schools(10).values_list('country_id', flat=True))
+        self.assertSetEqual(sampled_countries, {self.country_one.id, self.country_two.id})
+
+    def test_refresh_small_country_topped_up(self):
+        # sampling rate is low enough to miss the only school of the second country
+        for _i in range(60):
+            SchoolFactory(country=self.country_one)
+
+        RandomSchoolSample.refresh(1)
+
+        sampled_countries = list(RandomSchoolSample.get_schools(10).values_list('country_id', flat=True))
+        self.assertCountEqual(sampled_countries, [self.country_one.id, self.country_two.id])
+
+    def test_refresh_rotates_pools(self):
+        first_pool = RandomSchoolSample.refresh(4)
+        second_pool = RandomSchoolSample.refresh(4)
+
+        self.assertNotEqual(first_pool, second_pool)
+        self.assertEqual(RandomSchoolSample.objects.filter(pool=first_pool).count(), 4)
+        self.assertEqual(RandomSchoolSample.objects.filter(pool=second_pool).count(), 4)
+
+
+class TestSchoolLocationsModel(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = CountryFactory()
+        cls.region = LocationFactory(
+            country=cls.country, geometry=GEOSGeometry('MultiPolygon(((0 0, 0 2, 2 2, 2 0, 0 0)))'),
+        )
+        cls.district = LocationFactory(
+            country=cls.country, parent=cls.region,
+            geometry=GEOSGeometry('MultiPolygon(((0 0, 0 1, 1 1, 1 0, 0 0)))'),
+        )
+        cls.other_country_location = LocationFactory(
+            geometry=GEOSGeometry('MultiPolygon(((0 0, 0 2, 2 2, 2 0, 0 0)))'),
+        )
+
+    def test_update_locations(self):
+        district_school = SchoolFactory(country=self.country, geopoint=GEOSGeometry('Point(0.5 0.5)'))
+        region_school = SchoolFactory(country=self.country, geopoint=GEOSGeometry('Point(1.5 1.5)'))
+        outside_school = SchoolFactory(country=self.country, geopoint=GEOSGeometry('Point(5 5)'), location=self.region)
+
+        self.assertEqual(School.update_locations(self.country, batch_size=2), 3)
+
+        district_school.refresh_from_db()
+        region_school.refresh_from_db()
+        outside_school.refresh_from_db()
+        self.assertEqual(district_school.location, self.district)
+        self.assertEqual(region_school.location, self.region)
+        self.assertIsNone(outside_school.location)
+
+        # nothing changed, so nothing written
+        self.assertEqual(School.update_locations(self.country), 0)
+
+    def test_update_locations_only_unassigned(self):
+        assigned_school = SchoolFactory(
+            country=self.country, geopoint=GEOSGeometry('Point(0.5 0.5)'), location=self.region,
+        )
+        unassigned_school = SchoolFactory(country=self.country, geopoint=GEOSGeometry('Point(0.5 0.5)'))
+
+        self.assertEqual(School.update_locations(self.country, only_unassigned=True), 1)
+
+        assigned_school.refresh_from_db()
+        unassigned_school.refresh_from_db()
+        self.assertEqual(assigned_school.location, self.region)
+        self.assertEqual(unassigned_school.location, self.district)
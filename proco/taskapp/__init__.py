@@ -37,13 +37,18 @@ def finalize_setup(sender, **kwargs):
             'schedule': crontab(hour=1, minute=0),
             'args': (),
         },
+        'proco.schools.tasks.update_random_schools_sample': {
+            'task': 'proco.schools.tasks.update_random_schools_sample',
+            'schedule': crontab(hour=2, minute=30),
+            'args': (),
+        },
         'proco.utils.tasks.update_all_cached_values': {
             'task': 'proco.utils.tasks.update_all_cached_values',
             'schedule': crontab(hour=3, minute=0),
             'args': (),
         },
-        'proco.connection_statistics.tasks.clean_old_realtime_data': {
-            'task': 'proco.connection_statistics.tasks.clean_old_realtime_data',
+        'proco.connection_statistics.tasks.update_realtime_data_partitions': {
+            'task': 'proco.connection_statistics.tasks.update_realtime_data_partitions',
             'schedule': crontab(hour=5, minute=0),
             'args': (),
         },
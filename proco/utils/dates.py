@@ -1,3 +1,5 @@
+from datetime import datetime, time, timedelta
+
 from django.utils import timezone
 
 
@@ -11,3 +13,11 @@ def get_current_week():
 
 def get_current_weekday():
     return timezone.now().isocalendar()[2]
+
+
+def get_day_bounds(date):
+    # unlike __date lookup, range on datetime field allows to use indexes and partitions pruning
+    return (
+        timezone.make_aware(datetime.combine(date, time.min)),
+        timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min)),
+    )
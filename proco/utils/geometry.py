@@ -1,5 +1,11 @@
 import math
 
+from django.db.models import FloatField, Func
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
 
 def cartesian(latitude, longitude):
     # Convert to radians
@@ -11,3 +17,87 @@ def cartesian(latitude, longitude):
     y_coord = earth_radius * math.cos(latitude) * math.sin(longitude)
     z_coord = earth_radius * math.sin(latitude)
     return x_coord, y_coord, z_coord
+
+
+def haversine_distances(lat1, lon1, lat2, lon2):
+    # great circle distance in kilometers between points given in radians, arguments should be broadcastable
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def mean_pairwise_distance(points, block_size=512):
+    """
+    Exact mean distance between all pairs of (lat, lon) points given in degrees.
+    Distances are calculated by square blocks, so memory usage doesn't depend on amount of points.
+    """
+    points = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    points_count = len(points)
+    if points_count < 2:
+        return None
+
+    lat, lon = points[:, 0], points[:, 1]
+    total = 0.0
+    for i in range(0, points_count, block_size):
+        for j in range(i, points_count, block_size):
+            distances = haversine_distances(
+                lat[i:i + block_size, None], lon[i:i + block_size, None],
+                lat[None, j:j + block_size], lon[None, j:j + block_size],
+            )
+            # every pair counted once
+            total += np.triu(distances, k=1).sum() if i == j else distances.sum()
+
+    return float(total / (points_count * (points_count - 1) / 2))
+
+
+def estimate_mean_pairwise_distance(
+    points, relative_error=0.01, exact_threshold=5000, batch_size=100000, max_pairs=10000000, random_state=0,
+):
+    """
+    Mean distance between all pairs of (lat, lon) points given in degrees.
+    Small sets are calculated exactly, for big ones random pairs are sampled
+    until 95% confidence interval is narrower than relative_error of the mean.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    points_count = len(points)
+    if points_count <= exact_threshold:
+        return mean_pairwise_distance(points)
+
+    points = np.radians(points)
+    random = np.random.RandomState(random_state)
+    lat, lon = points[:, 0], points[:, 1]
+    total, total_squares, pairs = 0.0, 0.0, 0
+    while pairs < max_pairs:
+        # uniform pairs of different points
+        first = random.randint(0, points_count, batch_size)
+        second = random.randint(0, points_count - 1, batch_size)
+        second[second >= first] += 1
+
+        distances = haversine_distances(lat[first], lon[first], lat[second], lon[second])
+        total += distances.sum()
+        total_squares += np.square(distances).sum()
+        pairs += batch_size
+
+        mean = total / pairs
+        standard_error = math.sqrt(max(total_squares / pairs - mean ** 2, 0) / pairs)
+        if 1.96 * standard_error <= relative_error * mean:
+            break
+
+    return float(total / pairs)
+
+
+def get_tile_bounds(zoom, x, y):
+    # bounds of xyz tile in web mercator projection (EPSG:3857)
+    world_size = 2 * math.pi * 6378137
+    tile_size = world_size / (2 ** zoom)
+
+    x_min = -world_size / 2 + x * tile_size
+    y_max = world_size / 2 - y * tile_size
+    return x_min, y_max - tile_size, x_min + tile_size, y_max
+
+
+class GeometryDistance(Func):
+    # `<->` distance operator, ordering by it lets PostGIS walk GiST index (KNN search)
+    output_field = FloatField()
+    arity = 2
+    function = ''
+    arg_joiner = ' <-> '
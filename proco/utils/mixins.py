@@ -1,8 +1,45 @@
-from rest_framework.response import Response
-from rest_framework.utils.urls import remove_query_param
+import gzip
+import hashlib
+import json
+import re
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+import brotli
 
 from proco.utils.cache import cache_manager
 
+re_accepts_gzip = re.compile(r'\bgzip\b')
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CachedHttpResponse(HttpResponse):
+    """
+    Response built from pre-rendered cached content. Data is decoded lazily and only for json content,
+    it's not needed on the hot path, but keeps responses interchangeable with rest framework ones.
+    """
+
+    def __init__(self, *args, encoding=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.encoding = encoding
+
+    @property
+    def data(self):
+        if not self.get('Content-Type', '').startswith('application/json'):
+            return None
+
+        content = self.content
+        if self.encoding == 'gzip':
+            content = gzip.decompress(content)
+        elif self.encoding == 'br':
+            content = brotli.decompress(content)
+        return json.loads(content)
+
 
 class UseCachedDataMixin(object):
     CACHE_KEY = 'cache'
@@ -11,57 +48,159 @@ class UseCachedDataMixin(object):
         return self.request.query_params.get(self.CACHE_KEY, 'on').lower() in ['on', 'true']
 
 
-class CachedListMixin(UseCachedDataMixin):
+class CachedRenderedResponseMixin(UseCachedDataMixin):
+    """
+    Keeps final rendered response in cache together with compressed variants,
+    so cache hits are served without serialization and compression.
+    """
+
+    FORMAT_KEY = 'format'
+
+    def is_cacheable_renderer(self):
+        return not isinstance(getattr(self.request, 'accepted_renderer', None), BrowsableAPIRenderer)
+
+    def get_format_cache_key_suffix(self):
+        renderer_format = getattr(self.request.accepted_renderer, 'format', 'json')
+        if renderer_format == 'json':
+            return ''
+        return '_{0}'.format(renderer_format)
+
+    def get_cache_request_path(self, request):
+        request_path = remove_query_param(request.get_full_path(), self.CACHE_KEY)
+        renderer_format = getattr(request.accepted_renderer, 'format', 'json')
+        if renderer_format != 'json':
+            # keep format in the path, so background update renders the same representation
+            request_path = replace_query_param(request_path, self.FORMAT_KEY, renderer_format)
+        return request_path
+
+    def _render_cache_entry(self, request, response, *args, **kwargs):
+        response = self.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        content = response.content
+        return response, {
+            'content': content,
+            'content_type': response['Content-Type'],
+            'etag': hashlib.sha256(content).hexdigest()[:32],
+            'encodings': {
+                'gzip': compress_string(content),
+                'br': brotli.compress(content),
+            },
+        }
+
+    def _get_etag(self, cache_entry, encoding=None):
+        if encoding:
+            return '"{0}-{1}"'.format(cache_entry['etag'], encoding)
+        return '"{0}"'.format(cache_entry['etag'])
+
+    def _is_not_modified(self, request, cache_entry):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return False
+
+        for etag in if_none_match.split(','):
+            etag = etag.strip()
+            if etag == '*':
+                return True
+            # weak comparison, compressed variants share the same content
+            etag = etag[2:] if etag.startswith('W/') else etag
+            etag = re.sub(r'-(gzip|br)$', '', etag.strip('"'))
+            if etag == cache_entry['etag']:
+                return True
+        return False
+
+    def _get_cached_response(self, request, cache_entry):
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = None
+        if re_accepts_brotli.search(accept_encoding):
+            encoding = 'br'
+        elif re_accepts_gzip.search(accept_encoding):
+            encoding = 'gzip'
+
+        if self._is_not_modified(request, cache_entry):
+            response = HttpResponseNotModified()
+        else:
+            content = cache_entry['encodings'][encoding] if encoding else cache_entry['content']
+            response = CachedHttpResponse(content, content_type=cache_entry['content_type'], encoding=encoding)
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = self._get_etag(cache_entry, encoding=encoding)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def get_cached_response(self, request, cache_key):
+        cache_entry = cache_manager.get(cache_key)
+        # values stored before rendered responses were cached are ignored
+        if not isinstance(cache_entry, dict) or 'etag' not in cache_entry:
+            return None
+        return self._get_cached_response(request, cache_entry)
+
+    def set_cached_response(self, request, response, cache_key, *args, **kwargs):
+        if response.status_code != 200:
+            return response
+
+        response, cache_entry = self._render_cache_entry(request, response, *args, **kwargs)
+        cache_manager.set(cache_key, cache_entry, request_path=self.get_cache_request_path(request))
+        response['ETag'] = self._get_etag(cache_entry)
+        return response
+
+
+class CachedListMixin(CachedRenderedResponseMixin):
     LIST_CACHE_KEY_PREFIX = None
 
     def get_list_cache_key(self):
         params = dict(self.request.query_params)
         params.pop(self.CACHE_KEY, None)
-        return '{0}_{1}'.format(
+        params.pop(self.FORMAT_KEY, None)
+        return '{0}_{1}{2}'.format(
             getattr(self.__class__, 'LIST_CACHE_KEY_PREFIX', self.__class__.__name__) or self.__class__.__name__,
             '_'.join(map(lambda x: '{0}_{1}'.format(x[0], x[1]), sorted(params.items()))),
+            self.get_format_cache_key_suffix(),
         )
 
     def _get_raw_list_response(self, request, *args, **kwargs):
-        cache_key = self.get_list_cache_key()
         response = super(CachedListMixin, self).list(request, *args, **kwargs)
-        request_path = remove_query_param(request.get_full_path(), self.CACHE_KEY)
-        cache_manager.set(cache_key, response.data, request_path=request_path)
-        return response
+        if not self.is_cacheable_renderer():
+            return response
+        return self.set_cached_response(request, response, self.get_list_cache_key(), *args, **kwargs)
 
     def list(self, request, *args, **kwargs):
-        if not self.use_cached_data():
+        if not self.use_cached_data() or not self.is_cacheable_renderer():
             return self._get_raw_list_response(request, *args, **kwargs)
         else:
-            cache_key = self.get_list_cache_key()
-            data = cache_manager.get(cache_key)
-            if not data:
+            response = self.get_cached_response(request, self.get_list_cache_key())
+            if response is None:
                 return self._get_raw_list_response(request, *args, **kwargs)
-            return Response(data=data)
+            return response
 
 
-class CachedRetrieveMixin(UseCachedDataMixin):
+class CachedRetrieveMixin(CachedRenderedResponseMixin):
     RETRIEVE_CACHE_KEY_PREFIX = None
 
     def get_retrieve_cache_key(self):
-        return '{0}_{1}'.format(
+        params = dict(self.request.query_params)
+        params.pop(self.CACHE_KEY, None)
+        params.pop(self.FORMAT_KEY, None)
+        return '{0}_{1}{2}{3}'.format(
             getattr(self.__class__, 'RETRIEVE_CACHE_KEY_PREFIX', self.__class__.__name__) or self.__class__.__name__,
             '_'.join(map(lambda x: '{0}_{1}'.format(x[0], x[1]), sorted(self.kwargs.items()))),
+            # query params are separated, so all variants of object can be found by key prefix
+            '__{0}'.format('_'.join(map(lambda x: '{0}_{1}'.format(x[0], x[1]), sorted(params.items()))))
+            if params else '',
+            self.get_format_cache_key_suffix(),
         )
 
     def _get_raw_retrieve_response(self, request, *args, **kwargs):
-        cache_key = self.get_retrieve_cache_key()
         response = super(CachedRetrieveMixin, self).retrieve(request, *args, **kwargs)
-        request_path = remove_query_param(request.get_full_path(), self.CACHE_KEY)
-        cache_manager.set(cache_key, response.data, request_path=request_path)
-        return response
+        if not self.is_cacheable_renderer():
+            return response
+        return self.set_cached_response(request, response, self.get_retrieve_cache_key(), *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
-        if not self.use_cached_data():
+        if not self.use_cached_data() or not self.is_cacheable_renderer():
             return self._get_raw_retrieve_response(request, *args, **kwargs)
         else:
-            cache_key = self.get_retrieve_cache_key()
-            data = cache_manager.get(cache_key)
-            if not data:
+            response = self.get_cached_response(request, self.get_retrieve_cache_key())
+            if response is None:
                 return self._get_raw_retrieve_response(request, *args, **kwargs)
-            return Response(data=data)
+            return response
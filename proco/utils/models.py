@@ -6,8 +6,13 @@ class ApproxQuerySet(models.QuerySet):
     def count(self, approx=True):
         if approx and not self.query.where:
             cursor = connections[self.db].cursor()
+            # partitioned table has no statistics itself, so rows of partitions are summed up
             cursor.execute(
-                'SELECT reltuples::int FROM pg_class WHERE relname = %s;',
+                'SELECT (GREATEST(parent.reltuples, 0) + COALESCE(SUM(GREATEST(child.reltuples, 0)), 0))::int '
+                'FROM pg_class parent '
+                'LEFT JOIN pg_inherits ON pg_inherits.inhparent = parent.oid '
+                'LEFT JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE parent.relname = %s GROUP BY parent.oid;',
                 (self.model._meta.db_table,),
             )
             return cursor.fetchall()[0][0]
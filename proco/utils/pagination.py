@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DateCursorPagination(CursorPagination):
+    """
+    Keyset pagination for time series, page is looked up by date instead of offset,
+    so response time doesn't depend on page depth. Date is expected to be unique within filtered queryset.
+    """
+
+    ordering = ('date', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
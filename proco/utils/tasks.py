@@ -1,6 +1,7 @@
 from django.urls import reverse
 
 from rest_framework.test import APIClient
+from rest_framework.utils.urls import replace_query_param
 
 from celery import chain
 
@@ -10,7 +11,8 @@ from proco.taskapp import app
 @app.task(soft_time_limit=10 * 60, time_limit=11 * 60)
 def update_cached_value(*args, url='', **kwargs):
     client = APIClient()
-    client.get(url, {'cache': False}, format='json')
+    # query params passed separately would replace ones stored in url, so keep them together
+    client.get(replace_query_param(url, 'cache', False), format='json')
 
 
 @app.task(soft_time_limit=5 * 60, time_limit=5 * 60)
@@ -18,7 +20,7 @@ def update_all_cached_values():
     from proco.locations.models import Country
 
     update_cached_value.delay(url=reverse('connection_statistics:global-stat'))
-    update_cached_value.delay(url=reverse('locations:countries-boundary'))
+    update_countries_boundary_cache.delay()
     update_cached_value.delay(url=reverse('locations:countries-list'))
     update_cached_value.delay(url=reverse('schools:random-schools'))
 
@@ -36,3 +38,20 @@ def update_country_related_cache(country_code):
     update_cached_value.delay(url=reverse('schools:random-schools'))
     update_cached_value.delay(url=reverse('locations:countries-detail', kwargs={'pk': country_code.lower()}))
     update_cached_value.delay(url=reverse('schools:schools-list', kwargs={'country_code': country_code.lower()}))
+    update_cached_value.delay(url=reverse('locations:country-regions', kwargs={'country_code': country_code.lower()}))
+
+
+@app.task
+def update_countries_boundary_cache(country_code=None):
+    from proco.locations.models import CountrySimplifiedGeometry
+
+    boundary_url = reverse('locations:countries-boundary')
+    update_cached_value.delay(url=boundary_url)
+    update_cached_value.delay(url='{0}?format=topojson'.format(boundary_url))
+    for level in CountrySimplifiedGeometry.LEVELS:
+        update_cached_value.delay(url='{0}?lod={1}'.format(boundary_url, level))
+        update_cached_value.delay(url='{0}?lod={1}&format=topojson'.format(boundary_url, level))
+
+    if country_code:
+        country_url = reverse('locations:countries-detail', kwargs={'pk': country_code.lower()})
+        update_cached_value.delay(url='{0}?format=topojson'.format(country_url))
@@ -0,0 +1,167 @@
+"""
+Pure python conversion of GeoJSON polygons into TopoJSON topology.
+
+Coordinates are quantized into integer grid first, so borders shared by neighbouring geometries
+become identical sequences of points. Rings are cut into arcs at junctions - points where shared border starts
+or ends, every arc is stored once and referenced by index (or by ~index for reversed direction).
+Arcs are delta-encoded, which keeps numbers small and payload compact.
+"""
+
+DEFAULT_QUANTIZATION = 100000
+
+
+def _iter_polygons(geometry):
+    if not geometry:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    raise ValueError('Unsupported geometry type: {0}'.format(geometry['type']))
+
+
+def _get_bbox(geometries):
+    x0 = y0 = float('inf')
+    x1 = y1 = float('-inf')
+    for geometry in geometries:
+        for polygon in _iter_polygons(geometry):
+            for ring in polygon:
+                for x, y in ring:
+                    x0, y0, x1, y1 = min(x0, x), min(y0, y), max(x1, x), max(y1, y)
+    if x0 > x1:
+        return None
+    return [x0, y0, x1, y1]
+
+
+def _quantize_ring(ring, x0, y0, kx, ky):
+    points = []
+    for x, y in ring:
+        point = (int(round((x - x0) / kx)), int(round((y - y0) / ky)))
+        if not points or points[-1] != point:
+            points.append(point)
+
+    # ring is stored open, without closing point
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    if len(points) < 3:
+        # collapsed after quantization
+        return None
+    return points
+
+
+def _find_junctions(rings):
+    neighbours, junctions = {}, set()
+    for ring in rings:
+        size = len(ring)
+        for i, point in enumerate(ring):
+            previous_point, next_point = ring[i - 1], ring[(i + 1) % size]
+            pair = (previous_point, next_point) if previous_point < next_point else (next_point, previous_point)
+            if neighbours.setdefault(point, pair) != pair:
+                junctions.add(point)
+    return junctions
+
+
+class _ArcsIndex(object):
+    def __init__(self):
+        self.arcs = []
+        self.index = {}
+
+    def get_arc_index(self, points):
+        key = tuple(points)
+        if key in self.index:
+            return self.index[key]
+
+        reversed_key = key[::-1]
+        if reversed_key in self.index:
+            return ~self.index[reversed_key]
+
+        self.index[key] = len(self.arcs)
+        self.arcs.append(points)
+        return self.index[key]
+
+
+def _cut_ring(ring, junctions, arcs_index):
+    starts = [i for i, point in enumerate(ring) if point in junctions]
+    if not starts:
+        # isolated ring, rotate it to the smallest point so the same ring from other geometry is matched
+        start = ring.index(min(ring))
+        points = ring[start:] + ring[:start]
+        return [arcs_index.get_arc_index(points + [points[0]])]
+
+    points = ring[starts[0]:] + ring[:starts[0]]
+    points.append(points[0])
+    arcs, arc_start = [], 0
+    for i in range(1, len(points)):
+        if points[i] in junctions:
+            arcs.append(arcs_index.get_arc_index(points[arc_start:i + 1]))
+            arc_start = i
+    return arcs
+
+
+def _delta_encode(points):
+    encoded = [list(points[0])]
+    for (x, y), (previous_x, previous_y) in zip(points[1:], points):
+        encoded.append([x - previous_x, y - previous_y])
+    return encoded
+
+
+def build_topology(features, object_name, quantization=DEFAULT_QUANTIZATION):
+    """
+    Builds TopoJSON topology from features - tuples of (id, properties, GeoJSON geometry);
+    only Polygon and MultiPolygon geometries are supported, all of them are stored as MultiPolygon
+    """
+    features = list(features)
+    bbox = _get_bbox(feature[2] for feature in features)
+
+    if bbox:
+        x0, y0, x1, y1 = bbox
+        kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1
+        ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1
+    else:
+        x0 = y0 = 0
+        kx = ky = 1
+
+    quantized_features = []
+    for feature_id, properties, geometry in features:
+        polygons = []
+        for polygon in _iter_polygons(geometry):
+            rings = [_quantize_ring(ring, x0, y0, kx, ky) for ring in polygon]
+            if not rings or rings[0] is None:
+                # polygon exterior is smaller than quantization step
+                continue
+            polygons.append([ring for ring in rings if ring is not None])
+        quantized_features.append((feature_id, properties, polygons))
+
+    junctions = _find_junctions(
+        ring for _feature_id, _properties, polygons in quantized_features for polygon in polygons for ring in polygon
+    )
+
+    arcs_index = _ArcsIndex()
+    geometries = []
+    for feature_id, properties, polygons in quantized_features:
+        geometry = {'type': 'MultiPolygon' if polygons else None}
+        if feature_id is not None:
+            geometry['id'] = feature_id
+        if properties:
+            geometry['properties'] = properties
+        if polygons:
+            geometry['arcs'] = [[_cut_ring(ring, junctions, arcs_index) for ring in polygon] for polygon in polygons]
+        geometries.append(geometry)
+
+    topology = {
+        'type': 'Topology',
+        'transform': {
+            'scale': [kx, ky],
+            'translate': [x0, y0],
+        },
+        'objects': {
+            object_name: {
+                'type': 'GeometryCollection',
+                'geometries': geometries,
+            },
+        },
+        'arcs': [_delta_encode(points) for points in arcs_index.arcs],
+    }
+    if bbox:
+        topology['bbox'] = bbox
+    return topology